@@ -214,6 +214,17 @@ def get_url_from_tars_info(tars_info: Dict) -> Dict:
     return tar_urls
 
 
+def get_url_to_sha1sum_from_tars_info(tars_info: Dict) -> Dict[str, str]:
+    """
+    Extract {download_url: sha1sum} from tars_info, e.g. to verify streamed shards in `WdsShardCache`.
+    """
+    url_to_sha1sum = {}
+    for sequence_tars_info in tars_info.values():
+        for tar_info in sequence_tars_info.values():
+            url_to_sha1sum[tar_info["download_url"]] = tar_info["sha1sum"]
+    return url_to_sha1sum
+
+
 def write_tar_yaml(
     output_folder_path,
     train_tars,
@@ -393,3 +404,12 @@ def download_atek_wds_sequences(
             validation_tars_yaml_name="streamable_validation_tars.yaml",
             all_tars_yaml_name="streamable_all_tars.yaml",
         )
+        # SHA1 of streamed shards, to verify them when caching to local disk
+        with open(
+            os.path.join(output_folder_path, "streamable_sha1sums.json"), "w"
+        ) as file:
+            json.dump(
+                get_url_to_sha1sum_from_tars_info(sequences_tar_info_dict),
+                file,
+                indent=2,
+            )
@@ -14,16 +14,43 @@
 
 import io
 import json
+import random
 from functools import partial
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
 import numpy as np
 
 import torch
 import webdataset as wds
 
+from atek.data_loaders.decoded_sample_cache import (
+    compute_decoded_sample_cache_config_hash,
+    decoded_sample_cache_stage,
+    DecodedSampleCache,
+)
+from atek.data_loaders.wds_shard_cache import cached_url_opener, WdsShardCache
+from atek.data_loaders.wds_loader_state import ResumableSampleStream
+from atek.data_loaders.wds_sample_filter import WdsSampleFilter
+from atek.data_loaders.wds_shard_planner import BalancedShardSplitter
+from atek.data_loaders.wds_shard_read_ahead import read_ahead_url_opener
+from atek.util.camera_calib_utils import rescale_pixel_coords, rescale_projection_params
 from atek.util.file_io_utils import merge_tensors_into_dict
+from atek.util.image_codec_utils import (
+    decode_image_frames_in_wds_sample,
+    IMAGE_FRAME_EXTENSIONS,
+)
+from atek.util.tensor_codec_utils import (
+    decode_tensor_from_raw_bytes,
+    RAW_TENSOR_EXTENSION,
+)
 from atek.util.tensor_utils import unpack_list_of_tensors
+from atek.util.wds_key_utils import (
+    create_key_globs_from_atek_keys,
+    create_wds_member_selector,
+)
+
+# Suffix of the keys holding the lengths of padded tensors, see `atek_padded_collation_fn`
+PADDED_LENGTHS_SUFFIX = "+lengths"
 
 
 def process_wds_sample(sample: Dict):
@@ -36,37 +63,42 @@ def process_wds_sample(sample: Dict):
     """
     sample_as_dict = {}
     to_be_stacked_images = {}
+    gt_tensor_dict = {}
     for k, v in sample.items():
         if k in ["__key__", "__local_path__", "__url__"]:
             sample_as_dict[k] = v
         else:
             key_wo_extension, extension_name = k.rsplit(".", 1)
             # Need to restack each image back into tensor of shape `[num_frame, C, H, W]`
-            if extension_name == "jpeg":
-                # Images are named as `${root_name}_{image_index}.jpeg` in WDS.
+            if extension_name in IMAGE_FRAME_EXTENSIONS:
+                # Images are named as `${root_name}_{image_index}.{jpeg|png|webp|rawimage}` in WDS.
                 # Break the name into root_name and image_index
-                image_root_name = k.split("_")[0]
-                image_index = int(k.split("_")[1].split(".")[0])
-
-                if image_root_name not in to_be_stacked_images:
-                    to_be_stacked_images[image_root_name] = {}
+                image_root_name, _, image_index = key_wo_extension.rpartition("_")
 
-                # WDS-saved image are loaded as [3, H, W], where single-channel images are simply duplicated for 2 more channels.
-                # convert to tensor of shape [F, C, H, W]
-                if "rgb" not in image_root_name:
-                    image = v[0:1, :, :]
-                else:
-                    image = v
+                # Images are decoded as [C, H, W] with their stored number of channels, see `atek_image_frame_handler`.
+                # Single-channel images that were decoded to 3 channels (e.g. by another decoder) are sliced back to [1, H, W].
+                if v.shape[0] == 3 and "rgb" not in image_root_name:
+                    v = v[0:1, :, :]
 
                 # append current image to the correct "stack"
-                to_be_stacked_images[image_root_name][image_index] = image
-
-            # Tensors
-            elif extension_name == "pth":
-                tensor_value = v
+                to_be_stacked_images.setdefault(image_root_name, []).append(
+                    (int(image_index), v)
+                )
+
+            # Tensors, either saved by `torch.save` (.pth), or in raw tensor format
+            elif extension_name in ["pth", RAW_TENSOR_EXTENSION]:
+                tensor_value = (
+                    decode_tensor_from_raw_bytes(v)
+                    if extension_name == RAW_TENSOR_EXTENSION
+                    else v
+                )
                 if tensor_value.dtype == torch.float64:
                     tensor_value = tensor_value.float()
-                sample_as_dict[key_wo_extension] = tensor_value
+                # Tensors named "gt_data#...", are merged back into GT dict all at once below
+                if key_wo_extension.startswith("gt_data#"):
+                    gt_tensor_dict[key_wo_extension[len("gt_data#") :]] = tensor_value
+                else:
+                    sample_as_dict[key_wo_extension] = tensor_value
             # Dictionary
             elif extension_name == "json":
                 sample_as_dict[key_wo_extension] = v
@@ -76,18 +108,11 @@ def process_wds_sample(sample: Dict):
             else:
                 raise ValueError(f"Unsupported file type in wds {k}")
 
-    # restack images to tensor of [num_frames, C, H, W], but need to re-arrange image order first!
-    for image_root_name, img_dict in to_be_stacked_images.items():
-        # may have missing frames
-        sorted_image_indices = sorted(img_dict.keys())
-        image_list_with_correct_order = []
-
-        for index in sorted_image_indices:
-            image_list_with_correct_order.append(img_dict[index])
-
-        # Convert each frame to the desired shape
+    # restack images to tensor of [num_frames, C, H, W], in the order of frame indices (may have missing frames)
+    for image_root_name, indexed_images in to_be_stacked_images.items():
+        indexed_images.sort(key=lambda indexed_image: indexed_image[0])
         sample_as_dict[image_root_name] = torch.stack(
-            image_list_with_correct_order, dim=0
+            [image for _, image in indexed_images], dim=0
         )
 
     # unpack semidense points from a stacked tensor back to List of tensors
@@ -97,24 +122,52 @@ def process_wds_sample(sample: Dict):
                 stacked_tensor=sample_as_dict[f"msdpd#{key}+stacked"],
                 lengths_of_tensors=sample_as_dict[f"msdpd#points_world_lengths"],
             )
-    # For tensors starting with "GtData#...", merge them back into GT dict
-    keys_to_pop = []
-    for key, value in sample_as_dict.items():
-        if key.startswith("gt_data#") and isinstance(value, torch.Tensor):
-            # merge into sample_dict["gt_data"]
-            tensor_key_to_be_merged = key.replace("gt_data#", "")
-            sample_as_dict["gt_data"] = merge_tensors_into_dict(
-                sample_as_dict["gt_data"], {tensor_key_to_be_merged: value}
-            )
-            keys_to_pop.append(key)
 
-    # pop the original gt tensors from sample_dict
-    for tensor_key in keys_to_pop:
-        sample_as_dict.pop(tensor_key)
+    # Merge all GT tensors into the GT dict in a single pass. The GT dict is freshly decoded from json for this sample,
+    # so it is safe to merge in place.
+    if len(gt_tensor_dict) > 0:
+        sample_as_dict["gt_data"] = merge_tensors_into_dict(
+            sample_as_dict.get("gt_data", {}), gt_tensor_dict, inplace=True
+        )
 
     return sample_as_dict
 
 
+def rescale_camera_data_in_sample(
+    sample_dict: Dict[str, Any], scale: float
+) -> Dict[str, Any]:
+    """
+    Data transform function to keep camera calibrations and 2D GT consistent with image frames that were downscaled while
+    decoding, for every camera with decoded image frames `mfcd#{camera_label}+images`.
+    Depth images are stored as tensors and are not downscaled, so their calibrations are not changed.
+    """
+    for key in list(sample_dict.keys()):
+        if not key.startswith("mfcd#") or not key.endswith("+images") or "depth" in key:
+            continue
+        camera_prefix = key[: -len("images")]
+        camera_label = camera_prefix[len("mfcd#") : -1]
+
+        if f"{camera_prefix}projection_params" in sample_dict:
+            sample_dict[f"{camera_prefix}projection_params"] = (
+                rescale_projection_params(
+                    sample_dict[f"{camera_prefix}projection_params"], scale
+                )
+            )
+        if f"{camera_prefix}camera_valid_radius" in sample_dict:
+            sample_dict[f"{camera_prefix}camera_valid_radius"] = (
+                sample_dict[f"{camera_prefix}camera_valid_radius"] * scale
+            )
+
+        # 2D bounding boxes are [N, 4] as [xmin, xmax, ymin, ymax]
+        obb2_gt = sample_dict.get("gt_data", {}).get("obb2_gt", {})
+        if camera_label in obb2_gt and "box_ranges" in obb2_gt[camera_label]:
+            box_ranges = obb2_gt[camera_label]["box_ranges"]
+            obb2_gt[camera_label]["box_ranges"] = rescale_pixel_coords(
+                box_ranges.reshape(-1, 2), scale
+            ).reshape(box_ranges.shape)
+    return sample_dict
+
+
 def select_and_remap_dict_keys(
     sample_dict: Dict[str, Any], key_mapping: Dict[str, str]
 ) -> Dict[str, Any]:
@@ -157,24 +210,8 @@ def atek_default_collation_fn(samples):
         for sample in samples:
             values_as_list.append(sample[key])
 
-        # For tensor list, check if they can be stacked. If so, stack them.
-        stackable_flag = False
-        if isinstance(values_as_list[0], torch.Tensor):
-            stackable_flag = True
-            first_tensor_shape = values_as_list[0].shape
-            first_tensor_dtype = values_as_list[0].dtype
-            for tensor_i in values_as_list:
-                if (
-                    tensor_i.shape != first_tensor_shape
-                    or tensor_i.dtype != first_tensor_dtype
-                ):
-                    print(
-                        f"Tensors for {key} have different shapes or dtypes, cannot be stacked, keep as a list"
-                    )
-                    stackable_flag = False
-                    break
-
-        if stackable_flag:
+        # For tensor list, check if they can be stacked. If so, stack them, otherwise keep as a list.
+        if _are_tensors_stackable(values_as_list):
             batched_dict[key] = torch.stack(values_as_list, dim=0)
         else:
             batched_dict[key] = values_as_list
@@ -182,11 +219,228 @@ def atek_default_collation_fn(samples):
     return batched_dict
 
 
+def _are_tensors_stackable(values: List) -> bool:
+    if not isinstance(values[0], torch.Tensor):
+        return False
+    first_tensor = values[0]
+    return all(
+        isinstance(value, torch.Tensor)
+        and value.shape == first_tensor.shape
+        and value.dtype == first_tensor.dtype
+        for value in values
+    )
+
+
+def _get_padded_tensor_leaves(values: List) -> Optional[List[List[torch.Tensor]]]:
+    """
+    Returns the tensors of a batch field as a list (per sample) of lists of tensors, if they can be padded into a single
+    tensor, i.e. they all have the same dtype and number of dims, and each sample has either a single tensor, or a list
+    of the same length of tensors (e.g. per-frame semidense points). Otherwise returns None.
+    """
+    is_list = isinstance(values[0], list)
+    leaves = [value if is_list else [value] for value in values]
+    if any(
+        not isinstance(value, list if is_list else torch.Tensor)
+        or len(sample_leaves) != len(leaves[0])
+        for value, sample_leaves in zip(values, leaves)
+    ):
+        return None
+    if len(leaves[0]) == 0 or not isinstance(leaves[0][0], torch.Tensor):
+        return None
+
+    first_tensor = leaves[0][0]
+    if not all(
+        isinstance(leaf, torch.Tensor)
+        and leaf.dtype == first_tensor.dtype
+        and leaf.dim() == first_tensor.dim()
+        and leaf.dim() > 0
+        for sample_leaves in leaves
+        for leaf in sample_leaves
+    ):
+        return None
+    return leaves
+
+
+def _allocate_batch_tensor(
+    shape: List[int], like: torch.Tensor, pin_memory: bool
+) -> torch.Tensor:
+    """
+    Allocate an uninitialized batch tensor. In DataLoader workers it is allocated in shared memory (same as
+    `torch.utils.data.default_collate`), so the batch is not copied again when sent to the main process.
+    Otherwise it is optionally allocated in pinned memory for faster host-to-device copies.
+    """
+    if torch.utils.data.get_worker_info() is not None:
+        numel = int(np.prod(shape))
+        storage = like._typed_storage()._new_shared(numel, device=like.device)
+        return like.new(storage).resize_(*shape)
+    return torch.empty(
+        shape,
+        dtype=like.dtype,
+        pin_memory=pin_memory and torch.cuda.is_available(),
+    )
+
+
+def _collate_padded_values(
+    values: List,
+    key: str,
+    batched_dict: Dict,
+    pad_value: float,
+    nested_tensor_keys: List[str],
+    pin_memory: bool,
+) -> None:
+    # Stackable tensors are stacked directly into the batch tensor
+    if _are_tensors_stackable(values):
+        batched_dict[key] = torch.stack(
+            values,
+            dim=0,
+            out=_allocate_batch_tensor(
+                [len(values)] + list(values[0].shape), values[0], pin_memory
+            ),
+        )
+        return
+
+    # Nested dicts with the same keys, e.g. `gt_data`, are collated recursively
+    if isinstance(values[0], dict) and all(
+        isinstance(value, dict) and value.keys() == values[0].keys() for value in values
+    ):
+        batched_dict[key] = {}
+        for sub_key in values[0].keys():
+            _collate_padded_values(
+                [value[sub_key] for value in values],
+                sub_key,
+                batched_dict[key],
+                pad_value,
+                nested_tensor_keys,
+                pin_memory,
+            )
+        return
+
+    leaves = _get_padded_tensor_leaves(values)
+    if leaves is None:
+        batched_dict[key] = values
+        return
+
+    if key in nested_tensor_keys and not isinstance(values[0], list):
+        batched_dict[key] = torch.nested.nested_tensor(values)
+        return
+
+    # Pad ragged tensors to the per-batch maximum of each dim, and record their lengths along the first dim
+    leaf_shapes = torch.tensor(
+        [list(leaf.shape) for sample_leaves in leaves for leaf in sample_leaves],
+        dtype=torch.int64,
+    )
+    batch_shape = [len(leaves)] + (
+        [len(leaves[0])] if isinstance(values[0], list) else []
+    )
+    padded_tensor = _allocate_batch_tensor(
+        batch_shape + leaf_shapes.max(dim=0).values.tolist(),
+        leaves[0][0],
+        pin_memory,
+    )
+    padded_tensor.fill_(pad_value)
+    padded_leaves = padded_tensor.view(-1, *padded_tensor.shape[len(batch_shape) :])
+    for i, leaf in enumerate(
+        leaf for sample_leaves in leaves for leaf in sample_leaves
+    ):
+        padded_leaves[i][tuple(slice(0, length) for length in leaf.shape)] = leaf
+    batched_dict[key] = padded_tensor
+    batched_dict[f"{key}{PADDED_LENGTHS_SUFFIX}"] = leaf_shapes[:, 0].reshape(
+        batch_shape
+    )
+
+
+def atek_padded_collation_fn(
+    samples: List[Dict],
+    pad_value: float = 0,
+    nested_tensor_keys: Optional[List[str]] = None,
+    pin_memory: bool = False,
+) -> Dict:
+    """
+    Collate ATEK samples into a batch like `atek_default_collation_fn`, but pad variable-length tensors instead of
+    keeping them as lists, so that models can process a batch with vectorized ops, e.g. GT instances in `gt_data`
+    (collated recursively), or per-frame semidense points:
+    - Tensors with different shapes, but the same dtype and number of dims, are padded with `pad_value` to the maximum
+      size in the batch of each dim, as [batch_size, *max_shape]. Their valid lengths along the first dim are returned
+      in `{key}+lengths`, as [batch_size].
+    - Lists of tensors with the same list length (e.g. `msdpd#points_world`) are padded as [batch_size, list_length,
+      *max_shape], with lengths as [batch_size, list_length].
+    - Keys in `nested_tensor_keys` are returned as nested tensors instead of being padded.
+    - Other values, e.g. strings, are kept as lists.
+    Batch tensors are allocated once and filled in place, in shared memory in DataLoader workers, or in pinned memory
+    if `pin_memory` is set. Use with `partial(atek_padded_collation_fn, ...)` as `collation_fn`.
+    """
+    if len(samples) == 0:
+        return {}
+
+    batched_dict = {}
+    for key in samples[0].keys():
+        _collate_padded_values(
+            [sample[key] for sample in samples],
+            key,
+            batched_dict,
+            pad_value,
+            nested_tensor_keys if nested_tensor_keys is not None else [],
+            pin_memory,
+        )
+    return batched_dict
+
+
 def simple_list_collation_fn(batch):
     # Simply collate as a list
     return list(batch)
 
 
+def _tarfile_samples(
+    src: Iterable[Dict],
+    url_opener: Callable,
+    select_files: Optional[Callable[[str], bool]] = None,
+) -> Iterator[Dict]:
+    """
+    Same as `wds.tariterators.tarfile_samples`, with a configurable `url_opener` stage to open shard streams,
+    e.g. with caching or read-ahead.
+    """
+    streams = url_opener(src)
+    files = wds.tariterators.tar_file_expander(streams, select_files=select_files)
+    return wds.tariterators.group_by_keys(files)
+
+
+def _decode_shard(
+    url: str, tarfile_samples_stage: Callable, decode_stages: List[Callable]
+) -> Iterator:
+    """
+    Run the decoding stages of `load_atek_wds_dataset` over a single shard.
+    """
+    samples = tarfile_samples_stage([dict(url=url)])
+    for stage in decode_stages:
+        samples = stage(samples)
+    return samples
+
+
+class EpochShuffledShardList(wds.shardlists.SimpleShardList):
+    """
+    A WDS shard list that is shuffled with `seed + epoch` at each iteration, before being split by node and worker,
+    so that all ranks see the same shard order. The epoch is incremented after each pass, e.g. for `repeat_flag`,
+    and can be set explicitly when the dataset is re-created or pickled into new worker processes every epoch.
+    If seed is None, shards are kept in the given order.
+    """
+
+    def __init__(self, urls: List[str], seed: Optional[int] = None, epoch: int = 0):
+        super().__init__(urls)
+        self.seed = seed
+        self.epoch = epoch
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def __iter__(self):
+        urls = self.urls.copy()
+        if self.seed is not None:
+            random.Random(self.seed + self.epoch).shuffle(urls)
+        self.epoch += 1
+        for url in urls:
+            yield dict(url=url)
+
+
 def load_atek_wds_dataset(
     urls: List[str],
     nodesplitter: Callable = wds.shardlists.single_node_only,
@@ -196,33 +450,217 @@ def load_atek_wds_dataset(
     collation_fn: Optional[Callable] = atek_default_collation_fn,
     repeat_flag: bool = False,
     shuffle_flag: bool = False,
-) -> wds.WebDataset:
-    # 1. load WDS samples back as dicts
-    wds_dataset = (
-        wds.WebDataset(urls, nodesplitter=nodesplitter)
-        .decode(wds.imagehandler("torchrgb8"))
-        .map(process_wds_sample)
-    )
+    select_key_globs: Optional[List[str]] = None,
+    image_decode_backend: str = "pil",
+    image_downscale_factor: int = 1,
+    shuffle_buffer_size: int = 1000,
+    shuffle_initial_size: int = 100,
+    shard_shuffle_seed: Optional[int] = None,
+    shard_shuffle_epoch: int = 0,
+    shard_cache_dir: Optional[str] = None,
+    shard_cache_max_bytes: float = 1e11,
+    shard_sha1sums: Optional[Dict[str, str]] = None,
+    num_read_ahead_shards: int = 0,
+    max_read_ahead_bytes: float = 2e9,
+    decoded_sample_cache_dir: Optional[str] = None,
+    decoded_sample_cache_max_bytes: float = 1e11,
+    decoded_sample_cache_config: Optional[Dict] = None,
+    shard_num_samples: Optional[Dict[str, int]] = None,
+    equal_epoch_length_mode: Optional[str] = None,
+    num_consumed_batches: int = 0,
+    sample_filter: Optional[WdsSampleFilter] = None,
+) -> wds.FluidWrapper:
+    """
+    Load ATEK WDS files as a webdataset of sample dicts.
+    Only the tar members needed by `dict_key_mapping` are read and decoded, e.g. an adaptor only using `mfcd#camera-rgb+images`
+    will never decode SLAM images. If set, `select_key_globs` overrides this selection with explicit WDS key globs to load,
+    e.g. ["mfcd#camera-rgb+*", "gt_data*"].
+    Image frames are decoded with `image_decode_backend` ("pil", or "torchvision" for batched JPEG decoding), and can be
+    downscaled by `image_downscale_factor` (1, 2, 4, 8) while decoding, where camera calibrations and 2D GT are rescaled accordingly.
+    If `shuffle_flag` is set, samples are shuffled before decoding, so the shuffle buffer of `shuffle_buffer_size` samples
+    only holds compressed tar members. Sampling starts once `shuffle_initial_size` samples are buffered.
+    If `shard_shuffle_seed` is set, the shard list is shuffled with `shard_shuffle_seed + shard_shuffle_epoch` before being
+    split by node and worker, with the epoch incremented after each pass over the dataset.
+    If `shard_cache_dir` is set, shards streamed over HTTP are cached in this folder on first read, and read locally afterwards,
+    see `WdsShardCache`. `shard_sha1sums` ({url: sha1sum}, e.g. `streamable_sha1sums.json` from ATEK Data Store) is used to verify them.
+    If `num_read_ahead_shards` > 0, each worker opens and buffers the next shards on background threads while decoding the
+    current one, with at most `max_read_ahead_bytes` buffered, see `read_ahead_url_opener`.
+    If `decoded_sample_cache_dir` is set, the decoded and transformed samples of each shard are cached in this folder on
+    the first pass, up to `decoded_sample_cache_max_bytes`, and read back from it in later epochs, see `DecodedSampleCache`.
+    This is only valid if `data_transform_fn` is deterministic, and `decoded_sample_cache_config` must hold its parameters
+    so that the cache is invalidated when they change. Samples are then shuffled after decoding.
+    If `shard_num_samples` ({url: number of samples}, see `get_shard_num_samples`) is set, shards are assigned to ranks and
+    workers with balanced sample counts instead of `nodesplitter`, re-drawn every epoch with `shard_shuffle_seed`, and `equal_epoch_length_mode` ("drop" or "pad") makes
+    every rank and worker yield the same number of samples per epoch, see `BalancedShardSplitter`.
+    If `num_consumed_batches` > 0, e.g. restored from a checkpoint with `AtekWdsLoaderState`, the first pass skips the
+    samples of these batches before decoding, see `ResumableSampleStream`. This is exact if shards and samples are
+    shuffled with `shard_shuffle_seed` (or not shuffled), and if the number of samples of each worker is known from
+    `shard_num_samples`. A DataLoader with several workers then yields the same remaining batches, although it starts
+    taking them from worker 0 again.
+    If `sample_filter` is set, samples are dropped before shuffling and decoding, by evaluating its predicate on their
+    small members only (e.g. `gt_data`, `sequence_name`), or on the sample index of their shards, see `WdsSampleFilter`.
+    Shard sample counts are then only exact for indexed shards, otherwise `equal_epoch_length_mode` is ignored and
+    resuming is approximate. With `decoded_sample_cache_dir`, `decoded_sample_cache_config` must also describe the predicate.
+    """
+    # 0. Push the key selection down to the tar member level, before decoding
+    if select_key_globs is None and dict_key_mapping is not None:
+        select_key_globs = create_key_globs_from_atek_keys(
+            list(dict_key_mapping.keys())
+        )
+    # Filter members are also read, but only kept in the samples if selected
+    read_key_globs = select_key_globs
+    shard_num_samples_are_exact = True
+    if sample_filter is not None:
+        if select_key_globs is not None:
+            read_key_globs = select_key_globs + sample_filter.key_globs
+        if shard_num_samples is not None:
+            shard_num_samples = sample_filter.get_filtered_shard_num_samples(
+                shard_num_samples
+            )
+            shard_num_samples_are_exact = all(
+                sample_filter.get_kept_sample_keys(url) is not None
+                for url in shard_num_samples
+            )
+            # Equalizing on the unfiltered counts would pad or drop kept samples at the wrong point
+            if not shard_num_samples_are_exact:
+                equal_epoch_length_mode = None
 
-    # 2. random shuffle
-    if shuffle_flag:
-        wds_dataset = wds_dataset.shuffle(1000)
+    # 1. load WDS samples as raw bytes, optionally with shuffled shards
+    wds_dataset = wds.FluidWrapper(
+        EpochShuffledShardList(urls, seed=shard_shuffle_seed, epoch=shard_shuffle_epoch)
+    )
+    shard_splitter = (
+        BalancedShardSplitter(
+            shard_num_samples,
+            equal_epoch_length_mode=equal_epoch_length_mode,
+            seed=shard_shuffle_seed,
+            epoch=shard_shuffle_epoch,
+        )
+        if shard_num_samples is not None
+        else None
+    )
+    if shard_splitter is not None:
+        wds_dataset = wds_dataset.compose(shard_splitter.split_shards)
+    elif nodesplitter is not None:
+        wds_dataset = wds_dataset.compose(nodesplitter)
+    shard_cache = (
+        WdsShardCache(
+            shard_cache_dir,
+            max_cache_bytes=shard_cache_max_bytes,
+            sha1sums=shard_sha1sums,
+        )
+        if shard_cache_dir is not None
+        else None
+    )
+    if num_read_ahead_shards > 0:
+        url_opener = partial(
+            read_ahead_url_opener,
+            open_fn=shard_cache.open if shard_cache is not None else wds.gopen,
+            num_read_ahead_shards=num_read_ahead_shards,
+            max_read_ahead_bytes=max_read_ahead_bytes,
+        )
+    elif shard_cache is not None:
+        url_opener = partial(cached_url_opener, shard_cache=shard_cache)
+    else:
+        url_opener = wds.tariterators.url_opener
+    if shard_splitter is None:
+        wds_dataset = wds_dataset.compose(wds.shardlists.split_by_worker)
+    tarfile_samples_stage = partial(
+        _tarfile_samples,
+        url_opener=url_opener,
+        select_files=create_wds_member_selector(read_key_globs),
+    )
+    # Drop filtered out shards and samples right after reading, before shuffling and decoding
+    if sample_filter is not None:
+        tarfile_samples_stage = partial(
+            sample_filter.filter_sample_source,
+            sample_source_stage=tarfile_samples_stage,
+            output_key_globs=select_key_globs,
+        )
 
-    # 3. remap dict keys
+    # 2. decode WDS samples back as dicts, remap dict keys, and apply data transforms
+    decode_stages = [
+        wds.filters.map(
+            partial(
+                decode_image_frames_in_wds_sample,
+                backend=image_decode_backend,
+                downscale_factor=image_downscale_factor,
+            )
+        ),
+        wds.filters.map(wds.autodecode.Decoder([], partial=True)),
+        wds.filters.map(process_wds_sample),
+    ]
+    if image_downscale_factor > 1:
+        decode_stages.append(
+            wds.filters.map(
+                partial(
+                    rescale_camera_data_in_sample, scale=1.0 / image_downscale_factor
+                )
+            )
+        )
     if dict_key_mapping is not None:
-        wds_dataset = wds_dataset.map(
-            partial(select_and_remap_dict_keys, key_mapping=dict_key_mapping)
+        decode_stages.append(
+            wds.filters.map(
+                partial(select_and_remap_dict_keys, key_mapping=dict_key_mapping)
+            )
         )
-
-    # 4. apply data transforms
     if data_transform_fn is not None:
-        wds_dataset = wds_dataset.compose(data_transform_fn)
+        decode_stages.append(data_transform_fn)
+
+    # 3. read samples of the shards of this worker, and shuffle them, on compressed samples before decoding, or on
+    # decoded samples if they are cached. Samples already consumed before resuming are skipped before decoding.
+    if decoded_sample_cache_dir is None:
+        sample_source_stage = tarfile_samples_stage
+    else:
+        decoded_sample_cache = DecodedSampleCache(
+            decoded_sample_cache_dir,
+            config_hash=compute_decoded_sample_cache_config_hash(
+                {
+                    "select_key_globs": select_key_globs,
+                    "sample_filter_key_globs": (
+                        sample_filter.key_globs if sample_filter is not None else None
+                    ),
+                    "dict_key_mapping": dict_key_mapping,
+                    "image_decode_backend": image_decode_backend,
+                    "image_downscale_factor": image_downscale_factor,
+                    "data_transform": decoded_sample_cache_config,
+                }
+            ),
+            max_cache_bytes=decoded_sample_cache_max_bytes,
+        )
+        sample_source_stage = partial(
+            decoded_sample_cache_stage,
+            decoded_sample_cache=decoded_sample_cache,
+            decode_shard_fn=partial(
+                _decode_shard,
+                tarfile_samples_stage=tarfile_samples_stage,
+                decode_stages=decode_stages,
+            ),
+        )
+    wds_dataset = wds_dataset.compose(
+        ResumableSampleStream(
+            sample_source_stage,
+            shard_splitter=shard_splitter,
+            shuffle_buffer_size=shuffle_buffer_size if shuffle_flag else 0,
+            shuffle_initial_size=shuffle_initial_size,
+            shuffle_seed=shard_shuffle_seed,
+            shuffle_epoch=shard_shuffle_epoch,
+            batch_size=batch_size,
+            num_consumed_batches=num_consumed_batches,
+            # Samples from the decoded sample cache are not tagged with their shard, and shards can only be skipped if
+            # their sample counts are exact
+            skip_unread_shards=decoded_sample_cache_dir is None
+            and shard_num_samples_are_exact,
+        )
+    )
+    if decoded_sample_cache_dir is None:
+        wds_dataset = wds_dataset.compose(*decode_stages)
 
-    # 5. batch samples
+    # 4. batch samples
     if batch_size is not None:
         wds_dataset = wds_dataset.batched(batch_size, collation_fn=collation_fn)
 
-    # 6. repeat dataset
+    # 5. repeat dataset
     if repeat_flag:
         wds_dataset = wds_dataset.repeat()
 
@@ -239,6 +677,25 @@ def create_native_atek_dataloader(
     repeat_flag: bool = False,
     shuffle_flag: bool = False,
     num_workers: int = 0,
+    select_key_globs: Optional[List[str]] = None,
+    image_decode_backend: str = "pil",
+    image_downscale_factor: int = 1,
+    shuffle_buffer_size: int = 1000,
+    shuffle_initial_size: int = 100,
+    shard_shuffle_seed: Optional[int] = None,
+    shard_shuffle_epoch: int = 0,
+    shard_cache_dir: Optional[str] = None,
+    shard_cache_max_bytes: float = 1e11,
+    shard_sha1sums: Optional[Dict[str, str]] = None,
+    num_read_ahead_shards: int = 0,
+    max_read_ahead_bytes: float = 2e9,
+    decoded_sample_cache_dir: Optional[str] = None,
+    decoded_sample_cache_max_bytes: float = 1e11,
+    decoded_sample_cache_config: Optional[Dict] = None,
+    shard_num_samples: Optional[Dict[str, int]] = None,
+    equal_epoch_length_mode: Optional[str] = None,
+    num_consumed_batches: int = 0,
+    sample_filter: Optional[WdsSampleFilter] = None,
 ) -> torch.utils.data.DataLoader:
 
     wds_dataset = load_atek_wds_dataset(
@@ -250,6 +707,25 @@ def create_native_atek_dataloader(
         collation_fn=collation_fn,
         repeat_flag=repeat_flag,
         shuffle_flag=shuffle_flag,
+        select_key_globs=select_key_globs,
+        image_decode_backend=image_decode_backend,
+        image_downscale_factor=image_downscale_factor,
+        shuffle_buffer_size=shuffle_buffer_size,
+        shuffle_initial_size=shuffle_initial_size,
+        shard_shuffle_seed=shard_shuffle_seed,
+        shard_shuffle_epoch=shard_shuffle_epoch,
+        shard_cache_dir=shard_cache_dir,
+        shard_cache_max_bytes=shard_cache_max_bytes,
+        shard_sha1sums=shard_sha1sums,
+        num_read_ahead_shards=num_read_ahead_shards,
+        max_read_ahead_bytes=max_read_ahead_bytes,
+        decoded_sample_cache_dir=decoded_sample_cache_dir,
+        decoded_sample_cache_max_bytes=decoded_sample_cache_max_bytes,
+        decoded_sample_cache_config=decoded_sample_cache_config,
+        shard_num_samples=shard_num_samples,
+        equal_epoch_length_mode=equal_epoch_length_mode,
+        num_consumed_batches=num_consumed_batches,
+        sample_filter=sample_filter,
     )
 
     return torch.utils.data.DataLoader(
@@ -0,0 +1,342 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import tarfile
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+import webdataset as wds
+
+from atek.data_loaders.atek_wds_dataloader import (
+    atek_default_collation_fn,
+    process_wds_sample,
+    rescale_camera_data_in_sample,
+    select_and_remap_dict_keys,
+)
+from atek.data_loaders.wds_sample_filter import WdsSampleFilter
+from atek.util.image_codec_utils import decode_image_frames_in_wds_sample
+from atek.util.wds_key_utils import (
+    create_key_globs_from_atek_keys,
+    is_wds_key_selected,
+    split_wds_member_name,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+TAR_SAMPLE_INDEX_VERSION = 1
+
+# A tar sample index locates every member of every sample in a tar shard, so that a single sample can be read without
+# streaming through the shard. It is invalidated when the tar file size or modification time changes.
+# {
+#     "version": 1,
+#     "tar_num_bytes": size of the tar file in bytes,
+#     "tar_mtime_ns": modification time of the tar file,
+#     "samples": [
+#         {
+#             "key": sample key, i.e. `__key__` in WDS,
+#             "members": {member key, e.g. "mfcd#camera-rgb+images_0.jpeg": [data offset in bytes, size in bytes]},
+#         },
+#         ...
+#     ],
+# }
+
+
+def build_tar_sample_index(tar_path: str) -> Dict:
+    """
+    Build the sample index of a tar shard by scanning its headers, without reading the data members.
+    """
+    samples = []
+    with tarfile.open(tar_path, "r:") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            sample_key, member_key = split_wds_member_name(member.name)
+            # Skip webdataset meta members, e.g. `__key__`
+            if sample_key.startswith("__") or member_key.startswith("__"):
+                continue
+            # WDS members of one sample are stored contiguously
+            if len(samples) == 0 or samples[-1]["key"] != sample_key:
+                samples.append({"key": sample_key, "members": {}})
+            samples[-1]["members"][member_key] = [member.offset_data, member.size]
+
+    tar_stat = os.stat(tar_path)
+    return {
+        "version": TAR_SAMPLE_INDEX_VERSION,
+        "tar_num_bytes": tar_stat.st_size,
+        "tar_mtime_ns": tar_stat.st_mtime_ns,
+        "samples": samples,
+    }
+
+
+def _get_index_cache_path(tar_path: str, index_cache_dir: Optional[str]) -> str:
+    if index_cache_dir is None:
+        return f"{tar_path}.index.json"
+    path_hash = hashlib.sha1(os.path.abspath(tar_path).encode("utf-8")).hexdigest()
+    return os.path.join(
+        index_cache_dir, f"{path_hash[:16]}_{os.path.basename(tar_path)}.index.json"
+    )
+
+
+def load_or_build_tar_sample_index(
+    tar_path: str, index_cache_dir: Optional[str] = None
+) -> Dict:
+    """
+    Load the sample index of a tar shard from its cache file, or build and cache it if missing or outdated.
+    The index is cached next to the tar file by default, or in `index_cache_dir` if set, e.g. for read-only data folders.
+    """
+    index_cache_path = _get_index_cache_path(tar_path, index_cache_dir)
+    tar_stat = os.stat(tar_path)
+    if os.path.exists(index_cache_path):
+        with open(index_cache_path, "r") as f:
+            tar_index = json.load(f)
+        if (
+            tar_index["version"] == TAR_SAMPLE_INDEX_VERSION
+            and tar_index["tar_num_bytes"] == tar_stat.st_size
+            and tar_index["tar_mtime_ns"] == tar_stat.st_mtime_ns
+        ):
+            return tar_index
+        logger.info(f"Tar sample index of {tar_path} is outdated, rebuilding it.")
+
+    tar_index = build_tar_sample_index(tar_path)
+    if index_cache_dir is not None:
+        os.makedirs(index_cache_dir, exist_ok=True)
+    # Write to a temporary file first, so that concurrent processes never read a partial index
+    temp_path = f"{index_cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(tar_index, f)
+    os.replace(temp_path, index_cache_path)
+    return tar_index
+
+
+def _get_kept_sample_keys_with_tar_index(
+    tar_path: str, tar_samples: List[Dict], sample_filter: WdsSampleFilter
+) -> List[str]:
+    """
+    Evaluate a sample filter on the samples of a tar shard, only reading their filter members at their indexed offsets.
+    """
+    kept_sample_keys = []
+    file_descriptor = os.open(tar_path, os.O_RDONLY)
+    try:
+        for sample in tar_samples:
+            raw_filter_members = {"__key__": sample["key"], "__url__": tar_path}
+            for member_key, (offset, size) in sample["members"].items():
+                if is_wds_key_selected(member_key, sample_filter.key_globs):
+                    raw_filter_members[member_key] = os.pread(
+                        file_descriptor, size, offset
+                    )
+            if sample_filter.is_sample_kept(raw_filter_members):
+                kept_sample_keys.append(sample["key"])
+    finally:
+        os.close(file_descriptor)
+    return kept_sample_keys
+
+
+class AtekWdsMapDataset(torch.utils.data.Dataset):
+    """
+    A map-style dataset over local ATEK WDS tar shards, for random access to single samples, e.g. for weighted sampling,
+    hard-example mining, `DistributedSampler`, or debugging a given sample. A byte-offset index of each shard is built once
+    and cached on disk (see `load_or_build_tar_sample_index`), and `__getitem__` only reads the members of the requested
+    sample with `os.pread`, then decodes them through the same path as `load_atek_wds_dataset`.
+    Args:
+        tar_paths: local tar shard paths.
+        dict_key_mapping, select_key_globs, image_decode_backend, image_downscale_factor: same as `load_atek_wds_dataset`.
+        data_transform_fn: optional function applied to each (remapped) sample dict.
+        index_cache_dir: optional folder to cache tar sample indices, default is next to the tar files.
+        sample_filter: optional filter of the samples in the dataset, evaluated once on their small members only, read
+            at their indexed offsets, or on the sample index of `sample_filter` if the shard is indexed there.
+    """
+
+    def __init__(
+        self,
+        tar_paths: List[str],
+        dict_key_mapping: Optional[Dict[str, str]] = None,
+        data_transform_fn: Optional[Callable[[Dict], Any]] = None,
+        select_key_globs: Optional[List[str]] = None,
+        image_decode_backend: str = "pil",
+        image_downscale_factor: int = 1,
+        index_cache_dir: Optional[str] = None,
+        sample_filter: Optional[WdsSampleFilter] = None,
+    ) -> None:
+        super().__init__()
+        self.tar_paths = list(tar_paths)
+        self.dict_key_mapping = dict_key_mapping
+        self.data_transform_fn = data_transform_fn
+        self.image_decode_backend = image_decode_backend
+        self.image_downscale_factor = image_downscale_factor
+        if select_key_globs is None and dict_key_mapping is not None:
+            select_key_globs = create_key_globs_from_atek_keys(
+                list(dict_key_mapping.keys())
+            )
+        self.select_key_globs = select_key_globs
+
+        # Flat list of (tar index, sample key, {member key: [offset, size]}) for all selected members
+        self.sample_locations = []
+        for tar_index, tar_path in enumerate(self.tar_paths):
+            tar_samples = load_or_build_tar_sample_index(tar_path, index_cache_dir)[
+                "samples"
+            ]
+            if sample_filter is not None:
+                kept_sample_keys = sample_filter.get_kept_sample_keys(tar_path)
+                if kept_sample_keys is None:
+                    kept_sample_keys = _get_kept_sample_keys_with_tar_index(
+                        tar_path, tar_samples, sample_filter
+                    )
+                kept_sample_keys = set(kept_sample_keys)
+                tar_samples = [
+                    sample
+                    for sample in tar_samples
+                    if sample["key"] in kept_sample_keys
+                ]
+            for sample in tar_samples:
+                members = {
+                    member_key: location
+                    for member_key, location in sample["members"].items()
+                    if is_wds_key_selected(member_key, self.select_key_globs)
+                }
+                self.sample_locations.append((tar_index, sample["key"], members))
+        # Sample keys are only unique within a sequence, e.g. every sequence written with an empty `prefix_string` has
+        # a "_AtekDataSample_000000" sample, so a key can map to several dataset indices
+        self._key_to_indices = defaultdict(list)
+        for i, (_, sample_key, _) in enumerate(self.sample_locations):
+            self._key_to_indices[sample_key].append(i)
+
+        self._decoder = wds.autodecode.Decoder([], partial=True)
+        # File descriptors are opened lazily in each process, so that each DataLoader worker uses its own
+        self._file_descriptors = {}
+        self._pid = None
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_file_descriptors"] = {}
+        state["_pid"] = None
+        return state
+
+    def __del__(self) -> None:
+        if self._pid == os.getpid():
+            for file_descriptor in self._file_descriptors.values():
+                os.close(file_descriptor)
+
+    def __len__(self) -> int:
+        return len(self.sample_locations)
+
+    def get_sample_keys(self) -> List[str]:
+        return [sample_key for _, sample_key, _ in self.sample_locations]
+
+    def get_index_by_key(self, sample_key: str, tar_path: Optional[str] = None) -> int:
+        """
+        Get the dataset index of a sample by its WDS `__key__`, and the tar path it is stored in (its `__url__`). Since
+        keys are only unique within a sequence, `tar_path` is required if several shards have a sample with this key.
+        """
+        indices = self._key_to_indices.get(sample_key, [])
+        if tar_path is not None:
+            indices = [
+                i
+                for i in indices
+                if self.tar_paths[self.sample_locations[i][0]] == tar_path
+            ]
+        if len(indices) == 0:
+            raise KeyError(
+                f"Sample {sample_key} not found in {tar_path if tar_path is not None else 'the dataset'}"
+            )
+        if len(indices) > 1:
+            raise ValueError(
+                f"Sample key {sample_key} is in several shards: "
+                f"{sorted({self.tar_paths[self.sample_locations[i][0]] for i in indices})}, specify its tar_path."
+            )
+        return indices[0]
+
+    def _get_file_descriptor(self, tar_index: int) -> int:
+        if self._pid != os.getpid():
+            # Forked into a new process, do not reuse the parent's file descriptors
+            self._file_descriptors = {}
+            self._pid = os.getpid()
+        if tar_index not in self._file_descriptors:
+            self._file_descriptors[tar_index] = os.open(
+                self.tar_paths[tar_index], os.O_RDONLY
+            )
+        return self._file_descriptors[tar_index]
+
+    def read_raw_wds_sample(self, index: int) -> Dict:
+        """
+        Read the selected members of a sample as bytes, in the same format as a sample streamed by `wds.WebDataset`.
+        """
+        tar_index, sample_key, members = self.sample_locations[index]
+        file_descriptor = self._get_file_descriptor(tar_index)
+        raw_sample = {"__key__": sample_key, "__url__": self.tar_paths[tar_index]}
+        for member_key, (offset, size) in members.items():
+            raw_sample[member_key] = os.pread(file_descriptor, size, offset)
+        return raw_sample
+
+    def __getitem__(self, index: int) -> Any:
+        sample = decode_image_frames_in_wds_sample(
+            self.read_raw_wds_sample(index),
+            backend=self.image_decode_backend,
+            downscale_factor=self.image_downscale_factor,
+        )
+        sample = process_wds_sample(self._decoder(sample))
+        if self.image_downscale_factor > 1:
+            sample = rescale_camera_data_in_sample(
+                sample, scale=1.0 / self.image_downscale_factor
+            )
+        if self.dict_key_mapping is not None:
+            sample = select_and_remap_dict_keys(sample, self.dict_key_mapping)
+        if self.data_transform_fn is not None:
+            sample = self.data_transform_fn(sample)
+        return sample
+
+
+def create_native_atek_map_dataloader(
+    tar_paths: List[str],
+    dict_key_mapping: Optional[Dict[str, str]] = None,
+    data_transform_fn: Optional[Callable[[Dict], Any]] = None,
+    collation_fn: Optional[Callable] = atek_default_collation_fn,
+    batch_size: Optional[int] = None,
+    shuffle_flag: bool = False,
+    sampler: Optional[torch.utils.data.Sampler] = None,
+    num_workers: int = 0,
+    select_key_globs: Optional[List[str]] = None,
+    image_decode_backend: str = "pil",
+    image_downscale_factor: int = 1,
+    index_cache_dir: Optional[str] = None,
+    sample_filter: Optional[WdsSampleFilter] = None,
+) -> torch.utils.data.DataLoader:
+    """
+    Create a DataLoader over an `AtekWdsMapDataset`. `sampler` can be e.g. a `DistributedSampler` or `WeightedRandomSampler`,
+    in which case `shuffle_flag` is ignored.
+    """
+    map_dataset = AtekWdsMapDataset(
+        tar_paths,
+        dict_key_mapping=dict_key_mapping,
+        data_transform_fn=data_transform_fn,
+        select_key_globs=select_key_globs,
+        image_decode_backend=image_decode_backend,
+        image_downscale_factor=image_downscale_factor,
+        index_cache_dir=index_cache_dir,
+        sample_filter=sample_filter,
+    )
+    return torch.utils.data.DataLoader(
+        map_dataset,
+        batch_size=batch_size,
+        shuffle=shuffle_flag if sampler is None else False,
+        sampler=sampler,
+        collate_fn=collation_fn if batch_size is not None else None,
+        num_workers=num_workers,
+        pin_memory=True,
+    )
@@ -0,0 +1,178 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import itertools
+import logging
+import random
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import torch
+import webdataset as wds
+
+from atek.data_loaders.atek_wds_dataloader import (
+    atek_default_collation_fn,
+    load_atek_wds_dataset,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class WeightedSampleMixer(torch.utils.data.IterableDataset):
+    """
+    Interleaves the samples of several datasets, drawing the next sample from dataset i with probability proportional
+    to `weights[i]`. Each DataLoader worker mixes the samples of its own shards of every dataset, with a random generator
+    seeded with `mixture_seed`, epoch, rank and worker.
+    The mixture stops when any dataset is exhausted, or when all are exhausted if `longest` is set. Datasets without
+    any sample for the current worker (e.g. with fewer shards than workers) are left out of its mixture.
+    """
+
+    def __init__(
+        self,
+        datasets: List[Iterable[Dict]],
+        weights: List[float],
+        longest: bool = False,
+        mixture_seed: Optional[int] = None,
+    ) -> None:
+        assert len(datasets) == len(
+            weights
+        ), f"Got {len(datasets)} datasets but {len(weights)} weights"
+        assert len(weights) > 0 and all(
+            weight > 0 for weight in weights
+        ), f"Mixture weights must be positive, got {weights}"
+        self.datasets = datasets
+        self.weights = weights
+        self.longest = longest
+        self.mixture_seed = mixture_seed
+        self.epoch = 0
+
+    def __iter__(self) -> Iterator[Dict]:
+        rank, _, worker, _ = wds.utils.pytorch_worker_info()
+        mixture_seed = (
+            self.mixture_seed
+            if self.mixture_seed is not None
+            else random.getrandbits(64)
+        )
+        rng = random.Random(f"{mixture_seed}/{self.epoch}/{rank}/{worker}")
+        self.epoch += 1
+
+        # Peek the first sample of every dataset, to leave out datasets that are empty for this worker
+        sources = []
+        weights = []
+        for i_dataset, (dataset, weight) in enumerate(zip(self.datasets, self.weights)):
+            source = iter(dataset)
+            first_sample = next(source, None)
+            if first_sample is None:
+                logger.warning(
+                    f"Dataset {i_dataset} of the mixture has no samples for rank {rank} worker {worker}."
+                )
+                continue
+            sources.append(itertools.chain([first_sample], source))
+            weights.append(weight)
+
+        while len(sources) > 0:
+            cumulative_weights = list(itertools.accumulate(weights))
+            i_source = min(
+                bisect.bisect_right(
+                    cumulative_weights, rng.random() * cumulative_weights[-1]
+                ),
+                len(sources) - 1,
+            )
+            sample = next(sources[i_source], None)
+            if sample is not None:
+                yield sample
+            elif self.longest:
+                del sources[i_source]
+                del weights[i_source]
+            else:
+                return
+
+
+def load_atek_wds_mixture_dataset(
+    url_lists: List[List[str]],
+    weights: List[float],
+    batch_size: Optional[int] = None,
+    collation_fn: Optional[Callable] = atek_default_collation_fn,
+    repeat_flag: bool = False,
+    longest: bool = False,
+    mixture_seed: Optional[int] = None,
+    shard_num_samples: Optional[Dict[str, int]] = None,
+    load_dataset_fn: Callable = load_atek_wds_dataset,
+    **load_dataset_kwargs,
+) -> wds.FluidWrapper:
+    """
+    Load a weighted streaming mixture of several ATEK WDS datasets, e.g. the tar lists of several
+    `load_yaml_and_extract_tar_list` YAMLs, without re-sharding them. Each tar list is loaded as an unbatched dataset with
+    `load_dataset_fn` (e.g. `load_atek_wds_dataset_as_cubercnn`) and `load_dataset_kwargs`, then samples are interleaved
+    per DataLoader worker with probabilities proportional to `weights`, see `WeightedSampleMixer`, and batched.
+    `shard_num_samples`, if set, is split into the sample counts of each tar list.
+    Note that weights set the mixing ratio of samples, so with `longest` unset, an epoch ends when the dataset with the
+    fewest samples per weight is exhausted.
+    """
+    assert len(url_lists) == len(
+        weights
+    ), f"Got {len(url_lists)} tar lists but {len(weights)} weights"
+    datasets = []
+    for urls in url_lists:
+        if shard_num_samples is not None:
+            load_dataset_kwargs["shard_num_samples"] = {
+                url: shard_num_samples[url] for url in urls
+            }
+        datasets.append(
+            load_dataset_fn(
+                urls, batch_size=None, repeat_flag=False, **load_dataset_kwargs
+            )
+        )
+
+    wds_dataset = wds.FluidWrapper(
+        WeightedSampleMixer(
+            datasets, weights, longest=longest, mixture_seed=mixture_seed
+        )
+    )
+
+    if batch_size is not None:
+        wds_dataset = wds_dataset.batched(batch_size, collation_fn=collation_fn)
+
+    if repeat_flag:
+        wds_dataset = wds_dataset.repeat()
+
+    return wds_dataset
+
+
+def create_native_atek_mixture_dataloader(
+    url_lists: List[List[str]],
+    weights: List[float],
+    batch_size: Optional[int] = None,
+    collation_fn: Optional[Callable] = atek_default_collation_fn,
+    repeat_flag: bool = False,
+    num_workers: int = 0,
+    longest: bool = False,
+    mixture_seed: Optional[int] = None,
+    **load_dataset_kwargs,
+) -> torch.utils.data.DataLoader:
+    wds_dataset = load_atek_wds_mixture_dataset(
+        url_lists,
+        weights,
+        batch_size=batch_size,
+        collation_fn=collation_fn,
+        repeat_flag=repeat_flag,
+        longest=longest,
+        mixture_seed=mixture_seed,
+        **load_dataset_kwargs,
+    )
+
+    return torch.utils.data.DataLoader(
+        wds_dataset, batch_size=None, num_workers=num_workers, pin_memory=True
+    )
@@ -21,8 +21,16 @@ import torch
 import webdataset as wds
 
 from atek.data_loaders.atek_wds_dataloader import load_atek_wds_dataset
+from atek.data_loaders.wds_sample_filter import (
+    load_wds_sample_index,
+    WdsSampleFilter,
+)
 from atek.util.atek_constants import ATEK_CATEGORY_ID_TO_NAME, ATEK_CATEGORY_NAME_TO_ID
-from projectaria_tools.core.sophus import SE3
+from atek.util.se3_utils import (
+    compose_se3,
+    invert_se3,
+    se3_from_rotation_and_translation,
+)
 
 from webdataset.filters import pipelinefilter
 
@@ -54,6 +62,30 @@ class CubeRCNNModelAdaptor:
         }
         return dict_key_mapping
 
+    @staticmethod
+    def has_valid_gt(sample_members: Dict) -> bool:
+        """
+        Sample predicate of `WdsSampleFilter`, evaluated before images are decoded: keeps samples with at least one
+        camera-rgb 3D GT instance that is not "Other". This is a superset of the samples with non-empty `gt_classes`
+        after `atek_to_cubercnn`, which also filters instances by 2D area and depth.
+        """
+        obb3_gt = (
+            sample_members.get("gt_data", {}).get("obb3_gt", {}).get("camera-rgb", {})
+        )
+        return "category_ids" in obb3_gt and bool((obb3_gt["category_ids"] > 0).any())
+
+    @staticmethod
+    def create_sample_filter(urls: List[str]) -> WdsSampleFilter:
+        """
+        Create a sample filter with `has_valid_gt`, that only reads the category ids of each sample, or uses the sample
+        index of the shard folders if available.
+        """
+        return WdsSampleFilter(
+            CubeRCNNModelAdaptor.has_valid_gt,
+            key_globs=["gt_data#obb3_gt+camera-rgb+category_ids.*"],
+            sample_index=load_wds_sample_index(urls),
+        )
+
     def atek_to_cubercnn(self, data):
         """
         A helper data transform function to convert a ATEK webdataset data sample built by CubeRCNNSampleBuilder, to CubeRCNN unbatched
@@ -108,10 +140,11 @@ class CubeRCNNModelAdaptor:
         """
         Compute world-to-camera transformation matrices, and update this field in sample dict.
         """
-        T_world_device = SE3.from_matrix3x4(atek_wds_sample["ts_world_device"][0])
-        T_device_rgbCam = SE3.from_matrix3x4(atek_wds_sample["t_device_rgbcam"])
-        T_world_rgbCam = T_world_device @ T_device_rgbCam
-        sample["T_world_camera"] = T_world_rgbCam.to_matrix3x4()
+        T_world_rgbCam = compose_se3(
+            atek_wds_sample["ts_world_device"][0].to(torch.float64),
+            atek_wds_sample["t_device_rgbcam"].to(torch.float64),
+        )
+        sample["T_world_camera"] = T_world_rgbCam.numpy()
 
     def _process_2d_bbox_dict(self, bb2d_dict):
         """
@@ -134,27 +167,12 @@ class CubeRCNNModelAdaptor:
         """
         bb3d_dimensions = bbox3d_dict["object_dimensions"]
 
-        bb3d_depths_list = []
-        Ts_world_object_list = []
-        Ts_cam_object_list = []
-        for _, pose_as_tensor in enumerate(bbox3d_dict["ts_world_object"]):
-            T_world_object = SE3.from_matrix3x4(pose_as_tensor.numpy())
-            T_cam_object = T_world_rgbCam.inverse() @ T_world_object
-
-            # Add to lists
-            Ts_world_object_list.append(
-                torch.tensor(T_world_object.to_matrix3x4(), dtype=torch.float32)
-            )
-
-            Ts_cam_object_list.append(
-                torch.tensor(T_cam_object.to_matrix3x4(), dtype=torch.float32)
-            )
-            bb3d_depths_list.append(T_cam_object.translation()[:, 2].item())
-
-        # Convert lists to tensors
-        bb3d_depths = torch.tensor(bb3d_depths_list, dtype=torch.float32)
-        Ts_world_object = torch.stack(Ts_world_object_list, dim=0)
-        Ts_cam_object = torch.stack(Ts_cam_object_list, dim=0)
+        # All objects are transformed at once, in float64 as the camera pose
+        Ts_world_object = bbox3d_dict["ts_world_object"].to(torch.float64)
+        Ts_cam_object = compose_se3(invert_se3(T_world_rgbCam), Ts_world_object)
+        bb3d_depths = Ts_cam_object[:, 2, 3].to(torch.float32)
+        Ts_world_object = Ts_world_object.to(torch.float32)
+        Ts_cam_object = Ts_cam_object.to(torch.float32)
 
         return bb3d_dimensions, bb3d_depths, Ts_world_object, Ts_cam_object
 
@@ -174,7 +192,7 @@ class CubeRCNNModelAdaptor:
 
         category_ids = bbox3d_dict["category_ids"]
 
-        T_world_rgbCam = SE3.from_matrix3x4(sample["T_world_camera"])
+        T_world_rgbCam = torch.from_numpy(sample["T_world_camera"])
 
         bb2ds_x0y0x1y1, bb2ds_area = self._process_2d_bbox_dict(bbox2d_dict)
         bb3d_dimensions, bb3d_depths, Ts_world_object, Ts_cam_object = (
@@ -321,20 +339,19 @@ class CubeRCNNModelAdaptor:
         # Fill in pose
         rotations = cubercnn_instances.pred_pose.detach().cpu()  # [num_instances, 3, 3]
         translations = (
-            cubercnn_instances.pred_center_cam.detach().cpu().unsqueeze(2)
-        )  # [num_instances, 3, 1]
+            cubercnn_instances.pred_center_cam.detach().cpu()
+        )  # [num_instances, 3]
 
-        Ts_cam_object = SE3.from_matrix3x4(
-            torch.cat((rotations, translations), dim=2).numpy()
+        Ts_cam_object = se3_from_rotation_and_translation(rotations, translations).to(
+            torch.float64
         )
-        T_world_cam = SE3.from_matrix3x4(T_world_camera_np)
-
-        Ts_world_object = T_world_cam @ Ts_cam_object
-        Ts_world_object = SE3.to_matrix3x4(Ts_world_object)  # [num_instances, 3, 4]
-        if Ts_world_object.shape == (3, 4):
-            Ts_world_object = Ts_world_object.reshape(1, 3, 4)
-        atek_dict["obb3_gt"][camera_label]["ts_world_object"] = torch.tensor(
-            Ts_world_object, dtype=torch.float32
+        T_world_cam = torch.as_tensor(T_world_camera_np, dtype=torch.float64)
+
+        Ts_world_object = compose_se3(
+            T_world_cam, Ts_cam_object
+        )  # [num_instances, 3, 4]
+        atek_dict["obb3_gt"][camera_label]["ts_world_object"] = Ts_world_object.to(
+            torch.float32
         )
 
         # Fill in 2d bbox ranges
@@ -355,8 +372,32 @@ def cubercnn_collation_fn(batch):
 
 
 def load_atek_wds_dataset_as_cubercnn(
-    urls: List, batch_size: Optional[int], repeat_flag: bool, shuffle_flag: bool = False
-) -> wds.WebDataset:
+    urls: List,
+    batch_size: Optional[int],
+    repeat_flag: bool,
+    shuffle_flag: bool = False,
+    image_decode_backend: str = "pil",
+    image_downscale_factor: int = 1,
+    shuffle_buffer_size: int = 1000,
+    shuffle_initial_size: int = 100,
+    shard_shuffle_seed: Optional[int] = None,
+    shard_shuffle_epoch: int = 0,
+    shard_cache_dir: Optional[str] = None,
+    shard_cache_max_bytes: float = 1e11,
+    shard_sha1sums: Optional[Dict[str, str]] = None,
+    num_read_ahead_shards: int = 0,
+    max_read_ahead_bytes: float = 2e9,
+    decoded_sample_cache_dir: Optional[str] = None,
+    decoded_sample_cache_max_bytes: float = 1e11,
+    shard_num_samples: Optional[Dict[str, int]] = None,
+    equal_epoch_length_mode: Optional[str] = None,
+    num_consumed_batches: int = 0,
+    skip_samples_without_gt: bool = False,
+) -> wds.FluidWrapper:
+    """
+    If `skip_samples_without_gt` is set, samples without any valid GT instance are dropped before their images are
+    decoded, see `CubeRCNNModelAdaptor.has_valid_gt`.
+    """
     cubercnn_model_adaptor = CubeRCNNModelAdaptor()
 
     return load_atek_wds_dataset(
@@ -367,6 +408,35 @@ def load_atek_wds_dataset_as_cubercnn(
         collation_fn=cubercnn_collation_fn,
         repeat_flag=repeat_flag,
         shuffle_flag=shuffle_flag,
+        image_decode_backend=image_decode_backend,
+        image_downscale_factor=image_downscale_factor,
+        shuffle_buffer_size=shuffle_buffer_size,
+        shuffle_initial_size=shuffle_initial_size,
+        shard_shuffle_seed=shard_shuffle_seed,
+        shard_shuffle_epoch=shard_shuffle_epoch,
+        shard_cache_dir=shard_cache_dir,
+        shard_cache_max_bytes=shard_cache_max_bytes,
+        shard_sha1sums=shard_sha1sums,
+        num_read_ahead_shards=num_read_ahead_shards,
+        max_read_ahead_bytes=max_read_ahead_bytes,
+        decoded_sample_cache_dir=decoded_sample_cache_dir,
+        decoded_sample_cache_max_bytes=decoded_sample_cache_max_bytes,
+        shard_num_samples=shard_num_samples,
+        equal_epoch_length_mode=equal_epoch_length_mode,
+        num_consumed_batches=num_consumed_batches,
+        sample_filter=(
+            CubeRCNNModelAdaptor.create_sample_filter(urls)
+            if skip_samples_without_gt
+            else None
+        ),
+        # The adaptor is deterministic, so its outputs can be cached across epochs
+        decoded_sample_cache_config={
+            "model_adaptor": "CubeRCNNModelAdaptor",
+            "min_bb2d_area": cubercnn_model_adaptor.min_bb2d_area,
+            "min_bb3d_depth": cubercnn_model_adaptor.min_bb3d_depth,
+            "max_bb3d_depth": cubercnn_model_adaptor.max_bb3d_depth,
+            "skip_samples_without_gt": skip_samples_without_gt,
+        },
     )
 
 
@@ -376,12 +446,46 @@ def create_atek_dataloader_as_cubercnn(
     repeat_flag: bool = False,
     shuffle_flag: bool = False,
     num_workers: int = 0,
+    image_decode_backend: str = "pil",
+    image_downscale_factor: int = 1,
+    shuffle_buffer_size: int = 1000,
+    shuffle_initial_size: int = 100,
+    shard_shuffle_seed: Optional[int] = None,
+    shard_shuffle_epoch: int = 0,
+    shard_cache_dir: Optional[str] = None,
+    shard_cache_max_bytes: float = 1e11,
+    shard_sha1sums: Optional[Dict[str, str]] = None,
+    num_read_ahead_shards: int = 0,
+    max_read_ahead_bytes: float = 2e9,
+    decoded_sample_cache_dir: Optional[str] = None,
+    decoded_sample_cache_max_bytes: float = 1e11,
+    shard_num_samples: Optional[Dict[str, int]] = None,
+    equal_epoch_length_mode: Optional[str] = None,
+    num_consumed_batches: int = 0,
+    skip_samples_without_gt: bool = False,
 ) -> torch.utils.data.DataLoader:
     wds_dataset = load_atek_wds_dataset_as_cubercnn(
         urls,
         batch_size=batch_size,
         repeat_flag=repeat_flag,
         shuffle_flag=shuffle_flag,
+        image_decode_backend=image_decode_backend,
+        image_downscale_factor=image_downscale_factor,
+        shuffle_buffer_size=shuffle_buffer_size,
+        shuffle_initial_size=shuffle_initial_size,
+        shard_shuffle_seed=shard_shuffle_seed,
+        shard_shuffle_epoch=shard_shuffle_epoch,
+        shard_cache_dir=shard_cache_dir,
+        shard_cache_max_bytes=shard_cache_max_bytes,
+        shard_sha1sums=shard_sha1sums,
+        num_read_ahead_shards=num_read_ahead_shards,
+        max_read_ahead_bytes=max_read_ahead_bytes,
+        decoded_sample_cache_dir=decoded_sample_cache_dir,
+        decoded_sample_cache_max_bytes=decoded_sample_cache_max_bytes,
+        shard_num_samples=shard_num_samples,
+        equal_epoch_length_mode=equal_epoch_length_mode,
+        num_consumed_batches=num_consumed_batches,
+        skip_samples_without_gt=skip_samples_without_gt,
     )
 
     return torch.utils.data.DataLoader(
@@ -0,0 +1,329 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DECODED_SAMPLE_CACHE_VERSION = 1
+
+# Tensor data in cache files is aligned to this many bytes
+DATA_ALIGNMENT_BYTES = 64
+
+# Suffix of cache files being written, which are not counted as cached shards
+CACHE_TEMP_FILE_SUFFIX = ".tmp"
+
+# Name of the lock file that serializes cache updates across DataLoader workers and processes
+CACHE_LOCK_FILE_NAME = ".lock"
+
+# A cached shard is stored as 2 files:
+# - `{entry}.bin`: raw bytes of all tensors and arrays of all samples of the shard, e.g. uint8 images and GT tensors.
+# - `{entry}.json`: the sample structure, where each tensor is stored as {"t": "tensor", "dtype", "shape", "offset"}
+#   into the .bin file. The .json file is written last, so a cached shard is complete iff its .json file exists.
+# {
+#     "version": 1,
+#     "config_hash": hash of the loading config, see `compute_decoded_sample_cache_config_hash`,
+#     "url": source shard url,
+#     "source_stat": [size in bytes, mtime in ns] of the source shard if it is a local file, else None,
+#     "samples": [encoded sample, ...],
+# }
+
+
+def compute_decoded_sample_cache_config_hash(config: Dict) -> str:
+    """
+    Hash of everything that affects the decoded samples, e.g. key mapping, image decoding and adaptor parameters.
+    Cached samples are only used if they were written with the same config hash.
+    """
+    config_str = json.dumps(
+        {"version": DECODED_SAMPLE_CACHE_VERSION, "config": config},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(config_str.encode("utf-8")).hexdigest()[:16]
+
+
+def _get_source_stat(url: str) -> Optional[list]:
+    if urlparse(url).scheme not in ["", "file"]:
+        return None
+    try:
+        source_stat = os.stat(urlparse(url).path)
+    except FileNotFoundError:
+        return None
+    return [source_stat.st_size, source_stat.st_mtime_ns]
+
+
+class _CacheFileWriter:
+    """
+    Encodes samples into the cache format, appending tensor data to a temporary .bin file.
+    """
+
+    def __init__(self, data_path: str) -> None:
+        self.data_file = open(data_path, "wb")
+        self.num_bytes = 0
+
+    def _write_tensor(self, tensor: torch.Tensor) -> Dict:
+        tensor = tensor.detach().cpu().contiguous()
+        padding = -self.num_bytes % DATA_ALIGNMENT_BYTES
+        self.data_file.write(b"\0" * padding)
+        self.num_bytes += padding
+
+        offset = self.num_bytes
+        data = tensor.reshape(-1).view(torch.uint8).numpy().tobytes()
+        self.data_file.write(data)
+        self.num_bytes += len(data)
+        return {
+            "t": "tensor",
+            "dtype": str(tensor.dtype).split(".")[-1],
+            "shape": list(tensor.shape),
+            "offset": offset,
+        }
+
+    def encode(self, value: Any) -> Any:
+        if isinstance(value, torch.Tensor):
+            return self._write_tensor(value)
+        if isinstance(value, (np.ndarray, np.generic)):
+            encoded = self._write_tensor(torch.from_numpy(np.array(value)))
+            encoded["t"] = "ndarray"
+            return encoded
+        if isinstance(value, dict):
+            return {
+                "t": "dict",
+                "items": {key: self.encode(item) for key, item in value.items()},
+            }
+        if isinstance(value, (list, tuple)):
+            return [self.encode(item) for item in value]
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+
+        # Model-specific structures, e.g. from `CubeRCNNModelAdaptor`
+        from detectron2.structures import Boxes, Instances
+
+        if isinstance(value, Instances):
+            return {
+                "t": "instances",
+                "image_size": list(value.image_size),
+                "fields": {
+                    key: self.encode(item) for key, item in value.get_fields().items()
+                },
+            }
+        if isinstance(value, Boxes):
+            return {"t": "boxes", "tensor": self.encode(value.tensor)}
+        raise TypeError(
+            f"Type {type(value)} is not supported by the decoded sample cache."
+        )
+
+    def close(self) -> None:
+        self.data_file.close()
+
+
+def _decode(encoded: Any, data: np.ndarray) -> Any:
+    if isinstance(encoded, list):
+        return [_decode(item, data) for item in encoded]
+    if not isinstance(encoded, dict):
+        return encoded
+
+    value_type = encoded["t"]
+    if value_type in ["tensor", "ndarray"]:
+        dtype = getattr(torch, encoded["dtype"])
+        num_bytes = int(np.prod(encoded["shape"])) * dtype.itemsize
+        tensor = (
+            torch.from_numpy(data[encoded["offset"] : encoded["offset"] + num_bytes])
+            .view(dtype)
+            .reshape(encoded["shape"])
+        )
+        return tensor if value_type == "tensor" else tensor.numpy()
+    if value_type == "dict":
+        return {key: _decode(item, data) for key, item in encoded["items"].items()}
+
+    from detectron2.structures import Boxes, Instances
+
+    if value_type == "instances":
+        return Instances(
+            tuple(encoded["image_size"]),
+            **{key: _decode(item, data) for key, item in encoded["fields"].items()},
+        )
+    if value_type == "boxes":
+        return Boxes(_decode(encoded["tensor"], data))
+    raise ValueError(f"Unknown value type {value_type} in decoded sample cache.")
+
+
+class DecodedSampleCache:
+    """
+    A disk cache of fully decoded (post-adaptor) samples, per source shard, for multi-epoch training where decoding and
+    model adaptation are deterministic, e.g. CubeRCNN. On the first pass over a shard its decoded samples are written
+    to `cache_dir` while being yielded, and later passes read them back through a memory map instead of re-decoding.
+    Cached shards are only used if they were written with the same `config_hash`, and if the source shard is a local
+    file, with the same size and modification time.
+    New shards are cached until `max_cache_bytes` is reached, after removing shards cached with other config hashes.
+    Shards of the current config are never evicted, since every epoch reads every shard and LRU eviction would only
+    replace cached shards with others. Safe to share across DataLoader workers and processes.
+    """
+
+    def __init__(
+        self, cache_dir: str, config_hash: str, max_cache_bytes: float = 1e11
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.config_hash = config_hash
+        self.max_cache_bytes = max_cache_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_entry_path(self, url: str) -> str:
+        # Shards from different sequences share names (e.g. shards-0000.tar), so prefix with a hash of the full url
+        url_hash = hashlib.sha1(
+            f"{self.config_hash}/{url}".encode("utf-8")
+        ).hexdigest()[:16]
+        return os.path.join(
+            self.cache_dir, f"{url_hash}_{os.path.basename(urlparse(url).path)}"
+        )
+
+    def get_cache_num_bytes(self) -> int:
+        num_bytes = 0
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith(".") or file_name.endswith(CACHE_TEMP_FILE_SUFFIX):
+                continue
+            num_bytes += os.path.getsize(os.path.join(self.cache_dir, file_name))
+        return num_bytes
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        with open(os.path.join(self.cache_dir, CACHE_LOCK_FILE_NAME), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load_shard(self, url: str) -> Optional[Iterator[Dict]]:
+        """
+        Returns an iterator over the cached samples of a shard, or None if the shard is not cached.
+        """
+        entry_path = self._get_entry_path(url)
+        try:
+            with open(f"{entry_path}.json", "r") as f:
+                header = json.load(f)
+        except FileNotFoundError:
+            return None
+        if (
+            header["version"] != DECODED_SAMPLE_CACHE_VERSION
+            or header["config_hash"] != self.config_hash
+            or header["url"] != url
+            or header["source_stat"] != _get_source_stat(url)
+        ):
+            logger.info(f"Decoded sample cache of {url} is outdated, not using it.")
+            return None
+
+        # Copy-on-write, so samples are writable tensors without touching the cache file
+        if os.path.getsize(f"{entry_path}.bin") > 0:
+            data = np.memmap(f"{entry_path}.bin", dtype=np.uint8, mode="c")
+        else:
+            data = np.zeros(0, dtype=np.uint8)
+        return (_decode(encoded, data) for encoded in header["samples"])
+
+    def write_shard(self, url: str, samples: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Yields the decoded samples of a shard while writing them to the cache. The shard is only added to the cache if
+        all of its samples were yielded, and if it fits in the byte budget.
+        """
+        entry_path = self._get_entry_path(url)
+        temp_path = f"{entry_path}.{uuid.uuid4().hex}"
+        header = {
+            "version": DECODED_SAMPLE_CACHE_VERSION,
+            "config_hash": self.config_hash,
+            "url": url,
+            "source_stat": _get_source_stat(url),
+            "samples": [],
+        }
+        writer = _CacheFileWriter(f"{temp_path}.bin{CACHE_TEMP_FILE_SUFFIX}")
+        completed = False
+        try:
+            for sample in samples:
+                header["samples"].append(writer.encode(sample))
+                yield sample
+            completed = True
+        finally:
+            writer.close()
+            if completed:
+                with open(f"{temp_path}.json{CACHE_TEMP_FILE_SUFFIX}", "w") as f:
+                    json.dump(header, f)
+                self._add_shard(url, temp_path)
+            for suffix in [".bin", ".json"]:
+                if os.path.exists(f"{temp_path}{suffix}{CACHE_TEMP_FILE_SUFFIX}"):
+                    os.remove(f"{temp_path}{suffix}{CACHE_TEMP_FILE_SUFFIX}")
+
+    def _remove_stale_shards(self) -> None:
+        """
+        Remove cached shards written with a different config hash, which can never be read by this cache.
+        """
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(".json"):
+                continue
+            entry_path = os.path.join(self.cache_dir, file_name[: -len(".json")])
+            with open(f"{entry_path}.json", "r") as f:
+                config_hash = json.load(f)["config_hash"]
+            if config_hash != self.config_hash:
+                logger.info(f"Removing stale decoded sample cache {entry_path}")
+                os.remove(f"{entry_path}.json")
+                os.remove(f"{entry_path}.bin")
+
+    def _add_shard(self, url: str, temp_path: str) -> bool:
+        num_bytes = sum(
+            os.path.getsize(f"{temp_path}{suffix}{CACHE_TEMP_FILE_SUFFIX}")
+            for suffix in [".bin", ".json"]
+        )
+        entry_path = self._get_entry_path(url)
+        with self._lock():
+            if self.get_cache_num_bytes() + num_bytes > self.max_cache_bytes:
+                self._remove_stale_shards()
+            if self.get_cache_num_bytes() + num_bytes > self.max_cache_bytes:
+                logger.warning(
+                    f"Decoded sample cache in {self.cache_dir} is full, not caching {url}."
+                )
+                return False
+            # .json last, as it marks the cached shard as complete
+            for suffix in [".bin", ".json"]:
+                os.replace(
+                    f"{temp_path}{suffix}{CACHE_TEMP_FILE_SUFFIX}",
+                    f"{entry_path}{suffix}",
+                )
+        return True
+
+
+def decoded_sample_cache_stage(
+    data: Iterable[Dict],
+    decoded_sample_cache: DecodedSampleCache,
+    decode_shard_fn,
+) -> Iterator[Dict]:
+    """
+    A webdataset pipeline stage over shard urls, yielding the decoded samples of each shard from the cache if available,
+    or else from `decode_shard_fn(url)`, while caching them.
+    """
+    for shard in data:
+        url = shard["url"]
+        cached_samples = decoded_sample_cache.load_shard(url)
+        if cached_samples is not None:
+            yield from cached_samples
+        else:
+            yield from decoded_sample_cache.write_shard(url, decode_shard_fn(url))
@@ -12,9 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import torch
+import webdataset as wds
 
 from atek.data_loaders.atek_wds_dataloader import (
     load_atek_wds_dataset,
@@ -69,17 +70,27 @@ class Sam2ModelAdaptor:
             yield sample
 
 
-def create_atek_dataloader_as_sam2(
+def load_atek_wds_dataset_as_sam2(
     urls: List[str],
     batch_size: Optional[int] = None,
     repeat_flag: bool = False,
     shuffle_flag: bool = False,
-    num_workers: int = 0,
     num_prompt_boxes: int = 5,
-) -> torch.utils.data.DataLoader:
-
+    image_decode_backend: str = "pil",
+    image_downscale_factor: int = 1,
+    shuffle_buffer_size: int = 1000,
+    shuffle_initial_size: int = 100,
+    shard_shuffle_seed: Optional[int] = None,
+    shard_shuffle_epoch: int = 0,
+    shard_cache_dir: Optional[str] = None,
+    shard_cache_max_bytes: float = 1e11,
+    shard_sha1sums: Optional[Dict[str, str]] = None,
+    num_read_ahead_shards: int = 0,
+    max_read_ahead_bytes: float = 2e9,
+) -> wds.FluidWrapper:
     adaptor = Sam2ModelAdaptor(num_boxes=num_prompt_boxes)
-    wds_dataset = load_atek_wds_dataset(
+
+    return load_atek_wds_dataset(
         urls,
         batch_size=batch_size,
         dict_key_mapping=Sam2ModelAdaptor.get_dict_key_mapping_all(),
@@ -87,6 +98,56 @@ def create_atek_dataloader_as_sam2(
         collation_fn=simple_list_collation_fn,
         repeat_flag=repeat_flag,
         shuffle_flag=shuffle_flag,
+        image_decode_backend=image_decode_backend,
+        image_downscale_factor=image_downscale_factor,
+        shuffle_buffer_size=shuffle_buffer_size,
+        shuffle_initial_size=shuffle_initial_size,
+        shard_shuffle_seed=shard_shuffle_seed,
+        shard_shuffle_epoch=shard_shuffle_epoch,
+        shard_cache_dir=shard_cache_dir,
+        shard_cache_max_bytes=shard_cache_max_bytes,
+        shard_sha1sums=shard_sha1sums,
+        num_read_ahead_shards=num_read_ahead_shards,
+        max_read_ahead_bytes=max_read_ahead_bytes,
+    )
+
+
+def create_atek_dataloader_as_sam2(
+    urls: List[str],
+    batch_size: Optional[int] = None,
+    repeat_flag: bool = False,
+    shuffle_flag: bool = False,
+    num_workers: int = 0,
+    num_prompt_boxes: int = 5,
+    image_decode_backend: str = "pil",
+    image_downscale_factor: int = 1,
+    shuffle_buffer_size: int = 1000,
+    shuffle_initial_size: int = 100,
+    shard_shuffle_seed: Optional[int] = None,
+    shard_shuffle_epoch: int = 0,
+    shard_cache_dir: Optional[str] = None,
+    shard_cache_max_bytes: float = 1e11,
+    shard_sha1sums: Optional[Dict[str, str]] = None,
+    num_read_ahead_shards: int = 0,
+    max_read_ahead_bytes: float = 2e9,
+) -> torch.utils.data.DataLoader:
+    wds_dataset = load_atek_wds_dataset_as_sam2(
+        urls,
+        batch_size=batch_size,
+        repeat_flag=repeat_flag,
+        shuffle_flag=shuffle_flag,
+        num_prompt_boxes=num_prompt_boxes,
+        image_decode_backend=image_decode_backend,
+        image_downscale_factor=image_downscale_factor,
+        shuffle_buffer_size=shuffle_buffer_size,
+        shuffle_initial_size=shuffle_initial_size,
+        shard_shuffle_seed=shard_shuffle_seed,
+        shard_shuffle_epoch=shard_shuffle_epoch,
+        shard_cache_dir=shard_cache_dir,
+        shard_cache_max_bytes=shard_cache_max_bytes,
+        shard_sha1sums=shard_sha1sums,
+        num_read_ahead_shards=num_read_ahead_shards,
+        max_read_ahead_bytes=max_read_ahead_bytes,
     )
 
     return torch.utils.data.DataLoader(
@@ -18,13 +18,23 @@ import tempfile
 import unittest
 
 import torch
-from atek.data_loaders.atek_wds_dataloader import load_atek_wds_dataset
+from atek.data_loaders.atek_wds_dataloader import (
+    atek_padded_collation_fn,
+    EpochShuffledShardList,
+    load_atek_wds_dataset,
+)
 from atek.data_preprocess.atek_wds_writer import AtekWdsWriter
 from atek.data_preprocess.sample_builders.obb_sample_builder import ObbSampleBuilder
 from atek.data_preprocess.subsampling_lib.temporal_subsampler import (
     CameraTemporalSubsampler,
 )
+from atek.util.camera_calib_utils import rescale_projection_params
 from atek.util.tensor_utils import check_dicts_same_w_tensors
+from atek.util.wds_manifest_utils import (
+    get_sorted_shard_paths,
+    load_wds_manifest,
+    scan_shard_info,
+)
 
 from omegaconf import OmegaConf
 
@@ -41,7 +51,7 @@ class LoadAtekWdsDatasetTest(unittest.TestCase):
         self.temp_dir_object = tempfile.TemporaryDirectory()
         self.output_wds_path = self.temp_dir_object.name
 
-    def _preprocess_data(self) -> None:
+    def _preprocess_data(self, wds_writer_conf_overrides=None) -> None:
         """
         A helper function to preprocess some ATEK data and write to WDS.
         """
@@ -75,9 +85,14 @@ class LoadAtekWdsDatasetTest(unittest.TestCase):
             conf=conf.camera_temporal_subsampler,
         )
 
+        wds_writer_conf = conf.wds_writer
+        if wds_writer_conf_overrides is not None:
+            wds_writer_conf = OmegaConf.merge(
+                wds_writer_conf, wds_writer_conf_overrides
+            )
         atek_wds_writer = AtekWdsWriter(
             output_path=self.output_wds_path,
-            conf=conf.wds_writer,
+            conf=wds_writer_conf,
         )
 
         # will be used for comparison after loading data
@@ -96,20 +111,84 @@ class LoadAtekWdsDatasetTest(unittest.TestCase):
     def test_atek_native_round_trip(self) -> None:
         # Preprocess data and create WDS files
         self._preprocess_data()
+        self._check_round_trip()
+
+    def test_atek_native_round_trip_raw_tensor_format(self) -> None:
+        # Preprocess data and create WDS files, with tensors in raw tensor format
+        self._preprocess_data(wds_writer_conf_overrides={"tensor_format": "rawtensor"})
+        self._check_round_trip()
+
+    def test_atek_native_round_trip_lossless_image_codecs(self) -> None:
+        # Preprocess data with lossless image codecs, encoded in parallel
+        self._preprocess_data(
+            wds_writer_conf_overrides={
+                "image_codecs": {
+                    "default": {"format": "png"},
+                    "camera-rgb": {"format": "raw"},
+                },
+                "num_image_encode_workers": 2,
+            }
+        )
+        self._check_round_trip(check_images=True)
+
+    def test_size_targeted_sharding_and_manifest(self) -> None:
+        # A tiny size limit rolls over to a new shard after every sample
+        self._preprocess_data(
+            wds_writer_conf_overrides={
+                "max_shard_size_bytes": 1,
+                "remove_last_tar_if_not_full": False,
+            }
+        )
+        num_samples = len(self.expected_flattened_samples)
+        tar_list = get_sorted_shard_paths(self.output_wds_path)
+        self.assertEqual(len(tar_list), num_samples)
+
+        # Manifest should be consistent with the shard content
+        manifest = load_wds_manifest(self.output_wds_path)
+        self.assertEqual(manifest["num_samples"], num_samples)
+        self.assertEqual(
+            [shard_info["name"] for shard_info in manifest["shards"]],
+            [os.path.basename(tar_path) for tar_path in tar_list],
+        )
+        for shard_info, tar_path in zip(manifest["shards"], tar_list):
+            self.assertEqual(shard_info, scan_shard_info(tar_path))
+
+        # Samples are loaded back in the original order
+        unbatched_dataset = load_atek_wds_dataset(
+            tar_list, batch_size=None, repeat_flag=False
+        )
+        for expected_sample, sample in zip(
+            self.expected_flattened_samples, unbatched_dataset
+        ):
+            self.assertTrue(
+                torch.allclose(
+                    expected_sample["mfcd#camera-rgb+capture_timestamps_ns"],
+                    sample["mfcd#camera-rgb+capture_timestamps_ns"],
+                )
+            )
+
+    def _check_round_trip(self, check_images: bool = False) -> None:
 
         # check number of tars created
-        output_wds_names = os.listdir(self.output_wds_path)
-        self.assertEqual(len(output_wds_names), 1)  # only 1 tar file created
+        tar_list = get_sorted_shard_paths(self.output_wds_path)
+        self.assertEqual(len(tar_list), 1)  # only 1 tar file created
 
         # Load tars back into ATEK
-        tar_list = [os.path.join(self.output_wds_path, f) for f in output_wds_names]
         unbatched_dataset = load_atek_wds_dataset(
             tar_list, batch_size=None, repeat_flag=False
         )
 
+        num_loaded_samples = 0
         for expected_sample, sample in zip(
             self.expected_flattened_samples, unbatched_dataset
         ):
+            num_loaded_samples += 1
+            # Lossless image codecs should round trip exactly
+            if check_images:
+                for key, expected_val in expected_sample.items():
+                    if key.endswith("+images") and "depth" not in key:
+                        self.assertTrue(torch.equal(expected_val, sample[key]))
+
             # Check GT content
             self.assertTrue(
                 check_dicts_same_w_tensors(
@@ -140,17 +219,191 @@ class LoadAtekWdsDatasetTest(unittest.TestCase):
                     )
                 else:
                     self.assertEqual(expected_val, sample_val)
+        self.assertEqual(num_loaded_samples, len(self.expected_flattened_samples))
+
+    def test_selective_loading(self) -> None:
+        self._preprocess_data()
+        tar_list = get_sorted_shard_paths(self.output_wds_path)
+
+        # Only selected keys are loaded
+        selected_dataset = load_atek_wds_dataset(
+            tar_list,
+            batch_size=None,
+            repeat_flag=False,
+            select_key_globs=["mfcd#camera-rgb+*", "gt_data*"],
+        )
+        for sample in selected_dataset:
+            for key in sample.keys():
+                self.assertTrue(
+                    key.startswith(("__", "mfcd#camera-rgb+", "gt_data")), key
+                )
+            self.assertTrue("mfcd#camera-rgb+images" in sample)
+            self.assertTrue("gt_data" in sample)
+
+        # Key selection derived from dict_key_mapping gives the same results as loading everything
+        dict_key_mapping = {
+            "mfcd#camera-rgb+images": "image",
+            "mtd#ts_world_device": "ts_world_device",
+            "sequence_name": "sequence_name",
+            "gt_data": "gt_data",
+        }
+        full_dataset = load_atek_wds_dataset(
+            tar_list,
+            dict_key_mapping=dict_key_mapping,
+            batch_size=None,
+            repeat_flag=False,
+            select_key_globs=["*"],
+        )
+        lazy_dataset = load_atek_wds_dataset(
+            tar_list,
+            dict_key_mapping=dict_key_mapping,
+            batch_size=None,
+            repeat_flag=False,
+        )
+        num_samples = 0
+        for full_sample, lazy_sample in zip(full_dataset, lazy_dataset):
+            num_samples += 1
+            self.assertEqual(
+                sorted(full_sample.keys()),
+                ["__key__", "__url__"] + sorted(dict_key_mapping.values()),
+            )
+            self.assertEqual(sorted(full_sample.keys()), sorted(lazy_sample.keys()))
+            self.assertTrue(torch.equal(full_sample["image"], lazy_sample["image"]))
+            self.assertTrue(
+                check_dicts_same_w_tensors(
+                    full_sample["gt_data"], lazy_sample["gt_data"]
+                )
+            )
+        self.assertEqual(num_samples, len(self.expected_flattened_samples))
+
+    def test_image_decode_backend_and_downscale(self) -> None:
+        self._preprocess_data()
+        tar_list = get_sorted_shard_paths(self.output_wds_path)
+
+        pil_samples = list(
+            load_atek_wds_dataset(tar_list, batch_size=None, repeat_flag=False)
+        )
+        torchvision_samples = list(
+            load_atek_wds_dataset(
+                tar_list,
+                batch_size=None,
+                repeat_flag=False,
+                image_decode_backend="torchvision",
+            )
+        )
+        downscaled_samples = list(
+            load_atek_wds_dataset(
+                tar_list,
+                batch_size=None,
+                repeat_flag=False,
+                image_downscale_factor=2,
+            )
+        )
+        self.assertEqual(len(pil_samples), len(self.expected_flattened_samples))
+
+        for pil_sample, torchvision_sample, downscaled_sample in zip(
+            pil_samples, torchvision_samples, downscaled_samples
+        ):
+            for camera_label in ["camera-rgb", "camera-slam-left"]:
+                image_key = f"mfcd#{camera_label}+images"
+                pil_image = pil_sample[image_key]
+                # Both backends decode the same JPEG, up to small IDCT differences
+                self.assertEqual(torchvision_sample[image_key].shape, pil_image.shape)
+                self.assertLess(
+                    (torchvision_sample[image_key].float() - pil_image.float())
+                    .abs()
+                    .mean(),
+                    1.0,
+                )
+
+                # Downscaled frames are half the size, with calibration rescaled accordingly
+                num_frames, num_channels, height, width = pil_image.shape
+                self.assertEqual(
+                    downscaled_sample[image_key].shape,
+                    (num_frames, num_channels, height // 2, width // 2),
+                )
+                self.assertTrue(
+                    torch.allclose(
+                        downscaled_sample[f"mfcd#{camera_label}+projection_params"],
+                        rescale_projection_params(
+                            pil_sample[f"mfcd#{camera_label}+projection_params"], 0.5
+                        ),
+                    )
+                )
+
+    def test_shuffling(self) -> None:
+        # One shard per sample
+        self._preprocess_data(
+            wds_writer_conf_overrides={
+                "max_shard_size_bytes": 1,
+                "remove_last_tar_if_not_full": False,
+            }
+        )
+        tar_list = get_sorted_shard_paths(self.output_wds_path)
+        expected_keys = [
+            sample["__key__"]
+            for sample in load_atek_wds_dataset(tar_list, repeat_flag=False)
+        ]
+
+        # Sample shuffle happens on compressed samples, and keeps all samples
+        shuffled_keys = [
+            sample["__key__"]
+            for sample in load_atek_wds_dataset(
+                tar_list,
+                repeat_flag=False,
+                shuffle_flag=True,
+                shuffle_buffer_size=4,
+                shuffle_initial_size=2,
+            )
+        ]
+        self.assertEqual(sorted(shuffled_keys), sorted(expected_keys))
+
+        # Shard shuffle is deterministic given seed and epoch, and the epoch advances after each pass
+        def _load_keys(dataset):
+            return [sample["__key__"] for sample in dataset]
+
+        dataset = load_atek_wds_dataset(
+            tar_list, repeat_flag=False, shard_shuffle_seed=42
+        )
+        first_epoch_keys = _load_keys(dataset)
+        second_epoch_keys = _load_keys(dataset)
+        self.assertEqual(sorted(first_epoch_keys), sorted(expected_keys))
+        self.assertEqual(sorted(second_epoch_keys), sorted(expected_keys))
+        self.assertEqual(
+            _load_keys(
+                load_atek_wds_dataset(
+                    tar_list,
+                    repeat_flag=False,
+                    shard_shuffle_seed=42,
+                    shard_shuffle_epoch=1,
+                )
+            ),
+            second_epoch_keys,
+        )
+
+        urls = [f"shard_{i:03d}.tar" for i in range(100)]
+        shard_list = EpochShuffledShardList(urls, seed=42)
+        first_epoch_urls = [shard["url"] for shard in shard_list]
+        second_epoch_urls = [shard["url"] for shard in shard_list]
+        self.assertEqual(sorted(first_epoch_urls), urls)
+        self.assertNotEqual(first_epoch_urls, second_epoch_urls)
+        self.assertEqual(
+            [shard["url"] for shard in EpochShuffledShardList(urls, seed=42)],
+            first_epoch_urls,
+        )
+        self.assertEqual(
+            [shard["url"] for shard in EpochShuffledShardList(urls)], urls
+        )
 
     def test_atek_default_collation(self) -> None:
         # Preprocess data and create WDS files
         self._preprocess_data()
 
         # check number of tars created
-        output_wds_names = os.listdir(self.output_wds_path)
-        self.assertEqual(len(output_wds_names), 1)  # only 1 tar file created
+        tar_list = get_sorted_shard_paths(self.output_wds_path)
+        self.assertEqual(len(tar_list), 1)  # only 1 tar file created
 
         # Load tars back into ATEK
-        tar_list = [os.path.join(self.output_wds_path, f) for f in output_wds_names]
         batch_size = 2  # TODO: maybe support a unit test with a larger dataset
         batched_dataset = load_atek_wds_dataset(
             tar_list, batch_size=batch_size, repeat_flag=False
@@ -167,6 +420,73 @@ class LoadAtekWdsDatasetTest(unittest.TestCase):
             elif isinstance(val, list):
                 self.assertEqual(len(val), batch_size)
 
+    def test_atek_padded_collation(self) -> None:
+        samples = [
+            {
+                "__key__": f"sample_{i}",
+                "mfcd#camera-rgb+images": torch.full(
+                    (1, 3, 4, 4), i, dtype=torch.uint8
+                ),
+                "msdpd#points_world": [
+                    torch.ones(num_points, 3) for num_points in [i + 1, 2]
+                ],
+                "gt_data": {
+                    "obb3_gt": {
+                        "camera-rgb": {
+                            "category_ids": torch.arange(i + 1, dtype=torch.int32),
+                            "category_names": ["a"] * (i + 1),
+                        }
+                    }
+                },
+            }
+            for i in range(3)
+        ]
+
+        batch = atek_padded_collation_fn(samples, pad_value=-1)
+        self.assertEqual(batch["__key__"], ["sample_0", "sample_1", "sample_2"])
+        self.assertEqual(batch["mfcd#camera-rgb+images"].shape, (3, 1, 3, 4, 4))
+        # List of per-frame tensors are padded per frame
+        self.assertEqual(batch["msdpd#points_world"].shape, (3, 2, 3, 3))
+        self.assertTrue(
+            torch.equal(
+                batch["msdpd#points_world+lengths"],
+                torch.tensor([[1, 2], [2, 2], [3, 2]]),
+            )
+        )
+        self.assertEqual(batch["msdpd#points_world"][0, 0, 1:].unique().item(), -1)
+        # GT instances are padded recursively
+        obb3_gt = batch["gt_data"]["obb3_gt"]["camera-rgb"]
+        self.assertTrue(
+            torch.equal(
+                obb3_gt["category_ids"],
+                torch.tensor([[0, -1, -1], [0, 1, -1], [0, 1, 2]], dtype=torch.int32),
+            )
+        )
+        self.assertTrue(
+            torch.equal(obb3_gt["category_ids+lengths"], torch.tensor([1, 2, 3]))
+        )
+        self.assertEqual(len(obb3_gt["category_names"]), 3)
+
+        # Nested tensors
+        batch = atek_padded_collation_fn(samples, nested_tensor_keys=["category_ids"])
+        nested_ids = batch["gt_data"]["obb3_gt"]["camera-rgb"]["category_ids"]
+        self.assertTrue(nested_ids.is_nested)
+        self.assertTrue(
+            torch.equal(nested_ids.unbind()[1], torch.arange(2, dtype=torch.int32))
+        )
+
+        # Batches collated in DataLoader workers are the same
+        dataloader = torch.utils.data.DataLoader(
+            samples,
+            batch_size=3,
+            collate_fn=atek_padded_collation_fn,
+            num_workers=1,
+        )
+        worker_batch = next(iter(dataloader))
+        self.assertTrue(
+            check_dicts_same_w_tensors(worker_batch, atek_padded_collation_fn(samples))
+        )
+
     # This is like a DTOR
     def tearDown(self):
         # Explicitly cleanup the temporary directory
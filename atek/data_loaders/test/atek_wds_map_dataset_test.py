@@ -0,0 +1,181 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+import torch
+from atek.data_loaders.atek_wds_dataloader import load_atek_wds_dataset
+from atek.data_loaders.atek_wds_map_dataset import (
+    AtekWdsMapDataset,
+    create_native_atek_map_dataloader,
+    load_or_build_tar_sample_index,
+)
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+from atek.util.tensor_utils import check_dicts_same_w_tensors
+
+
+class AtekWdsMapDatasetTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir_object = tempfile.TemporaryDirectory()
+        self.index_cache_dir = os.path.join(self.temp_dir_object.name, "index")
+
+        # 3 shards, with 3, 3 and 1 samples
+        shard_writer = ManifestShardWriter(
+            os.path.join(self.temp_dir_object.name, "wds"), max_samples_per_shard=3
+        )
+        for i in range(7):
+            shard_writer.write(
+                convert_atek_sample_dict_to_wds_dict(
+                    i,
+                    {
+                        "mfcd#camera-rgb+images": torch.full(
+                            (2, 3, 8, 8), i, dtype=torch.uint8
+                        ),
+                        "mfcd#camera-slam-left+images": torch.full(
+                            (2, 1, 8, 8), i, dtype=torch.uint8
+                        ),
+                        "mtd#ts_world_device": torch.randn(2, 3, 4),
+                        "sequence_name": "test",
+                        "gt_data": {
+                            "obb2_gt": {
+                                "camera-rgb": {
+                                    "box_ranges": torch.randn(3, 4),
+                                    "category_names": ["a", "b", "c"],
+                                }
+                            }
+                        },
+                    },
+                    prefix_string="test",
+                )
+            )
+        self.shard_paths = shard_writer.close()
+
+    def test_random_access_matches_streaming(self) -> None:
+        map_dataset = AtekWdsMapDataset(
+            self.shard_paths, index_cache_dir=self.index_cache_dir
+        )
+        streamed_samples = list(load_atek_wds_dataset(self.shard_paths))
+        self.assertEqual(len(map_dataset), len(streamed_samples))
+
+        # Random access in reverse order returns the same samples as streaming
+        for index in reversed(range(len(map_dataset))):
+            self.assertTrue(
+                check_dicts_same_w_tensors(map_dataset[index], streamed_samples[index])
+            )
+        self.assertEqual(
+            map_dataset.get_index_by_key(streamed_samples[4]["__key__"]), 4
+        )
+
+    def test_index_by_key_across_sequences(self) -> None:
+        # Two sequences written with an empty prefix, as in the shipped configs, share the same sample keys
+        tar_paths = []
+        for sequence_name in ["seq_0", "seq_1"]:
+            shard_writer = ManifestShardWriter(
+                os.path.join(self.temp_dir_object.name, sequence_name),
+                max_samples_per_shard=3,
+            )
+            for i in range(3):
+                shard_writer.write(
+                    convert_atek_sample_dict_to_wds_dict(
+                        i, {"sequence_name": sequence_name}, prefix_string=""
+                    )
+                )
+            tar_paths += shard_writer.close()
+        map_dataset = AtekWdsMapDataset(tar_paths, index_cache_dir=self.index_cache_dir)
+        self.assertEqual(len(set(map_dataset.get_sample_keys())), 3)
+
+        index = map_dataset.get_index_by_key(
+            "_AtekDataSample_000001", tar_path=tar_paths[1]
+        )
+        self.assertEqual(index, 4)
+        self.assertEqual(map_dataset[index]["sequence_name"], "seq_1")
+        # Ambiguous or unknown keys are not silently resolved
+        with self.assertRaises(ValueError):
+            map_dataset.get_index_by_key("_AtekDataSample_000001")
+        with self.assertRaises(KeyError):
+            map_dataset.get_index_by_key(
+                "_AtekDataSample_000003", tar_path=tar_paths[1]
+            )
+
+    def test_key_selection_and_remapping(self) -> None:
+        map_dataset = AtekWdsMapDataset(
+            self.shard_paths,
+            dict_key_mapping={"mfcd#camera-rgb+images": "image"},
+            index_cache_dir=self.index_cache_dir,
+        )
+        # Only members of the remapped keys are read
+        self.assertEqual(
+            sorted(map_dataset.read_raw_wds_sample(0).keys()),
+            [
+                "__key__",
+                "__url__",
+                "mfcd#camera-rgb+images_0.jpeg",
+                "mfcd#camera-rgb+images_1.jpeg",
+            ],
+        )
+        self.assertEqual(sorted(map_dataset[0].keys()), ["__key__", "__url__", "image"])
+
+    def test_index_cache(self) -> None:
+        tar_index = load_or_build_tar_sample_index(
+            self.shard_paths[0], self.index_cache_dir
+        )
+        self.assertEqual(len(tar_index["samples"]), 3)
+        self.assertEqual(len(os.listdir(self.index_cache_dir)), 1)
+
+        # Outdated index is rebuilt after the tar changes
+        os.utime(self.shard_paths[0], ns=(0, 0))
+        self.assertEqual(
+            load_or_build_tar_sample_index(self.shard_paths[0], self.index_cache_dir)[
+                "tar_mtime_ns"
+            ],
+            0,
+        )
+
+    def test_multi_worker_distributed_sampling(self) -> None:
+        sampled_keys = []
+        for rank in range(2):
+            sampler = torch.utils.data.distributed.DistributedSampler(
+                AtekWdsMapDataset(
+                    self.shard_paths, index_cache_dir=self.index_cache_dir
+                ),
+                num_replicas=2,
+                rank=rank,
+                shuffle=True,
+                seed=0,
+            )
+            dataloader = create_native_atek_map_dataloader(
+                self.shard_paths,
+                batch_size=2,
+                sampler=sampler,
+                num_workers=2,
+                index_cache_dir=self.index_cache_dir,
+            )
+            for batch in dataloader:
+                sampled_keys += batch["__key__"]
+
+        # DistributedSampler pads 7 samples to 8, so exactly one sample is seen twice
+        all_keys = AtekWdsMapDataset(
+            self.shard_paths, index_cache_dir=self.index_cache_dir
+        ).get_sample_keys()
+        self.assertEqual(len(sampled_keys), 8)
+        self.assertEqual(set(sampled_keys), set(all_keys))
+
+    def tearDown(self):
+        self.temp_dir_object.cleanup()
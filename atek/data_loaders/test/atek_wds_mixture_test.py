@@ -0,0 +1,114 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+import torch
+from atek.data_loaders.atek_wds_mixture import (
+    create_native_atek_mixture_dataloader,
+    load_atek_wds_mixture_dataset,
+    WeightedSampleMixer,
+)
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+
+
+class AtekWdsMixtureTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir_object = tempfile.TemporaryDirectory()
+
+        # Dataset "a" with 40 samples in 4 shards, and dataset "b" with 10 samples in 1 shard
+        self.url_lists = []
+        for dataset_name, num_samples in [("a", 40), ("b", 10)]:
+            shard_writer = ManifestShardWriter(
+                os.path.join(self.temp_dir_object.name, dataset_name),
+                max_samples_per_shard=10,
+            )
+            for i in range(num_samples):
+                shard_writer.write(
+                    convert_atek_sample_dict_to_wds_dict(
+                        i,
+                        {"mtd#ts_world_device": torch.randn(1, 3, 4)},
+                        prefix_string=dataset_name,
+                    )
+                )
+            self.url_lists.append(shard_writer.close())
+
+    def test_weighted_sample_mixer(self) -> None:
+        def _mix(weights, longest):
+            return list(
+                WeightedSampleMixer(
+                    [["a"] * 1000, ["b"] * 1000],
+                    weights,
+                    longest=longest,
+                    mixture_seed=42,
+                )
+            )
+
+        # The mixture stops when "a", drawn 3 times as often, is exhausted
+        samples = _mix([3.0, 1.0], longest=False)
+        self.assertEqual(samples.count("a"), 1000)
+        self.assertAlmostEqual(samples.count("a") / len(samples), 0.75, delta=0.03)
+
+        samples = _mix([3.0, 1.0], longest=True)
+        self.assertEqual(len(samples), 2000)
+        self.assertEqual(samples[-1], "b")
+
+        # Empty datasets are left out of the mixture
+        self.assertEqual(
+            list(WeightedSampleMixer([[], ["a", "a"]], [1.0, 1.0])), ["a", "a"]
+        )
+
+    def test_mixture_dataset(self) -> None:
+        samples = list(
+            load_atek_wds_mixture_dataset(
+                self.url_lists, [1.0, 1.0], longest=True, mixture_seed=1
+            )
+        )
+        keys = [sample["__key__"] for sample in samples]
+        self.assertEqual(len(set(keys)), 50)
+        # Datasets are interleaved, with the same mixture for the same seed
+        self.assertTrue(any(key.startswith("b_") for key in keys[:20]))
+        self.assertEqual(
+            keys,
+            [
+                sample["__key__"]
+                for sample in load_atek_wds_mixture_dataset(
+                    self.url_lists, [1.0, 1.0], longest=True, mixture_seed=1
+                )
+            ],
+        )
+
+    def test_mixture_dataloader(self) -> None:
+        # Dataset "b" only has samples in worker 0, the mixture of worker 1 only has samples of "a"
+        dataloader = create_native_atek_mixture_dataloader(
+            self.url_lists,
+            [1.0, 4.0],
+            batch_size=4,
+            num_workers=2,
+            shuffle_flag=True,
+            mixture_seed=0,
+        )
+        keys = [key for batch in dataloader for key in batch["__key__"]]
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertEqual(sum(key.startswith("b_") for key in keys), 10)
+        self.assertGreater(sum(key.startswith("a_") for key in keys), 20)
+
+    def tearDown(self):
+        self.temp_dir_object.cleanup()
@@ -0,0 +1,136 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+from atek.data_loaders.atek_wds_dataloader import load_atek_wds_dataset
+from atek.data_loaders.decoded_sample_cache import DecodedSampleCache
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+from atek.util.tensor_utils import check_dicts_same_w_tensors
+from webdataset.filters import pipelinefilter
+
+
+class DecodedSampleCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir_object = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.temp_dir_object.name, "cache")
+
+        # 3 shards of 2 samples each
+        shard_writer = ManifestShardWriter(
+            os.path.join(self.temp_dir_object.name, "wds"), max_samples_per_shard=2
+        )
+        for i in range(6):
+            shard_writer.write(
+                convert_atek_sample_dict_to_wds_dict(
+                    i,
+                    {
+                        "mfcd#camera-rgb+images": torch.full(
+                            (1, 3, 8, 8), i, dtype=torch.uint8
+                        ),
+                        "mtd#ts_world_device": torch.randn(1, 3, 4),
+                        "sequence_name": "test",
+                    },
+                    prefix_string="test",
+                )
+            )
+        self.shard_paths = shard_writer.close()
+        self.num_transformed_samples = 0
+
+    def _adaptor(self, data):
+        # A deterministic model adaptor, counting how many samples it processed
+        for sample in data:
+            self.num_transformed_samples += 1
+            yield {
+                "__key__": sample["__key__"],
+                "image": sample["image"][0, [2, 1, 0]].clone(),
+                "T_world_device": sample["ts_world_device"][0].numpy(),
+                "K": [[1.0, 0.0], [0.0, 1.0]],
+                "sequence_name": sample["sequence_name"],
+                "gt": {"ids": torch.arange(3), "empty": torch.zeros(0, 4)},
+            }
+
+    def _load_samples(self, **kwargs):
+        return list(
+            load_atek_wds_dataset(
+                self.shard_paths,
+                dict_key_mapping={
+                    "mfcd#camera-rgb+images": "image",
+                    "mtd#ts_world_device": "ts_world_device",
+                    "sequence_name": "sequence_name",
+                },
+                data_transform_fn=pipelinefilter(self._adaptor)(),
+                decoded_sample_cache_dir=self.cache_path,
+                **kwargs,
+            )
+        )
+
+    def _assert_samples_equal(self, samples, expected_samples) -> None:
+        self.assertEqual(len(samples), len(expected_samples))
+        for sample, expected_sample in zip(samples, expected_samples):
+            np.testing.assert_array_equal(
+                sample["T_world_device"], expected_sample["T_world_device"]
+            )
+            self.assertTrue(
+                check_dicts_same_w_tensors(
+                    {k: v for k, v in sample.items() if k != "T_world_device"},
+                    {k: v for k, v in expected_sample.items() if k != "T_world_device"},
+                )
+            )
+
+    def test_later_epochs_are_read_from_cache(self) -> None:
+        expected_samples = self._load_samples()
+        self.assertEqual(self.num_transformed_samples, 6)
+
+        cached_samples = self._load_samples()
+        # No sample is decoded or transformed again
+        self.assertEqual(self.num_transformed_samples, 6)
+        self._assert_samples_equal(cached_samples, expected_samples)
+
+        # Cached tensors are writable, without modifying the cache
+        cached_samples[0]["image"] += 1
+        self._assert_samples_equal(self._load_samples()[:1], expected_samples[:1])
+
+    def test_config_change_invalidates_cache(self) -> None:
+        self._load_samples(decoded_sample_cache_config={"min_area": 100})
+        self._load_samples(decoded_sample_cache_config={"min_area": 200})
+        self.assertEqual(self.num_transformed_samples, 12)
+        self._load_samples(decoded_sample_cache_config={"min_area": 200})
+        self.assertEqual(self.num_transformed_samples, 12)
+
+    def test_cache_size_cap(self) -> None:
+        self._load_samples(decoded_sample_cache_max_bytes=1)
+        self._load_samples(decoded_sample_cache_max_bytes=1)
+        self.assertEqual(self.num_transformed_samples, 12)
+        self.assertEqual(os.listdir(self.cache_path), [".lock"])
+
+    def test_partially_read_shards_are_not_cached(self) -> None:
+        decoded_sample_cache = DecodedSampleCache(self.cache_path, config_hash="test")
+        samples = decoded_sample_cache.write_shard(
+            self.shard_paths[0], iter([{"a": torch.ones(2)}, {"a": torch.zeros(2)}])
+        )
+        next(samples)
+        samples.close()
+        self.assertIsNone(decoded_sample_cache.load_shard(self.shard_paths[0]))
+        self.assertEqual(os.listdir(self.cache_path), [])
+
+    def tearDown(self):
+        self.temp_dir_object.cleanup()
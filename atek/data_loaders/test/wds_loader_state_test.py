@@ -0,0 +1,137 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+import torch
+from atek.data_loaders.atek_wds_dataloader import create_native_atek_dataloader
+from atek.data_loaders.wds_loader_state import (
+    AtekWdsLoaderState,
+    get_num_consumed_samples_per_worker,
+    ResumableSampleStream,
+)
+from atek.data_loaders.wds_shard_planner import (
+    BalancedShardSplitter,
+    get_shard_num_samples,
+)
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+
+
+class WdsLoaderStateTest(unittest.TestCase):
+    def test_get_num_consumed_samples_per_worker(self) -> None:
+        # Workers with 2, 4 and unknown numbers of batches of 2 samples
+        self.assertEqual(
+            get_num_consumed_samples_per_worker(5, 2, [3, 7, None]), [3, 4, 2]
+        )
+        # Exhausted workers are skipped
+        self.assertEqual(
+            get_num_consumed_samples_per_worker(6, 2, [3, 7, 1]), [3, 6, 1]
+        )
+        self.assertEqual(get_num_consumed_samples_per_worker(0, 2, [3, 7]), [0, 0])
+
+    def test_loader_state_dict(self) -> None:
+        loader_state = AtekWdsLoaderState(shard_shuffle_seed=7)
+        loader_state.on_batch_consumed()
+        loader_state.on_epoch_end()
+        loader_state.on_batch_consumed()
+        loader_state.on_batch_consumed()
+
+        restored_loader_state = AtekWdsLoaderState()
+        restored_loader_state.load_state_dict(loader_state.state_dict())
+        self.assertEqual(
+            restored_loader_state,
+            AtekWdsLoaderState(shard_shuffle_seed=7, epoch=1, num_consumed_batches=2),
+        )
+
+    def test_consumed_shards_are_not_read(self) -> None:
+        shard_num_samples = {"a": 2, "b": 3, "c": 2, "d": 3}
+        read_urls = []
+
+        def _read_samples(shards):
+            for shard in shards:
+                read_urls.append(shard["url"])
+                for i in range(shard_num_samples[shard["url"]]):
+                    yield {"__url__": shard["url"], "__key__": f"{shard['url']}_{i}"}
+
+        def _get_keys(num_consumed_batches, shuffle_buffer_size):
+            stream = ResumableSampleStream(
+                _read_samples,
+                shard_splitter=BalancedShardSplitter(
+                    shard_num_samples, rank=0, world_size=1
+                ),
+                shuffle_buffer_size=shuffle_buffer_size,
+                shuffle_initial_size=2,
+                shuffle_seed=42,
+                batch_size=2,
+                num_consumed_batches=num_consumed_batches,
+            )
+            shards = [{"url": url} for url in shard_num_samples]
+            return [sample["__key__"] for sample in stream(shards)]
+
+        for shuffle_buffer_size in [0, 3]:
+            all_keys = _get_keys(0, shuffle_buffer_size)
+            self.assertEqual(len(all_keys), 10)
+            for num_consumed_batches in range(6):
+                read_urls.clear()
+                self.assertEqual(
+                    _get_keys(num_consumed_batches, shuffle_buffer_size),
+                    all_keys[2 * num_consumed_batches :],
+                )
+                if shuffle_buffer_size == 0 and num_consumed_batches == 3:
+                    # Shards "a" and "b" are consumed, and not read at all
+                    self.assertEqual(read_urls, ["c", "d"])
+
+    def test_resume_dataloader(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            shard_writer = ManifestShardWriter(
+                os.path.join(temp_dir, "wds"), max_samples_per_shard=3
+            )
+            for i in range(17):
+                shard_writer.write(
+                    convert_atek_sample_dict_to_wds_dict(
+                        i,
+                        {"mtd#ts_world_device": torch.randn(1, 3, 4)},
+                        prefix_string="test",
+                    )
+                )
+            shard_paths = shard_writer.close()
+
+            def _get_batch_keys(num_consumed_batches):
+                dataloader = create_native_atek_dataloader(
+                    shard_paths,
+                    batch_size=2,
+                    shuffle_flag=True,
+                    num_workers=2,
+                    shuffle_buffer_size=4,
+                    shuffle_initial_size=2,
+                    shard_shuffle_seed=3,
+                    shard_shuffle_epoch=1,
+                    shard_num_samples=get_shard_num_samples(shard_paths),
+                    num_consumed_batches=num_consumed_batches,
+                )
+                return [batch["__key__"] for batch in dataloader]
+
+            all_batch_keys = _get_batch_keys(0)
+            self.assertEqual(sum(len(keys) for keys in all_batch_keys), 17)
+            for num_consumed_batches in [1, 4, 7]:
+                # The same batches are left, while the DataLoader restarts taking batches from worker 0
+                self.assertEqual(
+                    sorted(_get_batch_keys(num_consumed_batches)),
+                    sorted(all_batch_keys[num_consumed_batches:]),
+                )
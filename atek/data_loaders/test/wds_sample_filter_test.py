@@ -0,0 +1,194 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+import torch
+from atek.data_loaders.atek_wds_dataloader import load_atek_wds_dataset
+from atek.data_loaders.atek_wds_map_dataset import AtekWdsMapDataset
+from atek.data_loaders.wds_sample_filter import (
+    build_wds_sample_index,
+    create_obb_gt_predicate,
+    create_sequence_name_predicate,
+    load_wds_sample_index,
+    WdsSampleFilter,
+)
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+
+
+class WdsSampleFilterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir_object = tempfile.TemporaryDirectory()
+
+        # 20 samples in 2 shards, one sequence per shard. Sample i has a single instance of category i % 3, except
+        # every 4th sample has no instance.
+        shard_writer = ManifestShardWriter(
+            self.temp_dir_object.name, max_samples_per_shard=10
+        )
+        for i in range(20):
+            category_ids = torch.tensor([i % 3] if i % 4 != 0 else [])
+            shard_writer.write(
+                convert_atek_sample_dict_to_wds_dict(
+                    i,
+                    {
+                        "mfcd#camera-rgb+images": torch.full(
+                            (1, 3, 8, 8), i, dtype=torch.uint8
+                        ),
+                        "sequence_name": f"seq_{i // 10}",
+                        "gt_data": {
+                            "obb3_gt": {
+                                "camera-rgb": {
+                                    "category_names": ["a"] * len(category_ids),
+                                    "category_ids": category_ids,
+                                }
+                            }
+                        },
+                    },
+                    prefix_string="test",
+                )
+            )
+        self.urls = shard_writer.close()
+
+    def _load_sample_ids(self, sample_filter: WdsSampleFilter, **kwargs):
+        return [
+            int(sample["mfcd#camera-rgb+images"][0, 0, 0, 0])
+            for sample in load_atek_wds_dataset(
+                self.urls, sample_filter=sample_filter, **kwargs
+            )
+        ]
+
+    def test_filter_on_sample_members(self) -> None:
+        sample_filter = WdsSampleFilter(create_obb_gt_predicate(category_ids=[2]))
+        # GT members are only read for the predicate, and not kept in the samples
+        samples = list(
+            load_atek_wds_dataset(
+                self.urls,
+                sample_filter=sample_filter,
+                select_key_globs=["mfcd#camera-rgb+*"],
+            )
+        )
+        self.assertEqual(
+            [int(sample["mfcd#camera-rgb+images"][0, 0, 0, 0]) for sample in samples],
+            [2, 5, 11, 14, 17],
+        )
+        self.assertNotIn("gt_data", samples[0])
+
+        # Samples with any instance
+        self.assertEqual(
+            self._load_sample_ids(WdsSampleFilter(create_obb_gt_predicate())),
+            [i for i in range(20) if i % 4 != 0],
+        )
+
+    def test_filter_with_sample_index(self) -> None:
+        build_wds_sample_index(self.temp_dir_object.name)
+        sample_index = load_wds_sample_index(self.urls)
+        self.assertEqual(len(sample_index), 2)
+
+        # Kept sample counts are known from the index, so epoch lengths can be equalized
+        sample_filter = WdsSampleFilter(
+            create_obb_gt_predicate(category_ids=[1, 2]), sample_index=sample_index
+        )
+        self.assertEqual(
+            sample_filter.get_filtered_shard_num_samples(
+                {url: 10 for url in self.urls}
+            ),
+            {self.urls[0]: 4, self.urls[1]: 6},
+        )
+        self.assertEqual(
+            self._load_sample_ids(
+                sample_filter,
+                shard_num_samples={url: 10 for url in self.urls},
+                equal_epoch_length_mode="drop",
+            ),
+            [1, 2, 5, 7, 10, 11, 13, 14, 17, 19],
+        )
+
+        # Shards without kept samples are not opened
+        with open(self.urls[0], "wb") as f:
+            f.write(b"not a tar")
+        sample_filter = WdsSampleFilter(
+            create_sequence_name_predicate(["seq_1"]), sample_index=sample_index
+        )
+        self.assertEqual(self._load_sample_ids(sample_filter), list(range(10, 20)))
+
+    def test_unindexed_filter_with_equal_epoch_length_mode(self) -> None:
+        # 3 shards of 4, 4 and 2 samples, samples 0-5 of sequence "seq_a" and 6-9 of "seq_b", so the balanced worker
+        # partitions have unequal counts both before and after filtering
+        shard_writer = ManifestShardWriter(
+            os.path.join(self.temp_dir_object.name, "unequal"),
+            max_samples_per_shard=4,
+        )
+        for i in range(10):
+            shard_writer.write(
+                convert_atek_sample_dict_to_wds_dict(
+                    i,
+                    {
+                        "mfcd#camera-rgb+images": torch.full(
+                            (1, 3, 8, 8), i, dtype=torch.uint8
+                        ),
+                        "sequence_name": "seq_a" if i < 6 else "seq_b",
+                    },
+                    prefix_string="test",
+                )
+            )
+        urls = shard_writer.close()
+
+        # Without a sample index, filtered counts are unknown, so epochs are not equalized on the unfiltered counts:
+        # every kept sample is loaded exactly once
+        for equal_epoch_length_mode in ["drop", "pad"]:
+            dataloader = torch.utils.data.DataLoader(
+                load_atek_wds_dataset(
+                    urls,
+                    sample_filter=WdsSampleFilter(
+                        create_sequence_name_predicate(["seq_a"])
+                    ),
+                    shard_num_samples={
+                        url: num_samples for url, num_samples in zip(urls, [4, 4, 2])
+                    },
+                    equal_epoch_length_mode=equal_epoch_length_mode,
+                ),
+                batch_size=None,
+                num_workers=2,
+            )
+            self.assertEqual(
+                sorted(
+                    int(sample["mfcd#camera-rgb+images"][0, 0, 0, 0])
+                    for sample in dataloader
+                ),
+                list(range(6)),
+            )
+
+    def test_filter_map_dataset(self) -> None:
+        # Filter members are read at their offsets in the tar sample index
+        map_dataset = AtekWdsMapDataset(
+            self.urls,
+            select_key_globs=["mfcd#camera-rgb+*"],
+            sample_filter=WdsSampleFilter(create_obb_gt_predicate(category_ids=[2])),
+        )
+        self.assertEqual(
+            [
+                int(sample["mfcd#camera-rgb+images"][0, 0, 0, 0])
+                for sample in map_dataset
+            ],
+            [2, 5, 11, 14, 17],
+        )
+
+    def tearDown(self):
+        self.temp_dir_object.cleanup()
@@ -0,0 +1,155 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import torch
+from atek.data_loaders.atek_wds_dataloader import load_atek_wds_dataset
+from atek.data_loaders.wds_shard_cache import WdsShardCache
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+from atek.util.wds_manifest_utils import compute_file_sha1
+
+
+class _QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class WdsShardCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir_object = tempfile.TemporaryDirectory()
+        self.served_path = os.path.join(self.temp_dir_object.name, "served")
+        self.cache_path = os.path.join(self.temp_dir_object.name, "cache")
+
+        # 3 shards of 2 samples each
+        shard_writer = ManifestShardWriter(self.served_path, max_samples_per_shard=2)
+        for i in range(6):
+            shard_writer.write(
+                convert_atek_sample_dict_to_wds_dict(
+                    i,
+                    {
+                        "mfcd#camera-rgb+images": torch.full(
+                            (1, 3, 8, 8), i, dtype=torch.uint8
+                        ),
+                        "mtd#ts_world_device": torch.randn(1, 3, 4),
+                        "sequence_name": "test",
+                    },
+                    prefix_string="test",
+                )
+            )
+        self.shard_paths = shard_writer.close()
+
+        # Local stand-in for the ATEK Data Store HTTP server
+        self.http_server = ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            partial(_QuietHTTPRequestHandler, directory=self.served_path),
+        )
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+        self.urls = [
+            f"http://127.0.0.1:{self.http_server.server_port}/{os.path.basename(shard_path)}"
+            for shard_path in self.shard_paths
+        ]
+
+    def _load_keys(self, **kwargs):
+        return [
+            sample["__key__"]
+            for sample in load_atek_wds_dataset(
+                self.urls, shard_cache_dir=self.cache_path, **kwargs
+            )
+        ]
+
+    def test_cached_shards_are_read_locally(self) -> None:
+        expected_keys = [
+            sample["__key__"] for sample in load_atek_wds_dataset(self.shard_paths)
+        ]
+        self.assertEqual(self._load_keys(), expected_keys)
+
+        # All shards are cached with the same content
+        shard_cache = WdsShardCache(self.cache_path)
+        self.assertEqual(len(shard_cache.get_cached_shard_paths()), 3)
+        for url, shard_path in zip(self.urls, self.shard_paths):
+            self.assertEqual(
+                compute_file_sha1(shard_cache.get_cache_path(url)),
+                compute_file_sha1(shard_path),
+            )
+
+        # Later epochs are read from the cache, even without the server
+        self.http_server.shutdown()
+        self.assertEqual(self._load_keys(), expected_keys)
+
+    def test_local_shards_are_not_cached(self) -> None:
+        expected_keys = [
+            sample["__key__"] for sample in load_atek_wds_dataset(self.shard_paths)
+        ]
+        self.assertEqual(
+            [
+                sample["__key__"]
+                for sample in load_atek_wds_dataset(
+                    self.shard_paths, shard_cache_dir=self.cache_path
+                )
+            ],
+            expected_keys,
+        )
+        self.assertEqual(
+            len(WdsShardCache(self.cache_path).get_cached_shard_paths()), 0
+        )
+
+    def test_lru_eviction(self) -> None:
+        # Budget for 2 of the 3 shards
+        max_shard_bytes = max(os.path.getsize(path) for path in self.shard_paths)
+        self._load_keys(shard_cache_max_bytes=2 * max_shard_bytes)
+
+        shard_cache = WdsShardCache(self.cache_path)
+        self.assertEqual(
+            sorted(shard_cache.get_cached_shard_paths().keys()),
+            sorted(shard_cache.get_cache_path(url) for url in self.urls[1:]),
+        )
+
+    def test_sha1_mismatch_is_not_cached(self) -> None:
+        sha1sums = {
+            url: compute_file_sha1(path)
+            for url, path in zip(self.urls, self.shard_paths)
+        }
+        sha1sums[self.urls[0]] = "0" * 40
+        self._load_keys(shard_sha1sums=sha1sums)
+
+        shard_cache = WdsShardCache(self.cache_path)
+        self.assertEqual(
+            sorted(shard_cache.get_cached_shard_paths().keys()),
+            sorted(shard_cache.get_cache_path(url) for url in self.urls[1:]),
+        )
+        # No partially downloaded files are left behind
+        self.assertEqual(
+            sorted(os.listdir(self.cache_path)),
+            sorted(
+                [".lock"]
+                + [
+                    os.path.basename(shard_cache.get_cache_path(url))
+                    for url in self.urls[1:]
+                ]
+            ),
+        )
+
+    def tearDown(self):
+        self.http_server.server_close()
+        self.temp_dir_object.cleanup()
@@ -0,0 +1,169 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import torch
+from atek.data_loaders.atek_wds_dataloader import load_atek_wds_dataset
+from atek.data_loaders.wds_shard_planner import (
+    get_shard_num_samples,
+    plan_balanced_shards,
+)
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+from atek.util.wds_manifest_utils import WDS_MANIFEST_FILE_NAME
+
+
+class WdsShardPlannerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir_object = tempfile.TemporaryDirectory()
+
+        # 2 sequences, with shards of [4, 4, 1] and [3, 3, 3, 2] samples
+        self.shard_paths = []
+        for sequence_index, (num_samples, max_samples_per_shard) in enumerate(
+            [(9, 4), (11, 3)]
+        ):
+            shard_writer = ManifestShardWriter(
+                os.path.join(self.temp_dir_object.name, f"sequence_{sequence_index}"),
+                max_samples_per_shard=max_samples_per_shard,
+            )
+            for i in range(num_samples):
+                shard_writer.write(
+                    convert_atek_sample_dict_to_wds_dict(
+                        i,
+                        {
+                            "mtd#ts_world_device": torch.randn(1, 3, 4),
+                            "sequence_name": f"sequence_{sequence_index}",
+                        },
+                        prefix_string=f"sequence_{sequence_index}",
+                    )
+                )
+            self.shard_paths += shard_writer.close()
+
+    def test_get_shard_num_samples(self) -> None:
+        expected_num_samples = [4, 4, 1, 3, 3, 3, 2]
+        shard_num_samples = get_shard_num_samples(self.shard_paths)
+        self.assertEqual(
+            [shard_num_samples[path] for path in self.shard_paths],
+            expected_num_samples,
+        )
+
+        # Without manifests, shards are scanned
+        for path in self.shard_paths:
+            manifest_path = os.path.join(os.path.dirname(path), WDS_MANIFEST_FILE_NAME)
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+        shard_num_samples = get_shard_num_samples(self.shard_paths)
+        self.assertEqual(
+            [shard_num_samples[path] for path in self.shard_paths],
+            expected_num_samples,
+        )
+        self.assertEqual(get_shard_num_samples(self.shard_paths, scan_shards=False), {})
+        self.assertEqual(get_shard_num_samples(["http://localhost/shard.tar"]), {})
+
+    def test_plan_balanced_shards(self) -> None:
+        partitions = plan_balanced_shards(
+            {"a": 10, "b": 9, "c": 5, "d": 4, "e": 2}, num_partitions=2
+        )
+        self.assertEqual(partitions, [["a", "d", "e"], ["b", "c"]])
+
+        # Seeded plans move shards across partitions while staying balanced
+        shard_num_samples = {f"shard_{i}": 10 for i in range(8)}
+        seeded_partitions = [
+            plan_balanced_shards(shard_num_samples, num_partitions=4, seed=seed)
+            for seed in range(4)
+        ]
+        for partitions in seeded_partitions:
+            self.assertEqual([len(partition) for partition in partitions], [2] * 4)
+            self.assertEqual(sorted(sum(partitions, [])), sorted(shard_num_samples))
+        self.assertGreater(
+            len(
+                {tuple(map(frozenset, partitions)) for partitions in seeded_partitions}
+            ),
+            1,
+        )
+        self.assertEqual(
+            plan_balanced_shards(shard_num_samples, num_partitions=4, seed=1),
+            seeded_partitions[1],
+        )
+
+    def _load_keys_of_rank(self, rank: int, world_size: int, **kwargs):
+        with mock.patch.dict(
+            os.environ, {"RANK": str(rank), "WORLD_SIZE": str(world_size)}
+        ):
+            return [
+                sample["__key__"]
+                for sample in load_atek_wds_dataset(
+                    self.shard_paths,
+                    shard_num_samples=get_shard_num_samples(self.shard_paths),
+                    **kwargs,
+                )
+            ]
+
+    def test_balanced_split_across_ranks(self) -> None:
+        keys_per_rank = [self._load_keys_of_rank(rank, 2) for rank in range(2)]
+        self.assertEqual([len(keys) for keys in keys_per_rank], [10, 10])
+        self.assertEqual(
+            len(set(keys_per_rank[0]) | set(keys_per_rank[1])),
+            20,
+        )
+
+    def test_shards_move_across_ranks_per_epoch(self) -> None:
+        keys_per_epoch = []
+        for epoch in range(4):
+            keys_per_rank = [
+                self._load_keys_of_rank(
+                    rank, 2, shard_shuffle_seed=42, shard_shuffle_epoch=epoch
+                )
+                for rank in range(2)
+            ]
+            # Every epoch is still a balanced split of all samples
+            self.assertEqual([len(keys) for keys in keys_per_rank], [10, 10])
+            self.assertEqual(len(set(keys_per_rank[0]) | set(keys_per_rank[1])), 20)
+            keys_per_epoch.append(frozenset(keys_per_rank[0]))
+        self.assertGreater(len(set(keys_per_epoch)), 1)
+
+    def test_equal_epoch_length(self) -> None:
+        # 3 ranks get 7, 7 and 6 samples, while striding shards across ranks would give 9, 7 and 4
+        keys_per_rank = [self._load_keys_of_rank(rank, 3) for rank in range(3)]
+        self.assertEqual(sorted(len(keys) for keys in keys_per_rank), [6, 7, 7])
+
+        keys_per_rank = [
+            self._load_keys_of_rank(rank, 3, equal_epoch_length_mode="drop")
+            for rank in range(3)
+        ]
+        self.assertEqual([len(keys) for keys in keys_per_rank], [6, 6, 6])
+
+        keys_per_rank = [
+            self._load_keys_of_rank(rank, 3, equal_epoch_length_mode="pad")
+            for rank in range(3)
+        ]
+        self.assertEqual([len(keys) for keys in keys_per_rank], [7, 7, 7])
+        self.assertEqual(len(set().union(*keys_per_rank)), 20)
+
+        # With more ranks than the 7 shards, a rank without shards cannot run as many iterations as the others
+        for equal_epoch_length_mode in ["drop", "pad"]:
+            with self.assertRaises(ValueError):
+                self._load_keys_of_rank(
+                    7, 8, equal_epoch_length_mode=equal_epoch_length_mode
+                )
+
+    def tearDown(self):
+        self.temp_dir_object.cleanup()
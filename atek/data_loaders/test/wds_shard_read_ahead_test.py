@@ -0,0 +1,112 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import threading
+import unittest
+
+import torch
+from atek.data_loaders.atek_wds_dataloader import load_atek_wds_dataset
+from atek.data_loaders.wds_shard_read_ahead import (
+    get_shard_read_ahead_stats,
+    read_ahead_url_opener,
+)
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+
+
+class WdsShardReadAheadTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir_object = tempfile.TemporaryDirectory()
+
+        # 4 shards of 2 samples each
+        shard_writer = ManifestShardWriter(
+            self.temp_dir_object.name, max_samples_per_shard=2
+        )
+        for i in range(8):
+            shard_writer.write(
+                convert_atek_sample_dict_to_wds_dict(
+                    i,
+                    {
+                        "mfcd#camera-rgb+images": torch.full(
+                            (1, 3, 8, 8), i, dtype=torch.uint8
+                        ),
+                        "mtd#ts_world_device": torch.randn(1, 3, 4),
+                        "sequence_name": "test",
+                    },
+                    prefix_string="test",
+                )
+            )
+        self.shard_paths = shard_writer.close()
+
+    def test_read_ahead_keeps_samples(self) -> None:
+        expected_keys = [
+            sample["__key__"] for sample in load_atek_wds_dataset(self.shard_paths)
+        ]
+        stats_before = get_shard_read_ahead_stats()
+
+        # A tiny byte budget forces the background threads to wait for the reader
+        keys = [
+            sample["__key__"]
+            for sample in load_atek_wds_dataset(
+                self.shard_paths, num_read_ahead_shards=2, max_read_ahead_bytes=1000
+            )
+        ]
+        self.assertEqual(keys, expected_keys)
+
+        stats_after = get_shard_read_ahead_stats()
+        self.assertEqual(stats_after.num_shards - stats_before.num_shards, 4)
+        self.assertGreater(stats_after.num_bytes, stats_before.num_bytes)
+
+    def test_next_shards_are_opened_ahead(self) -> None:
+        second_shard_opened = threading.Event()
+
+        def _open_fn(url):
+            if url == self.shard_paths[1]:
+                second_shard_opened.set()
+            return open(url, "rb")
+
+        url_opener = read_ahead_url_opener(
+            [{"url": shard_path} for shard_path in self.shard_paths],
+            open_fn=_open_fn,
+            num_read_ahead_shards=1,
+            max_read_ahead_bytes=1e6,
+        )
+        first_shard = next(url_opener)
+        self.assertEqual(first_shard["url"], self.shard_paths[0])
+        # The second shard is opened before the first one is read
+        self.assertTrue(second_shard_opened.wait(timeout=10))
+        with open(self.shard_paths[0], "rb") as f:
+            self.assertEqual(first_shard["stream"].read(), f.read())
+        url_opener.close()
+
+    def test_open_errors_are_raised_to_the_reader(self) -> None:
+        def _open_fn(url):
+            raise IOError(f"Can not open {url}")
+
+        url_opener = read_ahead_url_opener(
+            [{"url": self.shard_paths[0]}],
+            open_fn=_open_fn,
+            num_read_ahead_shards=1,
+            max_read_ahead_bytes=1e6,
+        )
+        with self.assertRaises(IOError):
+            next(url_opener)["stream"].read()
+        url_opener.close()
+
+    def tearDown(self):
+        self.temp_dir_object.cleanup()
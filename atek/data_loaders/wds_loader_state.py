@@ -0,0 +1,272 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import math
+import random
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+import webdataset as wds
+
+from atek.data_loaders.wds_shard_planner import BalancedShardSplitter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Key marking placeholder samples, that stand in for samples of shards which are skipped without being read on resume
+_CONSUMED_PLACEHOLDER_KEY = "__consumed_placeholder__"
+
+
+@dataclass
+class AtekWdsLoaderState:
+    """
+    Iteration state of an ATEK WDS loader, to be saved with training checkpoints, e.g. as a `DetectionCheckpointer`
+    checkpointable, and restored to continue mid-epoch. The trainer calls `on_batch_consumed` after each training step,
+    and `on_epoch_end` after each epoch. A loader of `epoch` created with `shard_shuffle_seed` and
+    `num_consumed_batches` skips the batches that were already consumed, see `ResumableSampleStream`.
+    """
+
+    # Seed of shard and sample shuffling
+    shard_shuffle_seed: Optional[int] = None
+    # Current epoch, used to shuffle shards and samples with `shard_shuffle_seed + epoch`
+    epoch: int = 0
+    # Number of batches of the current epoch consumed by the trainer, on this rank
+    num_consumed_batches: int = 0
+
+    def on_batch_consumed(self) -> None:
+        self.num_consumed_batches += 1
+
+    def on_epoch_end(self) -> None:
+        self.epoch += 1
+        self.num_consumed_batches = 0
+
+    def state_dict(self) -> Dict:
+        return asdict(self)
+
+    def load_state_dict(self, state_dict: Dict) -> None:
+        self.shard_shuffle_seed = state_dict["shard_shuffle_seed"]
+        self.epoch = state_dict["epoch"]
+        self.num_consumed_batches = state_dict["num_consumed_batches"]
+
+
+def get_num_consumed_samples_per_worker(
+    num_consumed_batches: int,
+    batch_size: int,
+    num_samples_per_worker: List[Optional[int]],
+) -> List[int]:
+    """
+    Map the number of batches consumed from a DataLoader over an IterableDataset to the number of samples consumed from
+    each worker. The DataLoader takes batches from workers in turn, skipping workers that are exhausted, so this is exact
+    if the number of samples of each worker is known (None if unknown, i.e. assumed to be never exhausted).
+    """
+    num_batches_per_worker = [
+        math.ceil(num_samples / batch_size) if num_samples is not None else math.inf
+        for num_samples in num_samples_per_worker
+    ]
+    num_consumed_batches_per_worker = [0] * len(num_samples_per_worker)
+    while num_consumed_batches > 0:
+        active_workers = [
+            worker
+            for worker, num_batches in enumerate(num_batches_per_worker)
+            if num_consumed_batches_per_worker[worker] < num_batches
+        ]
+        if len(active_workers) == 0:
+            break
+        for worker in active_workers[:num_consumed_batches]:
+            num_consumed_batches_per_worker[worker] += 1
+        num_consumed_batches -= min(len(active_workers), num_consumed_batches)
+
+    return [
+        (
+            min(num_batches * batch_size, num_samples)
+            if num_samples is not None
+            else num_batches * batch_size
+        )
+        for num_batches, num_samples in zip(
+            num_consumed_batches_per_worker, num_samples_per_worker
+        )
+    ]
+
+
+def _interleave_consumed_placeholders(
+    shards: List[Dict],
+    skipped_urls: Set[str],
+    shard_num_samples: Dict[str, int],
+    sample_source_stage: Callable,
+) -> Iterator[Dict]:
+    """
+    Yields the samples of shards in order, where the shards in `skipped_urls` are not read, but replaced by placeholders.
+    """
+    read_samples = iter(
+        sample_source_stage(
+            [shard for shard in shards if shard["url"] not in skipped_urls]
+        )
+    )
+    next_sample = next(read_samples, None)
+    for shard in shards:
+        if shard["url"] in skipped_urls:
+            for _ in range(shard_num_samples[shard["url"]]):
+                yield {"__url__": shard["url"], _CONSUMED_PLACEHOLDER_KEY: True}
+            continue
+        while next_sample is not None and next_sample["__url__"] == shard["url"]:
+            yield next_sample
+            next_sample = next(read_samples, None)
+
+
+class ResumableSampleStream:
+    """
+    A webdataset pipeline stage from the shards of the current worker to its samples: reads samples with
+    `sample_source_stage`, then equalizes epoch lengths with `shard_splitter` (if set), and shuffles samples with a
+    buffer of `shuffle_buffer_size` (if > 0). Shuffling is seeded with `shuffle_seed`, epoch, rank and worker, so that
+    the sample order of every worker can be reproduced.
+    On the first pass, the samples of the first `num_consumed_batches` batches, e.g. restored with `AtekWdsLoaderState`,
+    are skipped before decoding. If shard sample counts are known from `shard_splitter` and `skip_unread_shards` is set,
+    shards whose samples were all consumed are not read at all: the sample order is replayed on placeholder samples.
+    """
+
+    def __init__(
+        self,
+        sample_source_stage: Callable[[Iterable[Dict]], Iterator[Dict]],
+        shard_splitter: Optional[BalancedShardSplitter] = None,
+        shuffle_buffer_size: int = 0,
+        shuffle_initial_size: int = 100,
+        shuffle_seed: Optional[int] = None,
+        shuffle_epoch: int = 0,
+        batch_size: Optional[int] = None,
+        num_consumed_batches: int = 0,
+        skip_unread_shards: bool = True,
+    ) -> None:
+        self.sample_source_stage = sample_source_stage
+        self.shard_splitter = shard_splitter
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.shuffle_initial_size = shuffle_initial_size
+        self.shuffle_seed = shuffle_seed
+        self.shuffle_epoch = shuffle_epoch
+        self.batch_size = batch_size if batch_size is not None else 1
+        self.num_consumed_batches = num_consumed_batches
+        self.skip_unread_shards = skip_unread_shards
+
+    def _apply_sample_stages(
+        self, samples: Iterator[Dict], shuffle_rng_seed: str
+    ) -> Iterator[Dict]:
+        if self.shard_splitter is not None:
+            samples = self.shard_splitter.equalize_epoch_length(samples)
+        if self.shuffle_buffer_size > 0:
+            samples = wds.filters.shuffle(
+                self.shuffle_buffer_size,
+                initial=self.shuffle_initial_size,
+                rng=random.Random(shuffle_rng_seed),
+            )(iter(samples))
+        return samples
+
+    def _get_num_skipped_samples(self) -> int:
+        rank, world_size, worker, num_workers = wds.utils.pytorch_worker_info()
+        num_samples_per_worker = [None] * num_workers
+        if self.shard_splitter is not None:
+            partition_index, num_partitions = self.shard_splitter.get_partition()
+            rank_start = partition_index - worker
+            epoch_num_samples = self.shard_splitter.get_epoch_num_samples(
+                num_partitions
+            )
+            partition_num_samples = self.shard_splitter.get_partition_num_samples(
+                num_partitions
+            )
+            num_samples_per_worker = [
+                (
+                    epoch_num_samples
+                    if epoch_num_samples is not None
+                    else partition_num_samples[rank_start + i]
+                )
+                for i in range(num_workers)
+            ]
+        return get_num_consumed_samples_per_worker(
+            self.num_consumed_batches, self.batch_size, num_samples_per_worker
+        )[worker]
+
+    def _get_skipped_urls(
+        self, shards: List[Dict], num_skipped_samples: int, shuffle_rng_seed: str
+    ) -> Set[str]:
+        """
+        Replay the sample order on placeholders to find the shards that have no sample left after the skipped ones.
+        """
+        shard_num_samples = self.shard_splitter.shard_num_samples
+        placeholders = (
+            {"__url__": shard["url"], _CONSUMED_PLACEHOLDER_KEY: True}
+            for shard in shards
+            for _ in range(shard_num_samples[shard["url"]])
+        )
+        urls_with_samples_left = set()
+        for i, placeholder in enumerate(
+            self._apply_sample_stages(placeholders, shuffle_rng_seed)
+        ):
+            if i >= num_skipped_samples:
+                urls_with_samples_left.add(placeholder["__url__"])
+        return {shard["url"] for shard in shards} - urls_with_samples_left
+
+    def __call__(self, src: Iterable[Dict]) -> Iterator[Dict]:
+        rank, _, worker, num_workers = wds.utils.pytorch_worker_info()
+        if self.shard_splitter is not None:
+            # Shards of this pass are split with the plan of its epoch, before any shard is read
+            self.shard_splitter.set_epoch(self.shuffle_epoch)
+            partition_index, _ = self.shard_splitter.get_partition()
+        else:
+            partition_index = rank * num_workers + worker
+        shuffle_seed = (
+            self.shuffle_seed
+            if self.shuffle_seed is not None
+            else random.getrandbits(64)
+        )
+        shuffle_rng_seed = f"{shuffle_seed}/{self.shuffle_epoch}/{partition_index}"
+        self.shuffle_epoch += 1
+        num_skipped_samples = (
+            self._get_num_skipped_samples() if self.num_consumed_batches > 0 else 0
+        )
+        # Only the first pass resumes, later passes (e.g. with `repeat_flag`) start from the beginning
+        self.num_consumed_batches = 0
+
+        if num_skipped_samples == 0:
+            yield from self._apply_sample_stages(
+                self.sample_source_stage(src), shuffle_rng_seed
+            )
+            return
+
+        shards = list(src)
+        if self.skip_unread_shards and self.shard_splitter is not None:
+            skipped_urls = self._get_skipped_urls(
+                shards, num_skipped_samples, shuffle_rng_seed
+            )
+            samples = _interleave_consumed_placeholders(
+                shards,
+                skipped_urls,
+                self.shard_splitter.shard_num_samples,
+                self.sample_source_stage,
+            )
+        else:
+            skipped_urls = set()
+            samples = self.sample_source_stage(shards)
+        logger.info(
+            f"Resuming worker {worker}: skipping {num_skipped_samples} consumed samples, "
+            f"without reading {len(skipped_urls)} of {len(shards)} shards."
+        )
+
+        for i, sample in enumerate(
+            self._apply_sample_stages(samples, shuffle_rng_seed)
+        ):
+            if i < num_skipped_samples:
+                continue
+            assert (
+                _CONSUMED_PLACEHOLDER_KEY not in sample
+            ), "Sample of a skipped shard after resuming, shard sample counts are wrong."
+            yield sample
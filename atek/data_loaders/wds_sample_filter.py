@@ -0,0 +1,285 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+from collections import defaultdict
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+from urllib.parse import urlparse
+
+import torch
+import webdataset as wds
+
+from atek.util.wds_key_utils import (
+    create_wds_member_selector,
+    is_wds_key_selected,
+    WDS_META_KEYS,
+)
+from atek.util.wds_manifest_utils import get_sorted_shard_paths
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Small members that sample predicates are evaluated on by default: the GT dict with its tensors, and the sequence name
+DEFAULT_FILTER_KEY_GLOBS = ["gt_data.*", "gt_data#*", "sequence_name.*"]
+
+# Name of the sample index file written next to the WDS shards of a folder, see `build_wds_sample_index`
+WDS_SAMPLE_INDEX_FILE_NAME = "sample_index.pth"
+
+# A WDS sample index holds the decoded filter members of every sample of a shard folder, so that predicates can be
+# evaluated without opening the shards:
+# {
+#     "key_globs": key globs of the indexed members, e.g. DEFAULT_FILTER_KEY_GLOBS,
+#     "shards": {
+#         shard file name, e.g. "shards-0000.tar": {
+#             sample __key__: decoded filter members, e.g. {"gt_data": {...}, "sequence_name": "seq_0"},
+#             ...
+#         },
+#         ...
+#     },
+# }
+
+
+def decode_filter_members(members: Dict) -> Dict:
+    """
+    Decode the raw filter members of a WDS sample (e.g. `gt_data.json`, `gt_data#...pth`, `sequence_name.txt`) into
+    the same dict as decoded ATEK samples, e.g. {"gt_data": {...}, "sequence_name": "seq_0"}.
+    """
+    # Imported here, since the loader itself imports this module
+    from atek.data_loaders.atek_wds_dataloader import process_wds_sample
+
+    decoded_members = process_wds_sample(
+        wds.autodecode.Decoder([], partial=True)(members)
+    )
+    for meta_key in WDS_META_KEYS:
+        decoded_members.pop(meta_key, None)
+    return decoded_members
+
+
+def _read_filter_members(
+    shard_path: str, key_globs: List[str]
+) -> Iterator[Dict[str, bytes]]:
+    """
+    Read the raw filter members of all samples of a shard, without keeping the other members.
+    """
+    streams = wds.tariterators.url_opener([dict(url=shard_path)])
+    files = wds.tariterators.tar_file_expander(
+        streams, select_files=create_wds_member_selector(key_globs)
+    )
+    return wds.tariterators.group_by_keys(files)
+
+
+def build_wds_sample_index(
+    folder: str, key_globs: List[str] = DEFAULT_FILTER_KEY_GLOBS
+) -> str:
+    """
+    Build (and write) the sample index of an existing shard folder, by reading only the filter members of its samples.
+    Returns the index path.
+    """
+    index = {"key_globs": list(key_globs), "shards": {}}
+    for shard_path in get_sorted_shard_paths(folder):
+        index["shards"][os.path.basename(shard_path)] = {
+            members["__key__"]: decode_filter_members(members)
+            for members in _read_filter_members(shard_path, key_globs)
+        }
+    index_path = os.path.join(folder, WDS_SAMPLE_INDEX_FILE_NAME)
+    torch.save(index, index_path)
+    return index_path
+
+
+def load_wds_sample_index(urls: List[str]) -> Dict[str, Dict[str, Dict]]:
+    """
+    Load the indexed filter members of local shards, as {url: {sample __key__: decoded filter members}}, from the
+    sample index of their folders. Shards without an index, or remote shards, are not included.
+    """
+    urls_by_folder = defaultdict(list)
+    for url in urls:
+        if urlparse(url).scheme in ["", "file"]:
+            urls_by_folder[os.path.dirname(urlparse(url).path)].append(url)
+
+    sample_index = {}
+    for folder, folder_urls in urls_by_folder.items():
+        index_path = os.path.join(folder, WDS_SAMPLE_INDEX_FILE_NAME)
+        if not os.path.exists(index_path):
+            continue
+        index = torch.load(index_path)
+        for url in folder_urls:
+            shard_name = os.path.basename(urlparse(url).path)
+            if shard_name in index["shards"]:
+                sample_index[url] = index["shards"][shard_name]
+    return sample_index
+
+
+class WdsSampleFilter:
+    """
+    Drops WDS samples before their images are decoded, by evaluating a cheap `predicate` on their small members only:
+    the members matching `key_globs` are decoded with `decode_filter_members`, e.g. {"gt_data": {...},
+    "sequence_name": "seq_0"}, and the sample is kept if `predicate` returns True.
+    If `sample_index` ({url: {sample __key__: decoded filter members}}, see `load_wds_sample_index`) is set, the
+    predicate is evaluated on the index instead for indexed shards: shards without any kept sample are not opened at
+    all, and samples of the other shards are kept or dropped by key. The index must hold the members that the predicate
+    is evaluated on, e.g. an index of DEFAULT_FILTER_KEY_GLOBS for a predicate on `gt_data` only.
+    The predicate needs to be picklable (e.g. a module level function or a `partial`) to be used in DataLoader workers.
+    """
+
+    def __init__(
+        self,
+        predicate: Callable[[Dict], bool],
+        key_globs: List[str] = DEFAULT_FILTER_KEY_GLOBS,
+        sample_index: Optional[Dict[str, Dict[str, Dict]]] = None,
+    ) -> None:
+        self.predicate = predicate
+        self.key_globs = list(key_globs)
+        self.sample_index = sample_index if sample_index is not None else {}
+        # Kept sample keys of indexed shards, evaluated on first use
+        self._kept_sample_keys = {}
+
+    def get_kept_sample_keys(self, url: str) -> Optional[Set[str]]:
+        """
+        Returns the keys of the kept samples of a shard according to the sample index, or None if it is not indexed.
+        """
+        if url not in self.sample_index:
+            return None
+        if url not in self._kept_sample_keys:
+            self._kept_sample_keys[url] = {
+                sample_key
+                for sample_key, members in self.sample_index[url].items()
+                if self.predicate(members)
+            }
+        return self._kept_sample_keys[url]
+
+    def get_filtered_shard_num_samples(
+        self, shard_num_samples: Dict[str, int]
+    ) -> Dict[str, int]:
+        """
+        Returns the number of kept samples of each shard, which is only known for indexed shards. The counts of other
+        shards are returned as is.
+        """
+        num_unindexed_shards = 0
+        filtered_shard_num_samples = {}
+        for url, num_samples in shard_num_samples.items():
+            kept_sample_keys = self.get_kept_sample_keys(url)
+            if kept_sample_keys is None:
+                num_unindexed_shards += 1
+                filtered_shard_num_samples[url] = num_samples
+            else:
+                filtered_shard_num_samples[url] = len(kept_sample_keys)
+        if num_unindexed_shards > 0:
+            logger.warning(
+                f"{num_unindexed_shards} of {len(shard_num_samples)} shards have no sample index, their sample counts "
+                "after filtering are unknown, so epoch lengths are not equalized and resuming is not exact."
+            )
+        return filtered_shard_num_samples
+
+    def filter_shards(self, src: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Drop indexed shards without any kept sample.
+        """
+        for shard in src:
+            kept_sample_keys = self.get_kept_sample_keys(shard["url"])
+            if kept_sample_keys is not None and len(kept_sample_keys) == 0:
+                continue
+            yield shard
+
+    def is_sample_kept(self, sample: Dict) -> bool:
+        """
+        Check if a raw WDS sample (with `__key__` and `__url__`) is kept, from the sample index if its shard is
+        indexed, otherwise by decoding its filter members.
+        """
+        kept_sample_keys = self.get_kept_sample_keys(sample["__url__"])
+        if kept_sample_keys is not None:
+            return sample["__key__"] in kept_sample_keys
+        return self.predicate(
+            decode_filter_members(
+                {
+                    k: v
+                    for k, v in sample.items()
+                    if k in WDS_META_KEYS or is_wds_key_selected(k, self.key_globs)
+                }
+            )
+        )
+
+    def filter_sample_source(
+        self,
+        src: Iterable[Dict],
+        sample_source_stage: Callable[[Iterable[Dict]], Iterator[Dict]],
+        output_key_globs: Optional[List[str]] = None,
+    ) -> Iterator[Dict]:
+        """
+        A webdataset pipeline stage from shards to their kept raw samples, read with `sample_source_stage`. If set,
+        only the members matching `output_key_globs` are kept in the samples, i.e. filter members that were only read
+        for the predicate are dropped before decoding.
+        """
+        for sample in sample_source_stage(self.filter_shards(src)):
+            if not self.is_sample_kept(sample):
+                continue
+            if output_key_globs is not None:
+                sample = {
+                    k: v
+                    for k, v in sample.items()
+                    if k in WDS_META_KEYS or is_wds_key_selected(k, output_key_globs)
+                }
+            yield sample
+
+
+def _has_obb_gt_with_categories(
+    sample_members: Dict,
+    gt_type: str,
+    camera_label: Optional[str],
+    category_ids: Optional[List[int]],
+) -> bool:
+    gt_dicts = sample_members.get("gt_data", {}).get(gt_type, {})
+    if camera_label is not None:
+        gt_dicts = {camera_label: gt_dicts.get(camera_label, {})}
+    for gt_dict in gt_dicts.values():
+        if "category_ids" not in gt_dict:
+            continue
+        sample_category_ids = torch.as_tensor(gt_dict["category_ids"])
+        if category_ids is None:
+            if sample_category_ids.numel() > 0:
+                return True
+        elif torch.isin(sample_category_ids, torch.tensor(category_ids)).any():
+            return True
+    return False
+
+
+def create_obb_gt_predicate(
+    gt_type: str = "obb3_gt",
+    camera_label: Optional[str] = None,
+    category_ids: Optional[List[int]] = None,
+) -> Callable[[Dict], bool]:
+    """
+    Create a predicate keeping samples with at least one `gt_type` ("obb3_gt" or "obb2_gt") instance, of camera
+    `camera_label` (any camera if None), in `category_ids` (any category if None).
+    """
+    return partial(
+        _has_obb_gt_with_categories,
+        gt_type=gt_type,
+        camera_label=camera_label,
+        category_ids=category_ids,
+    )
+
+
+def _has_sequence_name(sample_members: Dict, sequence_names: Set[str]) -> bool:
+    return sample_members.get("sequence_name") in sequence_names
+
+
+def create_sequence_name_predicate(
+    sequence_names: List[str],
+) -> Callable[[Dict], bool]:
+    """
+    Create a predicate keeping samples of the given sequences.
+    """
+    return partial(_has_sequence_name, sequence_names=set(sequence_names))
@@ -0,0 +1,228 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fcntl
+import hashlib
+import io
+import logging
+import os
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+import requests
+import webdataset as wds
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Suffix of partially downloaded shards in the cache folder, which are not counted as cached shards
+CACHE_TEMP_FILE_SUFFIX = ".tmp"
+
+# Name of the lock file that serializes cache updates across DataLoader workers and processes
+CACHE_LOCK_FILE_NAME = ".lock"
+
+# Bytes that are read when closing a shard stream, to reach the end of the tar padding after the last member
+MAX_DRAIN_BYTES_ON_CLOSE = 1 << 20
+
+
+def _is_http_url(url: str) -> bool:
+    return urlparse(url).scheme in ["http", "https"]
+
+
+class _CacheTeeStream(io.RawIOBase):
+    """
+    A read-only stream over an HTTP response, that writes everything read to a temporary file in the cache folder,
+    and moves it into the cache when the whole shard was read.
+    """
+
+    def __init__(self, shard_cache: "WdsShardCache", url: str, response) -> None:
+        super().__init__()
+        self.shard_cache = shard_cache
+        self.url = url
+        self.response = response
+        self.temp_path = f"{shard_cache.get_cache_path(url)}.{uuid.uuid4().hex}{CACHE_TEMP_FILE_SUFFIX}"
+        self.temp_file = open(self.temp_path, "wb")
+        self.sha1 = hashlib.sha1()
+        self.num_bytes = 0
+        self.reached_eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.response.raw.read(len(buffer))
+        if len(data) == 0:
+            self.reached_eof = True
+            return 0
+        buffer[: len(data)] = data
+        self.temp_file.write(data)
+        self.sha1.update(data)
+        self.num_bytes += len(data)
+        return len(data)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            # The tar reader stops after the end-of-archive blocks, so read the remaining padding to complete the shard
+            num_drained_bytes = 0
+            while not self.reached_eof and num_drained_bytes < MAX_DRAIN_BYTES_ON_CLOSE:
+                num_drained_bytes += len(self.read(64 * 1024))
+            self.temp_file.close()
+            self.response.close()
+            if self.reached_eof:
+                self.shard_cache.add_shard(
+                    self.url, self.temp_path, self.num_bytes, self.sha1.hexdigest()
+                )
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+            super().close()
+
+
+class WdsShardCache:
+    """
+    A local disk cache for WDS shards streamed over HTTP, e.g. from the `streamable_*.yaml` tar lists of ATEK Data Store.
+    On first read a shard is tee'd into `cache_dir` while being streamed, later reads are served from the local copy.
+    The cache is kept under `max_cache_bytes` by evicting the least recently used shards, and is safe to share across
+    DataLoader workers and processes. If `sha1sums` ({url: sha1sum}) is given, shards are only cached if the checksum matches.
+    Non-HTTP urls (local paths) are opened directly, without caching.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_cache_bytes: float = 1e11,
+        sha1sums: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.sha1sums = sha1sums if sha1sums is not None else {}
+        # Created lazily, so the cache can be pickled into DataLoader workers
+        self._http_session = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_http_session"] = None
+        return state
+
+    def get_cache_path(self, url: str) -> str:
+        # Shards from different sequences share names (e.g. shards-0000.tar), so prefix with a hash of the full url
+        url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(
+            self.cache_dir, f"{url_hash}_{os.path.basename(urlparse(url).path)}"
+        )
+
+    def get_cached_shard_paths(self) -> Dict[str, int]:
+        """
+        Returns {cached shard path: size in bytes}.
+        """
+        cached_shard_paths = {}
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith(".") or file_name.endswith(CACHE_TEMP_FILE_SUFFIX):
+                continue
+            file_path = os.path.join(self.cache_dir, file_name)
+            cached_shard_paths[file_path] = os.path.getsize(file_path)
+        return cached_shard_paths
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        with open(os.path.join(self.cache_dir, CACHE_LOCK_FILE_NAME), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _get_http_session(self) -> requests.Session:
+        if self._http_session is None:
+            # Same retry strategy as ATEK Data Store downloading
+            retries = Retry(
+                total=5,
+                backoff_factor=2,
+                status_forcelist=[429, 500, 502, 503, 504],
+            )
+            adapter = HTTPAdapter(max_retries=retries)
+            self._http_session = requests.Session()
+            self._http_session.mount("http://", adapter)
+            self._http_session.mount("https://", adapter)
+        return self._http_session
+
+    def open(self, url: str):
+        """
+        Open a shard as a binary stream, from the cache if available.
+        """
+        if not _is_http_url(url):
+            return wds.gopen(url)
+
+        cache_path = self.get_cache_path(url)
+        try:
+            # Mark the shard as recently used for LRU eviction
+            os.utime(cache_path)
+            return open(cache_path, "rb")
+        except FileNotFoundError:
+            pass
+
+        response = self._get_http_session().get(url, stream=True)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return io.BufferedReader(_CacheTeeStream(self, url, response))
+
+    def add_shard(self, url: str, temp_path: str, num_bytes: int, sha1sum: str) -> bool:
+        """
+        Move a fully downloaded shard into the cache, evicting least recently used shards to stay under the byte budget.
+        Returns True if the shard was cached.
+        """
+        if url in self.sha1sums and self.sha1sums[url] != sha1sum:
+            logger.error(
+                f"SHA1 of {url} does not match ATEK Data Store, expected {self.sha1sums[url]} but got {sha1sum}. Not caching it."
+            )
+            return False
+        if num_bytes > self.max_cache_bytes:
+            logger.warning(
+                f"Shard {url} of {num_bytes} bytes is larger than the cache budget of {self.max_cache_bytes} bytes, not caching it."
+            )
+            return False
+
+        with self._lock():
+            cached_shard_paths = self.get_cached_shard_paths()
+            total_bytes = sum(cached_shard_paths.values()) + num_bytes
+            for cached_path in sorted(cached_shard_paths, key=os.path.getmtime):
+                if total_bytes <= self.max_cache_bytes:
+                    break
+                os.remove(cached_path)
+                total_bytes -= cached_shard_paths[cached_path]
+            os.replace(temp_path, self.get_cache_path(url))
+        return True
+
+
+def cached_url_opener(
+    data: Iterable[Dict], shard_cache: WdsShardCache
+) -> Iterator[Dict]:
+    """
+    A webdataset pipeline stage, same as `wds.tariterators.url_opener`, but opening shards through a WdsShardCache.
+    Each stream is closed once the next shard is requested, which completes the caching of the shard.
+    """
+    for sample in data:
+        stream = shard_cache.open(sample["url"])
+        try:
+            sample.update(stream=stream)
+            yield sample
+        finally:
+            stream.close()
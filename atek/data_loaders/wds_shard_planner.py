@@ -0,0 +1,225 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+import itertools
+import logging
+import os
+import random
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import webdataset as wds
+
+from atek.util.wds_manifest_utils import load_wds_manifest, scan_shard_info
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Modes to make all ranks and workers yield the same number of samples per epoch, e.g. so that DDP ranks run the same
+# number of iterations: "drop" samples beyond the smallest partition, or "pad" by repeating samples up to the largest.
+EQUAL_EPOCH_LENGTH_MODES = ["drop", "pad"]
+
+
+def get_shard_num_samples(urls: List[str], scan_shards: bool = True) -> Dict[str, int]:
+    """
+    Get the number of samples of each local shard, from the manifest of its folder if available, or else by scanning its
+    tar headers if `scan_shards` is set. Remote shards, e.g. streamed over HTTP, are not included.
+    """
+    urls_by_folder = defaultdict(list)
+    for url in urls:
+        if urlparse(url).scheme in ["", "file"]:
+            urls_by_folder[os.path.dirname(urlparse(url).path)].append(url)
+
+    shard_num_samples = {}
+    for folder, folder_urls in urls_by_folder.items():
+        manifest = load_wds_manifest(folder)
+        manifest_num_samples = (
+            {info["name"]: info["num_samples"] for info in manifest["shards"]}
+            if manifest is not None
+            else {}
+        )
+        for url in folder_urls:
+            shard_name = os.path.basename(urlparse(url).path)
+            if shard_name in manifest_num_samples:
+                shard_num_samples[url] = manifest_num_samples[shard_name]
+            elif scan_shards:
+                shard_num_samples[url] = scan_shard_info(
+                    urlparse(url).path, compute_sha1=False
+                )["num_samples"]
+    return shard_num_samples
+
+
+def plan_balanced_shards(
+    shard_num_samples: Dict[str, int], num_partitions: int, seed: Optional[int] = None
+) -> List[List[str]]:
+    """
+    Assign shards to `num_partitions` partitions (e.g. rank x DataLoader worker) with balanced total numbers of samples,
+    by greedily assigning the largest remaining shard to the partition with the fewest samples so far.
+    If `seed` is set, shards with the same sample count are assigned in a shuffled order, and partitions are shuffled,
+    so that shards move across partitions with the seed while staying balanced.
+    The plan only depends on the shard sample counts and the seed, so every rank and worker computes the same plan.
+    """
+    shard_items = sorted(
+        shard_num_samples.items(), key=lambda item: (-item[1], item[0])
+    )
+    partition_order = list(range(num_partitions))
+    if seed is not None:
+        rng = random.Random(seed)
+        rng.shuffle(shard_items)
+        # Stable sort, so shards with the same sample count keep their shuffled order
+        shard_items.sort(key=lambda item: -item[1])
+        rng.shuffle(partition_order)
+
+    partitions = [[] for _ in range(num_partitions)]
+    partition_heap = [(0, i) for i in range(num_partitions)]
+    for url, num_samples in shard_items:
+        total_num_samples, partition_index = heapq.heappop(partition_heap)
+        partitions[partition_index].append(url)
+        heapq.heappush(
+            partition_heap, (total_num_samples + num_samples, partition_index)
+        )
+    return [partitions[i] for i in partition_order]
+
+
+class BalancedShardSplitter:
+    """
+    Splits shards across ranks and DataLoader workers with balanced sample counts, replacing the node splitter and
+    `wds.shardlists.split_by_worker` in a webdataset pipeline. Each (rank, worker) pair is one partition of
+    `plan_balanced_shards`, and keeps the incoming shard order, e.g. as shuffled by `EpochShuffledShardList`.
+    If `seed` is set, the plan is re-drawn with `seed + epoch` every epoch, so shards move across ranks and workers.
+    The epoch is set with `set_epoch` at the start of each pass, e.g. by `ResumableSampleStream`.
+    If `equal_epoch_length_mode` is set (see `EQUAL_EPOCH_LENGTH_MODES`), `equalize_epoch_length` truncates or pads the
+    samples of each partition to the same count. This assumes the pipeline stages in between yield one sample per tar
+    sample. Rank and world size are taken from torch.distributed, unless `rank` and `world_size` are given.
+    """
+
+    def __init__(
+        self,
+        shard_num_samples: Dict[str, int],
+        equal_epoch_length_mode: Optional[str] = None,
+        rank: Optional[int] = None,
+        world_size: Optional[int] = None,
+        seed: Optional[int] = None,
+        epoch: int = 0,
+    ) -> None:
+        assert (
+            equal_epoch_length_mode is None
+            or equal_epoch_length_mode in EQUAL_EPOCH_LENGTH_MODES
+        ), f"equal_epoch_length_mode must be one of {EQUAL_EPOCH_LENGTH_MODES}, got {equal_epoch_length_mode}"
+        self.shard_num_samples = shard_num_samples
+        self.equal_epoch_length_mode = equal_epoch_length_mode
+        self.rank = rank
+        self.world_size = world_size
+        self.seed = seed
+        self.epoch = epoch
+        self._plans = {}
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def get_partition(self) -> Tuple[int, int]:
+        """
+        Returns (index of the current partition, number of partitions).
+        """
+        rank, world_size, worker, num_workers = wds.utils.pytorch_worker_info()
+        if self.rank is not None and self.world_size is not None:
+            rank, world_size = self.rank, self.world_size
+        return rank * num_workers + worker, world_size * num_workers
+
+    def get_plan(self, num_partitions: int) -> List[List[str]]:
+        seed = self.seed + self.epoch if self.seed is not None else None
+        if (num_partitions, seed) not in self._plans:
+            self._plans[(num_partitions, seed)] = plan_balanced_shards(
+                self.shard_num_samples, num_partitions, seed=seed
+            )
+        return self._plans[(num_partitions, seed)]
+
+    def get_partition_num_samples(self, num_partitions: int) -> List[int]:
+        """
+        Returns the number of samples of each partition, before equalizing epoch lengths.
+        """
+        return [
+            sum(self.shard_num_samples[url] for url in partition)
+            for partition in self.get_plan(num_partitions)
+        ]
+
+    def get_epoch_num_samples(self, num_partitions: int) -> Optional[int]:
+        """
+        Returns the number of samples yielded by each partition per epoch in equal epoch length mode, else None.
+        """
+        partition_num_samples = self.get_partition_num_samples(num_partitions)
+        if self.equal_epoch_length_mode == "drop":
+            return min(partition_num_samples)
+        if self.equal_epoch_length_mode == "pad":
+            return max(partition_num_samples)
+        return None
+
+    def split_shards(self, src: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        A webdataset pipeline stage over shard dicts, yielding the shards of the current rank and worker.
+        """
+        partition_index, num_partitions = self.get_partition()
+        partition_urls = set(self.get_plan(num_partitions)[partition_index])
+        if self.equal_epoch_length_mode is not None and len(partition_urls) == 0:
+            raise ValueError(
+                f"Only {len(self.shard_num_samples)} shards for {num_partitions} ranks and workers, cannot equalize "
+                f"epoch lengths with mode {self.equal_epoch_length_mode}: dropping samples would drop all samples, and "
+                "padding has no samples to repeat."
+            )
+        for shard in src:
+            assert (
+                shard["url"] in self.shard_num_samples
+            ), f"No sample count for shard {shard['url']}"
+            if shard["url"] in partition_urls:
+                yield shard
+
+    def equalize_epoch_length(self, src: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        A webdataset pipeline stage over samples of the current partition, truncating or padding them to the same
+        number of samples for all partitions. Padding repeats the first samples of the partition.
+        """
+        partition_index, num_partitions = self.get_partition()
+        epoch_num_samples = self.get_epoch_num_samples(num_partitions)
+        if epoch_num_samples is None:
+            yield from src
+            return
+
+        num_pad_samples = max(
+            epoch_num_samples
+            - self.get_partition_num_samples(num_partitions)[partition_index],
+            0,
+        )
+        pad_samples = []
+        num_samples = 0
+        for sample in src:
+            if num_samples == epoch_num_samples:
+                return
+            if len(pad_samples) < num_pad_samples:
+                # Copy, as later stages may update samples in place
+                pad_samples.append(dict(sample))
+            num_samples += 1
+            yield sample
+
+        if num_samples < epoch_num_samples and len(pad_samples) == 0:
+            # Yielding fewer samples would make this rank run fewer iterations, and hang the others in DDP
+            raise ValueError(
+                f"Partition {partition_index} has no samples to pad its epoch to {epoch_num_samples} samples."
+            )
+        for pad_sample in itertools.cycle(pad_samples):
+            if num_samples == epoch_num_samples:
+                return
+            num_samples += 1
+            yield dict(pad_sample)
@@ -0,0 +1,187 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Iterable, Iterator
+
+import torch
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Size of the chunks read from a shard by background threads
+READ_AHEAD_CHUNK_BYTES = 1 << 20
+
+
+@dataclass
+class ShardReadAheadStats:
+    # Number of shards opened through read-ahead
+    num_shards: int = 0
+    # Number of bytes read from shards
+    num_bytes: int = 0
+    # Time the loader waited for shard data, i.e. the time read-ahead did not hide
+    stall_time_s: float = 0.0
+
+
+# Read-ahead stats of the current process, i.e. of the current DataLoader worker
+_SHARD_READ_AHEAD_STATS = ShardReadAheadStats()
+
+
+def get_shard_read_ahead_stats() -> ShardReadAheadStats:
+    """
+    Returns a copy of the shard read-ahead stats of the current process (DataLoader worker).
+    """
+    return replace(_SHARD_READ_AHEAD_STATS)
+
+
+class _ReadAheadStream(io.RawIOBase):
+    """
+    A read-only stream over a shard that is read in chunks by a background thread, buffering at most
+    `max_buffered_bytes` ahead of the reader.
+    """
+
+    def __init__(self, max_buffered_bytes: int) -> None:
+        super().__init__()
+        self.max_buffered_bytes = max_buffered_bytes
+        self.chunks = deque()
+        self.chunk_offset = 0
+        self.num_buffered_bytes = 0
+        self.condition = threading.Condition()
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+
+    def fill(self, open_fn: Callable, url: str) -> None:
+        """
+        Read the whole shard into the buffer, running on a background thread.
+        """
+        source = None
+        try:
+            source = open_fn(url)
+            while not self.cancelled:
+                chunk = source.read(READ_AHEAD_CHUNK_BYTES)
+                if len(chunk) == 0:
+                    break
+                with self.condition:
+                    while (
+                        self.num_buffered_bytes >= self.max_buffered_bytes
+                        and not self.cancelled
+                    ):
+                        self.condition.wait()
+                    self.chunks.append(chunk)
+                    self.num_buffered_bytes += len(chunk)
+                    self.condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            # Closing the source after reading it fully also completes shard caching, see `WdsShardCache`
+            if source is not None:
+                source.close()
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        with self.condition:
+            if len(self.chunks) == 0 and not self.finished:
+                start_time = time.perf_counter()
+                while len(self.chunks) == 0 and not self.finished:
+                    self.condition.wait()
+                _SHARD_READ_AHEAD_STATS.stall_time_s += time.perf_counter() - start_time
+            if self.error is not None:
+                raise self.error
+            if len(self.chunks) == 0:
+                return 0
+
+            chunk = self.chunks[0]
+            num_bytes = min(len(buffer), len(chunk) - self.chunk_offset)
+            buffer[:num_bytes] = chunk[
+                self.chunk_offset : self.chunk_offset + num_bytes
+            ]
+            self.chunk_offset += num_bytes
+            if self.chunk_offset == len(chunk):
+                self.chunks.popleft()
+                self.chunk_offset = 0
+            self.num_buffered_bytes -= num_bytes
+            _SHARD_READ_AHEAD_STATS.num_bytes += num_bytes
+            self.condition.notify_all()
+            return num_bytes
+
+    def close(self) -> None:
+        with self.condition:
+            self.cancelled = True
+            self.chunks.clear()
+            self.condition.notify_all()
+        super().close()
+
+
+def read_ahead_url_opener(
+    data: Iterable[Dict],
+    open_fn: Callable,
+    num_read_ahead_shards: int,
+    max_read_ahead_bytes: float,
+) -> Iterator[Dict]:
+    """
+    A webdataset pipeline stage, same as `wds.tariterators.url_opener`, but reading the current shard and the next
+    `num_read_ahead_shards` shards on background threads, so that opening and streaming shards overlaps with decoding.
+    At most `max_read_ahead_bytes` are buffered in total, split evenly across the shards being read.
+    `open_fn(url)` opens a shard as a binary stream, e.g. `wds.gopen` or `WdsShardCache.open`.
+    Use as a pipeline stage with `partial(read_ahead_url_opener, open_fn=..., ...)`.
+    """
+    num_streams = num_read_ahead_shards + 1
+    max_buffered_bytes_per_stream = max(int(max_read_ahead_bytes // num_streams), 1)
+    executor = ThreadPoolExecutor(max_workers=num_streams)
+    url_iterator = iter(data)
+    pending_streams = deque()
+    current_stream = None
+    try:
+        while True:
+            while len(pending_streams) < num_streams:
+                sample = next(url_iterator, None)
+                if sample is None:
+                    break
+                stream = _ReadAheadStream(max_buffered_bytes_per_stream)
+                executor.submit(stream.fill, open_fn, sample["url"])
+                pending_streams.append((sample, stream))
+                _SHARD_READ_AHEAD_STATS.num_shards += 1
+            if len(pending_streams) == 0:
+                break
+
+            sample, stream = pending_streams.popleft()
+            current_stream = io.BufferedReader(stream)
+            sample.update(stream=current_stream)
+            yield sample
+            current_stream.close()
+    finally:
+        if current_stream is not None:
+            current_stream.close()
+        for _, stream in pending_streams:
+            stream.close()
+        executor.shutdown(wait=False)
+
+        worker_info = torch.utils.data.get_worker_info()
+        worker_id = worker_info.id if worker_info is not None else 0
+        logger.info(
+            f"Shard read-ahead in worker {worker_id}: stalled {_SHARD_READ_AHEAD_STATS.stall_time_s:.2f} s "
+            f"over {_SHARD_READ_AHEAD_STATS.num_shards} shards and {_SHARD_READ_AHEAD_STATS.num_bytes / 1e6:.1f} MB"
+        )
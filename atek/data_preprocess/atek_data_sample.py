@@ -12,26 +12,46 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from dataclasses import asdict, dataclass, field, fields, is_dataclass
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
 import torch
 from atek.util.tensor_utils import concat_list_of_tensors
 
+# Cache of per-dataclass key table, as a tuple of (field_name, lower-cased field_name).
+_DATACLASS_KEY_TABLES: Dict[type, Tuple[Tuple[str, str], ...]] = {}
+
+
+def _get_dataclass_key_table(DataClassType) -> Tuple[Tuple[str, str], ...]:
+    """
+    Returns the (field_name, lower-cased field_name) table of a dataclass type, computed once per type.
+    """
+    key_table = _DATACLASS_KEY_TABLES.get(DataClassType)
+    if key_table is None:
+        key_table = tuple(
+            (data_field.name, data_field.name.lower())
+            for data_field in fields(DataClassType)
+        )
+        _DATACLASS_KEY_TABLES[DataClassType] = key_table
+    return key_table
+
 
 def _to_flatten_dict_impl(dataclass_instance, dataclass_prefix):
+    """
+    Flatten a dataclass instance into a dict of {prefix + lower-cased field name: value}.
+    Only references are moved, values (tensors, lists) are NOT copied.
+    """
     flatten_dict = {}
-    # asdict will create a deep copy. TODO: is this necessary?
-    for (
-        key,
-        value,
-    ) in asdict(dataclass_instance).items():
-        if value is None or value == "":
+    lower_prefix = dataclass_prefix.lower()
+    for field_name, lower_field_name in _get_dataclass_key_table(
+        type(dataclass_instance)
+    ):
+        value = getattr(dataclass_instance, field_name)
+        if value is None or (isinstance(value, str) and value == ""):
             continue
 
         # add prefix to the key
-        flattened_key_in_lcase = f"{dataclass_prefix}{key}".lower()
-        flatten_dict[flattened_key_in_lcase] = value
+        flatten_dict[f"{lower_prefix}{lower_field_name}"] = value
     return flatten_dict
 
 
@@ -236,6 +256,21 @@ class AtekDataSample:
         return flatten_dict
 
 
+def _init_data_class_from_sub_dict(DataClassType, sub_dict: Dict[str, Any]):
+    """
+    A helper to initialize a data class from a sub-dict whose keys are lower-cased field names.
+    """
+    if len(sub_dict) == 0:
+        return None
+
+    data_class_instance = DataClassType()
+    for field_name, lower_field_name in _get_dataclass_key_table(DataClassType):
+        if lower_field_name in sub_dict:
+            setattr(data_class_instance, field_name, sub_dict[lower_field_name])
+
+    return data_class_instance
+
+
 def _init_data_class_from_flatten_dict_impl(
     DataClassType, flatten_dict: Dict[str, Any], prefix: str = ""
 ):
@@ -247,67 +282,56 @@ def _init_data_class_from_flatten_dict_impl(
     for key in flatten_dict.keys():
         if key.startswith(prefix):
             sub_dict[key[len(prefix) :]] = flatten_dict[key]
-    if len(sub_dict) == 0:
-        return None
 
-    data_class_instance = DataClassType()
+    return _init_data_class_from_sub_dict(DataClassType, sub_dict)
 
-    # Populate the dataclass fields
-    for data_field in fields(data_class_instance):
-        data_field_name = data_field.name
-        if data_field_name.lower() in sub_dict:
-            setattr(
-                data_class_instance,
-                data_field_name,
-                sub_dict[data_field_name.lower()],
-            )
-        else:
-            continue
 
-    return data_class_instance
+# Mapping from flattened key prefix to (AtekDataSample field name, data class type)
+_FLATTEN_PREFIX_TO_SAMPLE_FIELD = {
+    "mfcd#camera-rgb+": ("camera_rgb", MultiFrameCameraData),
+    "mfcd#camera-slam-left+": ("camera_slam_left", MultiFrameCameraData),
+    "mfcd#camera-slam-right+": ("camera_slam_right", MultiFrameCameraData),
+    "mfcd#camera-rgb-depth+": ("camera_rgb_depth", MultiFrameCameraData),
+    "mtd#": ("mps_traj_data", MpsTrajData),
+    "msdpd#": ("mps_semidense_point_data", MpsSemiDensePointData),
+    "mocd#": ("mps_online_calib_data", MpsOnlineCalibData),
+}
+
+
+def _get_flatten_key_prefix(key: str) -> Optional[str]:
+    """
+    Returns the dataclass prefix of a flattened key, e.g. "mfcd#camera-rgb+images" -> "mfcd#camera-rgb+", "mtd#ts_world_device" -> "mtd#".
+    """
+    sharp_index = key.find("#")
+    if sharp_index < 0:
+        return None
+    if key.startswith("mfcd#"):
+        plus_index = key.find("+", sharp_index)
+        return key[: plus_index + 1] if plus_index >= 0 else None
+    return key[: sharp_index + 1]
 
 
 def create_atek_data_sample_from_flatten_dict(flatten_dict):
     """
     A helper function to initialize an ATEK data sample from its corresponding flattened dictionary.
+    Keys are grouped by their dataclass prefix in a single pass, and values are moved by reference without copying.
     """
-    # Camera data + depth
-    atek_data_sample = AtekDataSample()
-    atek_data_sample.camera_rgb = _init_data_class_from_flatten_dict_impl(
-        MultiFrameCameraData,
-        flatten_dict,
-        "mfcd#camera-rgb+",
-    )
-    atek_data_sample.camera_slam_left = _init_data_class_from_flatten_dict_impl(
-        MultiFrameCameraData,
-        flatten_dict,
-        "mfcd#camera-slam-left+",
-    )
-    atek_data_sample.camera_slam_right = _init_data_class_from_flatten_dict_impl(
-        MultiFrameCameraData,
-        flatten_dict,
-        "mfcd#camera-slam-right+",
-    )
-    atek_data_sample.camera_rgb_depth = _init_data_class_from_flatten_dict_impl(
-        MultiFrameCameraData,
-        flatten_dict,
-        "mfcd#camera-rgb-depth+",
-    )
+    sub_dicts = {prefix: {} for prefix in _FLATTEN_PREFIX_TO_SAMPLE_FIELD}
+    for key, value in flatten_dict.items():
+        prefix = _get_flatten_key_prefix(key)
+        if prefix in sub_dicts:
+            sub_dicts[prefix][key[len(prefix) :]] = value
 
-    # MPS data
-    atek_data_sample.mps_traj_data = _init_data_class_from_flatten_dict_impl(
-        MpsTrajData, flatten_dict, "mtd#"
-    )
-    atek_data_sample.mps_semidense_point_data = _init_data_class_from_flatten_dict_impl(
-        MpsSemiDensePointData,
-        flatten_dict,
-        "msdpd#",
-    )
-    atek_data_sample.mps_online_calib_data = _init_data_class_from_flatten_dict_impl(
-        MpsOnlineCalibData,
-        flatten_dict,
-        "mocd#",
-    )
+    atek_data_sample = AtekDataSample()
+    for prefix, (
+        sample_field_name,
+        DataClassType,
+    ) in _FLATTEN_PREFIX_TO_SAMPLE_FIELD.items():
+        setattr(
+            atek_data_sample,
+            sample_field_name,
+            _init_data_class_from_sub_dict(DataClassType, sub_dicts[prefix]),
+        )
 
     # GT data is already a dict
     atek_data_sample.gt_data = flatten_dict["gt_data"]
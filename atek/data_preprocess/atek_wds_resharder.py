@@ -0,0 +1,189 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import random
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+import webdataset as wds
+import yaml
+
+from atek.data_preprocess.atek_wds_writer import ManifestShardWriter
+from atek.util.wds_key_utils import create_wds_member_selector, WDS_META_KEYS
+from atek.util.wds_manifest_utils import get_sorted_shard_paths
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def iterate_raw_wds_samples(
+    urls: List[str], keep_key_globs: Optional[List[str]] = None
+) -> Iterator[Dict]:
+    """
+    Stream samples from WDS tars in order, with members as undecoded bytes, and only the members matching keep_key_globs.
+    Non-selected members are skipped at tar level, before being grouped into samples.
+    """
+    dataset = wds.WebDataset(
+        urls,
+        shardshuffle=False,
+        nodesplitter=wds.shardlists.single_node_only,
+        workersplitter=None,
+        select_files=create_wds_member_selector(keep_key_globs),
+        empty_check=False,
+    )
+    for sample in dataset:
+        yield {
+            k: v for k, v in sample.items() if k == "__key__" or k not in WDS_META_KEYS
+        }
+
+
+def reshard_atek_wds(
+    input_urls: List[str],
+    output_path: str,
+    keep_key_globs: Optional[List[str]] = None,
+    max_samples_per_shard: int = 100000,
+    max_shard_size_bytes: float = 3e9,
+    write_manifest: bool = True,
+) -> List[str]:
+    """
+    Rewrite existing ATEK WDS shards into `output_path`, keeping only the keys matching keep_key_globs (default is to keep all),
+    and re-sharding by sample count and/or byte size. Members are copied tar-to-tar as bytes, without decoding images or tensors.
+    Returns the sorted list of written shard paths.
+    """
+    shard_writer = ManifestShardWriter(
+        output_path=output_path,
+        max_samples_per_shard=max_samples_per_shard,
+        max_shard_size_bytes=max_shard_size_bytes,
+    )
+    num_samples = 0
+    for sample in iterate_raw_wds_samples(input_urls, keep_key_globs=keep_key_globs):
+        shard_writer.write(sample)
+        num_samples += 1
+
+    output_shards = shard_writer.close(write_manifest=write_manifest)
+    logger.info(
+        f"Resharded {num_samples} samples from {len(input_urls)} input shards into {len(output_shards)} shards in {output_path}"
+    )
+    return output_shards
+
+
+def find_sequence_tar_dict_in_folder(input_folder: str) -> Dict[str, List[str]]:
+    """
+    Find per-sequence WDS shards in a folder, where each sub-folder holds the shards of one sequence,
+    as written by the ATEK preprocessing. Returns {sequence_name: sorted shard paths}.
+    """
+    sequence_tar_dict = {}
+    for sequence_name in sorted(os.listdir(input_folder)):
+        shard_paths = get_sorted_shard_paths(os.path.join(input_folder, sequence_name))
+        if len(shard_paths) > 0:
+            sequence_tar_dict[sequence_name] = shard_paths
+    return sequence_tar_dict
+
+
+def _iterate_interleaved_sequence_samples(
+    sequence_tar_dict: Dict[str, List[str]],
+    interleave_window: int,
+    keep_key_globs: Optional[List[str]],
+) -> Iterator[tuple]:
+    """
+    Yield (sequence_name, raw sample) round-robin across up to `interleave_window` sequences at a time.
+    A finished sequence is replaced by the next one, so only `interleave_window` tar streams are open at once.
+    """
+    pending_sequences = deque(sequence_tar_dict.items())
+    active_iterators = deque()
+    while len(pending_sequences) > 0 or len(active_iterators) > 0:
+        while len(active_iterators) < interleave_window and len(pending_sequences) > 0:
+            sequence_name, urls = pending_sequences.popleft()
+            active_iterators.append(
+                (sequence_name, iterate_raw_wds_samples(urls, keep_key_globs))
+            )
+
+        sequence_name, sample_iterator = active_iterators.popleft()
+        sample = next(sample_iterator, None)
+        if sample is not None:
+            yield sequence_name, sample
+            active_iterators.append((sequence_name, sample_iterator))
+
+
+def compact_atek_wds_sequences(
+    sequence_tar_dict: Dict[str, List[str]],
+    output_path: str,
+    max_samples_per_shard: int = 100000,
+    max_shard_size_bytes: float = 3e9,
+    interleave_sequences: bool = False,
+    interleave_window: int = 16,
+    shuffle_seed: Optional[int] = None,
+    keep_key_globs: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    Merge per-sequence ATEK WDS shards (each ending with a partial shard) into uniformly sized, globally numbered shards,
+    streaming tar-to-tar without decoding. Sample content, including `sequence_name`, is kept as is,
+    while `__key__` is prefixed with the sequence name to stay unique across sequences.
+    Args:
+        sequence_tar_dict: {sequence_name: list of shard paths or urls}, e.g. from `load_yaml_and_extract_sequence_tar_dict`.
+        interleave_sequences: if True, interleave samples round-robin across `interleave_window` sequences, for better shuffling
+            with shard-level shuffle. Otherwise sequences are written one after another.
+        shuffle_seed: if set, shuffle the sequence order with this seed before compaction.
+    Returns the sorted list of written shard paths.
+    """
+    sequence_items = list(sequence_tar_dict.items())
+    if shuffle_seed is not None:
+        random.Random(shuffle_seed).shuffle(sequence_items)
+    sequence_tar_dict = dict(sequence_items)
+
+    # Without interleaving, sequences are simply streamed one after another
+    sample_iterator = _iterate_interleaved_sequence_samples(
+        sequence_tar_dict,
+        interleave_window=interleave_window if interleave_sequences else 1,
+        keep_key_globs=keep_key_globs,
+    )
+
+    shard_writer = ManifestShardWriter(
+        output_path=output_path,
+        max_samples_per_shard=max_samples_per_shard,
+        max_shard_size_bytes=max_shard_size_bytes,
+    )
+    num_samples = 0
+    for sequence_name, sample in sample_iterator:
+        # __key__ can not contain dots, which are used to separate the key from file extensions in tars
+        sequence_tag = sequence_name.replace(".", "_")
+        sample["__key__"] = f"{sequence_tag}_{sample['__key__'].lstrip('_')}"
+        shard_writer.write(sample)
+        num_samples += 1
+
+    output_shards = shard_writer.close()
+    logger.info(
+        f"Compacted {num_samples} samples from {len(sequence_tar_dict)} sequences into {len(output_shards)} shards in {output_path}"
+    )
+    return output_shards
+
+
+def write_compacted_tar_yaml(
+    output_shards: List[str], yaml_path: str, group_name: str = "compacted"
+) -> None:
+    """
+    Write the tar list yaml of compacted shards, with paths relative to the yaml, that can be loaded by
+    `load_yaml_and_extract_tar_list`. As compacted shards mix sequences, all shards are listed under a single group name.
+    """
+    yaml_dir = os.path.dirname(os.path.abspath(yaml_path))
+    relative_paths = [
+        os.path.relpath(os.path.abspath(shard_path), yaml_dir)
+        for shard_path in output_shards
+    ]
+    with open(yaml_path, "w") as file:
+        yaml.dump(
+            {"tars": {group_name: relative_paths}}, file, default_flow_style=False
+        )
@@ -15,15 +15,29 @@
 import copy
 import logging
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import torch
 import webdataset as wds
 
 from atek.data_preprocess.atek_data_sample import AtekDataSample
 from atek.util.file_io_utils import separate_tensors_from_dict
+from atek.util.image_codec_utils import (
+    create_image_codec_config,
+    encode_image_frame,
+    ImageCodecConfig,
+)
+from atek.util.tensor_codec_utils import (
+    encode_tensor_to_raw_bytes,
+    RAW_TENSOR_EXTENSION,
+)
 from atek.util.tensor_utils import concat_list_of_tensors
+from atek.util.wds_key_utils import is_wds_key_selected, project_wds_sample
+from atek.util.wds_manifest_utils import create_shard_info, write_wds_manifest
 from omegaconf import DictConfig
 
 SEMIDENSE_POINTS_FIELDS = [
@@ -36,11 +50,56 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+# Supported formats to serialize tensors in WDS, "pth" uses `torch.save`, "rawtensor" uses a header + raw bytes format
+# that is decoded without unpickling, see `atek.util.tensor_codec_utils`.
+SUPPORTED_TENSOR_FORMATS = ["pth", RAW_TENSOR_EXTENSION]
+
+
+def _add_tensor_to_wds_dict(
+    wds_dict: Dict, key_wo_extension: str, tensor: torch.Tensor, tensor_format: str
+) -> None:
+    """
+    Add a tensor to wds dict, with the proper file extension according to tensor_format.
+    """
+    if tensor_format == RAW_TENSOR_EXTENSION:
+        wds_dict[f"{key_wo_extension}.{RAW_TENSOR_EXTENSION}"] = (
+            encode_tensor_to_raw_bytes(tensor)
+        )
+    else:
+        wds_dict[f"{key_wo_extension}.pth"] = tensor
+
+
+def _get_image_codec_config(
+    image_codecs: Optional[Dict[str, ImageCodecConfig]], atek_key: str
+) -> ImageCodecConfig:
+    """
+    Look up the image codec for an image key `mfcd#{camera_label}+images`, falling back to the "default" entry.
+    """
+    if image_codecs is None:
+        return ImageCodecConfig()
+    camera_label = atek_key.split("#", 1)[-1].split("+", 1)[0]
+    if camera_label in image_codecs:
+        return image_codecs[camera_label]
+    return image_codecs.get("default", ImageCodecConfig())
+
+
 def convert_atek_sample_dict_to_wds_dict(
     index: int,
     atek_sample_dict: Dict,
     prefix_string: str,
+    tensor_format: str = "pth",
+    image_codecs: Optional[Dict[str, ImageCodecConfig]] = None,
+    keep_key_globs: Optional[List[str]] = None,
 ) -> Dict:
+    """
+    Convert a flattened ATEK sample dict into a WDS dict, where keys carry the file extensions and image frames are encoded to bytes.
+    `image_codecs` maps camera label (or "default") to its image codec, defaults to jpeg with quality 100.
+    `keep_key_globs` optionally selects the WDS keys to keep, e.g. ["mfcd#camera-rgb+*", "gt_data*"], default is to keep all.
+    """
+    if tensor_format not in SUPPORTED_TENSOR_FORMATS:
+        raise ValueError(
+            f"Unsupported tensor format {tensor_format}, needs to be one of {SUPPORTED_TENSOR_FORMATS}"
+        )
 
     wds_dict = {"__key__": f"{prefix_string}_AtekDataSample_{index:06}"}
 
@@ -54,26 +113,29 @@ def convert_atek_sample_dict_to_wds_dict(
             gt_dict_no_tensor, tensor_dict = separate_tensors_from_dict(atek_value)
             wds_dict["gt_data.json"] = gt_dict_no_tensor
             for tensor_key, tensor_value in tensor_dict.items():
-                wds_dict[f"gt_data#{tensor_key}.pth"] = tensor_value
+                _add_tensor_to_wds_dict(
+                    wds_dict, f"gt_data#{tensor_key}", tensor_value, tensor_format
+                )
             continue
 
         # Depth images should be directly saved as tensors
         elif atek_key.endswith("depth+images"):
-            wds_dict[f"{atek_key}.pth"] = atek_value
+            _add_tensor_to_wds_dict(wds_dict, atek_key, atek_value, tensor_format)
 
-        # Images needs to be separated into per-frame jpeg files
+        # Images needs to be separated into per-frame encoded image files
         elif atek_key.endswith("images"):
             assert isinstance(atek_value, torch.Tensor)
-            # Transpose dimensions, [Frame, C, H, W] -> [Frame, H, W, C]
-            image_frames_in_np = atek_value.numpy().transpose(0, 2, 3, 1)
-            for id, img in enumerate(image_frames_in_np):
-                new_key = f"{atek_key}_{id}.jpeg"
-                wds_dict[new_key] = img if img.shape[-1] == 3 else img.squeeze()
+            codec_config = _get_image_codec_config(image_codecs, atek_key)
+            for id, img in enumerate(atek_value):
+                new_key = f"{atek_key}_{id}.{codec_config.extension}"
+                # Skip encoding of images that are not kept anyway
+                if is_wds_key_selected(new_key, keep_key_globs):
+                    wds_dict[new_key] = encode_image_frame(img, codec_config)
             continue
 
         # For other fields, simply adds proper file extension to the key
         elif isinstance(atek_value, torch.Tensor):
-            wds_dict[f"{atek_key}.pth"] = atek_value
+            _add_tensor_to_wds_dict(wds_dict, atek_key, atek_value, tensor_format)
         elif isinstance(atek_value, str):
             wds_dict[f"{atek_key}.txt"] = atek_value
         elif isinstance(atek_value, dict):
@@ -91,7 +153,9 @@ def convert_atek_sample_dict_to_wds_dict(
             concatenated_tensor, current_len_tensors = concat_list_of_tensors(
                 atek_sample_dict[semidense_key]
             )
-            wds_dict[f"{semidense_key}+stacked.pth"] = concatenated_tensor
+            _add_tensor_to_wds_dict(
+                wds_dict, f"{semidense_key}+stacked", concatenated_tensor, tensor_format
+            )
             if len_tensors is None:
                 len_tensors = current_len_tensors.clone()
             else:
@@ -99,9 +163,115 @@ def convert_atek_sample_dict_to_wds_dict(
                     len_tensors, current_len_tensors, atol=1
                 ), f"The lengths for all semidense points data types should be the same! Instead got\n {current_len_tensors} in {semidense_key} vs \n {len_tensors}"
     if len_tensors is not None:
-        wds_dict["msdpd#points_world_lengths.pth"] = len_tensors
+        _add_tensor_to_wds_dict(
+            wds_dict, "msdpd#points_world_lengths", len_tensors, tensor_format
+        )
 
-    return wds_dict
+    return project_wds_sample(wds_dict, keep_key_globs)
+
+
+class ManifestShardWriter:
+    """
+    A wrapper over `wds.ShardWriter`, that rolls over shards when either the sample count or the byte size limit is reached,
+    and keeps the per-shard book-keeping needed to write a manifest, see `atek.util.wds_manifest_utils`.
+    Values in the written dicts can be either already-encoded bytes, or any type supported by the webdataset encoder.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        max_samples_per_shard: int = 100000,
+        max_shard_size_bytes: float = 3e9,
+        shard_name_pattern: str = "shards-%04d.tar",
+        start_shard: int = 0,
+    ) -> None:
+        self.output_path = output_path
+        self.max_samples_per_shard = max_samples_per_shard
+        self.max_shard_size_bytes = max_shard_size_bytes
+        self.shard_name_pattern = shard_name_pattern
+        self.start_shard = start_shard
+        self.sink = None
+
+        # Book-keeping of each written shard, keyed by shard path
+        self.shard_records = {}
+
+    def write(self, wds_dict: Dict) -> None:
+        # Lazily create the sink, so no empty shard is created if nothing is written
+        if self.sink is None:
+            if not os.path.exists(self.output_path):
+                os.makedirs(self.output_path)
+
+            self.sink = wds.ShardWriter(
+                os.path.join(self.output_path, self.shard_name_pattern),
+                maxcount=self.max_samples_per_shard,
+                maxsize=self.max_shard_size_bytes,
+                post=self._finalize_shard_record,
+                start_shard=self.start_shard,
+            )
+
+        self.sink.write(wds_dict)
+
+        shard_record = self.shard_records.setdefault(
+            self.sink.fname, {"num_samples": 0, "data_bytes": 0, "keys": set()}
+        )
+        shard_record["num_samples"] += 1
+        shard_record["data_bytes"] = self.sink.size
+        shard_record["keys"].update(k for k in wds_dict.keys() if k != "__key__")
+
+    def _finalize_shard_record(self, shard_path: str) -> None:
+        """
+        Called by ShardWriter when a shard file is closed, computes its manifest entry.
+        """
+        shard_record = self.shard_records[shard_path]
+        shard_record["shard_info"] = create_shard_info(
+            shard_path,
+            num_samples=shard_record["num_samples"],
+            keys=list(shard_record["keys"]),
+        )
+
+    def _is_shard_full(self, shard_record: Dict) -> bool:
+        return (
+            shard_record["num_samples"] >= self.max_samples_per_shard
+            or shard_record["data_bytes"] >= self.max_shard_size_bytes
+        )
+
+    def get_shard_infos(self) -> List[Dict]:
+        """
+        Return the manifest entries of all closed shards, sorted by shard name.
+        """
+        return [
+            self.shard_records[path]["shard_info"]
+            for path in sorted(self.shard_records.keys())
+            if "shard_info" in self.shard_records[path]
+        ]
+
+    def close(
+        self, remove_last_tar_if_not_full: bool = False, write_manifest: bool = True
+    ) -> List[str]:
+        """
+        Close the current shard, optionally remove the last shard if it is not full, and write the manifest.
+        Returns the sorted paths of the kept shards.
+        """
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+        # Shard names are zero-padded, so sorting by name gives the write order
+        shard_paths = sorted(self.shard_records.keys())
+
+        # Remove the last tar file if it reached neither max_samples_per_shard nor max_shard_size_bytes
+        if remove_last_tar_if_not_full:
+            if len(shard_paths) == 0:
+                logger.warning("No tar files found in the output path.")
+            elif not self._is_shard_full(self.shard_records[shard_paths[-1]]):
+                last_tar_file = shard_paths.pop()
+                logger.info(f"Removing last tar file {last_tar_file} as it is not full")
+                os.remove(last_tar_file)
+                self.shard_records.pop(last_tar_file)
+
+        if write_manifest and len(shard_paths) > 0:
+            write_wds_manifest(self.output_path, self.get_shard_infos())
+        return shard_paths
 
 
 class AtekWdsWriter:
@@ -111,10 +281,57 @@ class AtekWdsWriter:
         """
         self.output_path = output_path
         self.prefix_string = conf.prefix_string
-        self.sink = None
         self.current_sample_idx = 0
-        self.max_samples_per_shard = conf.max_samples_per_shard
-        self.samples_in_current_shard = 0
+
+        # Shards are rolled over when either limit is reached. Defaults are the same as `wds.ShardWriter`.
+        self.max_samples_per_shard = (
+            conf.max_samples_per_shard
+            if "max_samples_per_shard" in conf
+            and conf.max_samples_per_shard is not None
+            else 100000
+        )
+        self.max_shard_size_bytes = (
+            conf.max_shard_size_bytes
+            if "max_shard_size_bytes" in conf and conf.max_shard_size_bytes is not None
+            else 3e9
+        )
+
+        self.shard_writer = ManifestShardWriter(
+            output_path=self.output_path,
+            max_samples_per_shard=self.max_samples_per_shard,
+            max_shard_size_bytes=self.max_shard_size_bytes,
+        )
+
+        # A flag to write a `manifest.json` along with the shards, default is True. See `atek.util.wds_manifest_utils`.
+        self.write_manifest = conf.write_manifest if "write_manifest" in conf else True
+
+        # Optional list of key globs, e.g. ["mfcd#camera-rgb+*", "gt_data*"], only the matching WDS keys are written.
+        # Default is None, which writes all keys.
+        self.keep_key_globs = (
+            list(conf.keep_key_globs)
+            if "keep_key_globs" in conf and conf.keep_key_globs is not None
+            else None
+        )
+
+        # Format to serialize tensors, default is "pth"
+        self.tensor_format = conf.tensor_format if "tensor_format" in conf else "pth"
+
+        # Per-camera image codecs, keyed by camera label, with an optional "default" entry. Default is jpeg with quality 100.
+        self.image_codecs = {}
+        if "image_codecs" in conf and conf.image_codecs is not None:
+            for camera_label, codec_conf in conf.image_codecs.items():
+                self.image_codecs[camera_label] = create_image_codec_config(codec_conf)
+
+        # Number of threads to encode samples ahead of the shard writer. 0 means encoding in the calling thread.
+        self.num_image_encode_workers = (
+            conf.num_image_encode_workers if "num_image_encode_workers" in conf else 0
+        )
+        self.encode_executor = None
+        self.pending_wds_dicts = deque()
+        if self.num_image_encode_workers > 0:
+            self.encode_executor = ThreadPoolExecutor(
+                max_workers=self.num_image_encode_workers
+            )
 
         # A flag to indicate to remove last tar file, if it is not full. Default is False.
         self.remove_last_tar_if_not_full = (
@@ -128,24 +345,25 @@ class AtekWdsWriter:
         Add a sample to the WDS writer.
         """
         atek_sample_dict = data_sample.to_flatten_dict()
-        wds_dict = convert_atek_sample_dict_to_wds_dict(
+        convert_fn = partial(
+            convert_atek_sample_dict_to_wds_dict,
             self.current_sample_idx,
             atek_sample_dict=atek_sample_dict,
             prefix_string=self.prefix_string,
+            tensor_format=self.tensor_format,
+            image_codecs=self.image_codecs,
+            keep_key_globs=self.keep_key_globs,
         )
+        self.current_sample_idx += 1
 
-        if self.sink is None:
-            if not os.path.exists(self.output_path):
-                os.makedirs(self.output_path)
+        if self.encode_executor is None:
+            self.shard_writer.write(convert_fn())
+            return
 
-            self.sink = wds.ShardWriter(
-                f"{self.output_path}/shards-%04d.tar",
-                maxcount=self.max_samples_per_shard,
-            )
-
-        self.sink.write(wds_dict)
-        self.current_sample_idx += 1
-        self.samples_in_current_shard += 1
+        # Encode in the background, while keeping the write order. Bound the number of in-flight samples to limit memory.
+        self.pending_wds_dicts.append(self.encode_executor.submit(convert_fn))
+        while len(self.pending_wds_dicts) > 2 * self.num_image_encode_workers:
+            self.shard_writer.write(self.pending_wds_dicts.popleft().result())
 
     def get_num_samples(self):
         return self.current_sample_idx
@@ -154,17 +372,13 @@ class AtekWdsWriter:
         """
         Close the WDS writer and flush any remaining data to disk.
         """
-        if self.sink is not None:
-            self.sink.close()
+        while len(self.pending_wds_dicts) > 0:
+            self.shard_writer.write(self.pending_wds_dicts.popleft().result())
+        if self.encode_executor is not None:
+            self.encode_executor.shutdown()
+            self.encode_executor = None
 
-        # Remove the last tar file if it has less than max_samples_per_shard samples
-        if self.remove_last_tar_if_not_full:
-            tar_files = [f for f in os.listdir(self.output_path) if f.endswith(".tar")]
-            if (
-                len(tar_files) > 0
-                and self.current_sample_idx % self.max_samples_per_shard != 0
-            ):
-                last_tar_file = os.path.join(self.output_path, tar_files[-1])
-                os.remove(last_tar_file)
-            else:
-                logger.warning("No tar files found in the output path.")
+        self.shard_writer.close(
+            remove_last_tar_if_not_full=self.remove_last_tar_if_not_full,
+            write_manifest=self.write_manifest,
+        )
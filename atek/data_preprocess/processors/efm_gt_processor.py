@@ -19,6 +19,7 @@ from typing import Dict, List, Optional
 import numpy as np
 import torch
 from atek.data_preprocess.processors.obb3_gt_processor import Obb3GtProcessor
+from atek.util.tensor_utils import compact_efm_gt_dict
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -28,6 +29,8 @@ class EfmGtProcessor(Obb3GtProcessor):
     """
     A Ground truth (GT) processor class for EFM (OBB3 only).
     Child class of `Obb3GtProcessor`, with one more API to return a nested GT dict to contain multi-frame OBB3 GT result.
+    If `compact_gt_layout` is set in conf, the multi-frame result can also be returned in a compact layout,
+    where each unique instance is stored only once per sample, see `get_compact_gt_by_timestamp_list_ns`.
     """
 
     def get_gt_by_timestamp_list_ns(self, timestamps_ns: List[int]) -> Optional[Dict]:
@@ -65,3 +68,16 @@ class EfmGtProcessor(Obb3GtProcessor):
             return None
         else:
             return all_dict
+
+    def get_compact_gt_by_timestamp_list_ns(
+        self, timestamps_ns: List[int]
+    ) -> Optional[Dict]:
+        """
+        Same as `get_gt_by_timestamp_list_ns`, but returns the result in the compact layout, where the unique instance table is stored once,
+        and each camera stores per-frame visible indices into this table. See `atek.util.tensor_utils.compact_efm_gt_dict` for the layout.
+        Use `atek.util.tensor_utils.expand_compact_efm_gt_dict` to convert it back to the nested layout.
+        """
+        all_dict = self.get_gt_by_timestamp_list_ns(timestamps_ns)
+        if all_dict is None:
+            return None
+        return compact_efm_gt_dict(all_dict)
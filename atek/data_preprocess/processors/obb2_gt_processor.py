@@ -127,63 +127,67 @@ class Obb2GtProcessor:
 
         return category_name, category_id
 
-    def _sample_points_on_bbox(
-        self, bbox2d_range: np.array, num_points_on_edge: int
+    def _sample_points_on_bboxes(
+        self, bbox2d_ranges: torch.Tensor, num_points_on_edge: int
     ) -> torch.Tensor:
         """
-        Samples points on the edges of a 2D bounding box.
+        Samples points on the edges of a batch of 2D bounding boxes.
         Args:
-            bbox2d_range (np.array): An array containing the bounding box coordinates [xmin, xmax, ymin, ymax].
+            bbox2d_ranges (torch.Tensor): A tensor of shape [num_boxes, 4] containing the bounding box coordinates [xmin, xmax, ymin, ymax].
             num_points_on_edge (int): The number of points to sample along each edge of the bounding box.
         Returns:
-            torch.Tensor: A tensor containing the sampled pixel coordinates.
+            torch.Tensor: A tensor of shape [num_boxes, 4 * (num_points_on_edge + 2), 2] containing the sampled pixel coordinates.
         """
-        # Create sampled pixel coordinates along each edge of the 2d bbox
-        xmin, xmax, ymin, ymax = bbox2d_range
-        x = torch.linspace(
-            xmin, xmax, num_points_on_edge + 2
-        )  # K+2 to include the corners
-        y = torch.linspace(
-            ymin, ymax, num_points_on_edge + 2
-        )  # K+2 to include the corners
-
-        # Create the points on the edges
-        top_edge = torch.stack((x, torch.full_like(x, ymin)), dim=1)
-        bottom_edge = torch.stack((x, torch.full_like(x, ymax)), dim=1)
-        left_edge = torch.stack((torch.full_like(y, xmin), y), dim=1)
-        right_edge = torch.stack((torch.full_like(y, xmax), y), dim=1)
+        xmin, xmax, ymin, ymax = bbox2d_ranges.unbind(dim=1)  # each is [num_boxes]
+
+        # Interpolation weights along each edge, K+2 to include the corners
+        # x, y are both of shape [num_boxes, K+2]
+        weights = torch.linspace(0.0, 1.0, num_points_on_edge + 2)
+        x = xmin[:, None] + (xmax - xmin)[:, None] * weights[None, :]
+        y = ymin[:, None] + (ymax - ymin)[:, None] * weights[None, :]
+
+        # Create the points on the edges, each is [num_boxes, K+2, 2]
+        top_edge = torch.stack((x, ymin[:, None].expand_as(x)), dim=2)
+        bottom_edge = torch.stack((x, ymax[:, None].expand_as(x)), dim=2)
+        left_edge = torch.stack((xmin[:, None].expand_as(y), y), dim=2)
+        right_edge = torch.stack((xmax[:, None].expand_as(y), y), dim=2)
 
         # Concatenate all the points
-        pixel_coords = torch.cat((top_edge, bottom_edge, left_edge, right_edge), dim=0)
+        pixel_coords = torch.cat((top_edge, bottom_edge, left_edge, right_edge), dim=1)
 
         return pixel_coords
 
     def _apply_transforms_to_bbox2d(
-        self, camera_label: str, bbox2d_range: np.array
+        self, camera_label: str, bbox2d_ranges: torch.Tensor
     ) -> torch.Tensor:
         """
-        Apply the same transforms in AriaCameraProcessors to 2D bounding boxes.
-        Returns a new 2dbbox that encloses the distorted box.
+        Apply the same transforms in AriaCameraProcessors to a batch of 2D bounding boxes of shape [num_boxes, 4].
+        Sampled edge points of all boxes are transformed in a single call.
+        Returns new 2d bboxes of shape [num_boxes, 4] that enclose the distorted boxes.
         """
-        src_sampled_points = self._sample_points_on_bbox(
-            bbox2d_range, self.conf.bbox2d_num_samples_on_edge
+        num_boxes = bbox2d_ranges.shape[0]
+        src_sampled_points = self._sample_points_on_bboxes(
+            bbox2d_ranges, self.conf.bbox2d_num_samples_on_edge
         )
+        num_samples_per_box = src_sampled_points.shape[1]
+
+        # [num_boxes, num_samples, 2] -> [num_boxes * num_samples, 2] -> transform -> back
         dst_sampled_points = self.camera_label_to_pixel_transforms[camera_label](
-            src_sampled_points
-        )
+            src_sampled_points.reshape(-1, 2)
+        ).reshape(num_boxes, num_samples_per_box, 2)
 
-        # Get the new 2d bbox range
+        # Get the new 2d bbox range, as per-box min / max over the sampled points
         dst_image_width, dst_image_height = self.camera_label_to_calibs[
             camera_label
         ].get_image_size()
-        xmin, ymin = torch.min(dst_sampled_points, dim=0).values
-        xmax, ymax = torch.max(dst_sampled_points, dim=0).values
-        xmin = torch.clamp(xmin, 0, dst_image_width - 1)
-        xmax = torch.clamp(xmax, 0, dst_image_width - 1)
-        ymin = torch.clamp(ymin, 0, dst_image_height - 1)
-        ymax = torch.clamp(ymax, 0, dst_image_height - 1)
+        mins = torch.amin(dst_sampled_points, dim=1)  # [num_boxes, 2]
+        maxs = torch.amax(dst_sampled_points, dim=1)  # [num_boxes, 2]
+        xmin = torch.clamp(mins[:, 0], 0, dst_image_width - 1)
+        xmax = torch.clamp(maxs[:, 0], 0, dst_image_width - 1)
+        ymin = torch.clamp(mins[:, 1], 0, dst_image_height - 1)
+        ymax = torch.clamp(maxs[:, 1], 0, dst_image_height - 1)
 
-        return torch.tensor([xmin, xmax, ymin, ymax], dtype=torch.float32)
+        return torch.stack((xmin, xmax, ymin, ymax), dim=1).to(torch.float32)
 
     def get_gt_by_timestamp_ns(self, timestamp_ns: int) -> Optional[Dict]:
         """
@@ -251,8 +255,9 @@ class Obb2GtProcessor:
                 )
                 continue
 
-            # pack 2d bbox data into the dict
+            # pack 2d bbox data into the dict, raw box ranges are collected and transformed in one batch
             i_row = 0
+            raw_box_ranges = np.empty((num_visible_instances, 4), dtype=np.float32)
             for instance_id, bbox2d_data in bbox2d_with_dt.data().items():
                 # fill in instance id and category information
                 cat_name, cat_id = self._obtain_obj_category_info(instance_id)
@@ -262,14 +267,16 @@ class Obb2GtProcessor:
                 bbox2d_dict[cam_label]["visibility_ratios"][
                     i_row
                 ] = bbox2d_data.visibility_ratio
-                bbox2d_dict[cam_label]["box_ranges"][i_row] = (
-                    self._apply_transforms_to_bbox2d(cam_label, bbox2d_data.box_range)
-                )
+                raw_box_ranges[i_row] = bbox2d_data.box_range
                 i_row += 1
             assert (
                 i_row == num_visible_instances
             ), f"camera {cam_label} filled number {i_row} != num of instances {num_visible_instances}, tensor contains initialized values, unsafe hence abort"
 
+            bbox2d_dict[cam_label]["box_ranges"] = self._apply_transforms_to_bbox2d(
+                cam_label, torch.from_numpy(raw_box_ranges)
+            )
+
         # At least one camera should have valid data, or will return None
         valid_data_flag = False
         for per_cam_dict in bbox2d_dict.values():
@@ -188,6 +188,15 @@ class EfmSampleBuilder:
                         f"Timestamps in {name} does not have full count of {num_timestamps}!"
                     )
                     return False
+            if name == "gt_data" and "efm_gt_compact" in data_field_value:
+                if (
+                    len(data_field_value["efm_gt_compact"]["timestamps_ns"])
+                    != num_timestamps
+                ):
+                    logger.warning(
+                        f"Timestamps in {name} does not have full count of {num_timestamps}!"
+                    )
+                    return False
 
         return True
 
@@ -295,13 +304,25 @@ class EfmSampleBuilder:
             # GT data
             # ========================================
             elif isinstance(processor, EfmGtProcessor):
-                maybe_gt_data = processor.get_gt_by_timestamp_list_ns(timestamps_ns)
+                # Compact layout stores unique instances once per sample, under a different key
+                compact_gt_layout = (
+                    processor.conf.compact_gt_layout
+                    if "compact_gt_layout" in processor.conf
+                    else False
+                )
+                if compact_gt_layout:
+                    maybe_gt_data = processor.get_compact_gt_by_timestamp_list_ns(
+                        timestamps_ns
+                    )
+                else:
+                    maybe_gt_data = processor.get_gt_by_timestamp_list_ns(timestamps_ns)
                 if maybe_gt_data is None:
                     logger.warning(
                         f"Querying GT data for {timestamps_ns} has returned None, skipping this sample."
                     )
                     return None
-                sample.gt_data["efm_gt"] = maybe_gt_data
+                gt_key = "efm_gt_compact" if compact_gt_layout else "efm_gt"
+                sample.gt_data[gt_key] = maybe_gt_data
 
             else:
                 raise ValueError(
@@ -0,0 +1,563 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import math
+import os
+import random
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from atek.data_preprocess.atek_data_sample import (
+    AtekDataSample,
+    MpsSemiDensePointData,
+    MpsTrajData,
+    MultiFrameCameraData,
+)
+from atek.data_preprocess.atek_wds_writer import AtekWdsWriter
+from atek.util.se3_utils import compose_se3, invert_se3, transform_points_se3
+from atek.util.wds_manifest_utils import get_sorted_shard_paths
+from omegaconf import OmegaConf
+from omegaconf.omegaconf import DictConfig
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Default cameras of synthetic samples, as in the CubeRCNN preprocessing config
+DEFAULT_SYNTHETIC_CAMERAS = [
+    {
+        "label": "camera-rgb",
+        "height": 512,
+        "width": 512,
+        "num_channels": 3,
+        "camera_model_name": "CameraModelType.LINEAR",
+    }
+]
+
+# Camera labels supported by synthetic samples, and their `AtekDataSample` fields
+SYNTHETIC_CAMERA_FIELDS = {
+    "camera-rgb": "camera_rgb",
+    "camera-slam-left": "camera_slam_left",
+    "camera-slam-right": "camera_slam_right",
+}
+
+# Corners of a unit box centered at the origin, in the order of `compute_bbox_corners_in_world`
+_UNIT_BOX_CORNERS = torch.tensor(
+    [
+        [-0.5, -0.5, -0.5],
+        [0.5, -0.5, -0.5],
+        [0.5, 0.5, -0.5],
+        [-0.5, 0.5, -0.5],
+        [-0.5, -0.5, 0.5],
+        [0.5, -0.5, 0.5],
+        [0.5, 0.5, 0.5],
+        [-0.5, 0.5, 0.5],
+    ]
+)
+
+
+def _get_rotation_around_y(angles: torch.Tensor) -> torch.Tensor:
+    cos, sin = torch.cos(angles), torch.sin(angles)
+    zeros, ones = torch.zeros_like(angles), torch.ones_like(angles)
+    return torch.stack(
+        [
+            torch.stack([cos, zeros, sin], dim=-1),
+            torch.stack([zeros, ones, zeros], dim=-1),
+            torch.stack([-sin, zeros, cos], dim=-1),
+        ],
+        dim=-2,
+    )
+
+
+class SyntheticAtekSampleGenerator:
+    """
+    Generates synthetic ATEK data samples with random but plausible content, to benchmark and test the WDS writer, loaders
+    and evaluation without Aria recordings. Each sample has:
+    - images of the configured cameras, with a smooth background and the 2D boxes of the objects drawn in,
+    - a device trajectory moving along the world x axis, all cameras looking along the world z axis,
+    - OBB3 / OBB2 GT of objects placed in the view frustum of the first camera, at depths in [min_depth, max_depth],
+    - optionally, semidense points in the view frustum, and a depth map of the first camera.
+    Samples are reproducible: the content of sample `index` only depends on `seed` and `index`.
+    """
+
+    def __init__(self, conf: Optional[DictConfig] = None) -> None:
+        conf = conf if conf is not None else OmegaConf.create({})
+        self.seed = conf.seed if "seed" in conf else 0
+        self.sequence_name = (
+            conf.sequence_name if "sequence_name" in conf else "synthetic"
+        )
+        self.num_frames = conf.num_frames if "num_frames" in conf else 1
+        self.frame_interval_ns = (
+            conf.frame_interval_ns if "frame_interval_ns" in conf else 100_000_000
+        )
+        self.cameras = (
+            [dict(camera) for camera in conf.cameras]
+            if "cameras" in conf
+            else DEFAULT_SYNTHETIC_CAMERAS
+        )
+        for camera in self.cameras:
+            assert (
+                camera["label"] in SYNTHETIC_CAMERA_FIELDS
+            ), f"Unsupported camera {camera['label']}, needs to be one of {list(SYNTHETIC_CAMERA_FIELDS.keys())}"
+        # Number of semidense points per frame, 0 to skip semidense points
+        self.num_semidense_points = (
+            conf.num_semidense_points if "num_semidense_points" in conf else 0
+        )
+        # Number of OBBs per sample, 0 to skip GT
+        self.num_obbs = conf.num_obbs if "num_obbs" in conf else 10
+        self.num_categories = conf.num_categories if "num_categories" in conf else 30
+        # Range of object depths, and of depth map values, in meters
+        self.min_depth = conf.min_depth if "min_depth" in conf else 0.5
+        self.max_depth = conf.max_depth if "max_depth" in conf else 5.0
+        # A flag to add a depth map of the first camera, as "camera-rgb-depth"
+        self.add_depth = conf.add_depth if "add_depth" in conf else False
+
+    def _get_rng(self, index: int, component: str) -> torch.Generator:
+        # One random stream per sample and component, so that e.g. the OBBs of a sample are the same with or without images
+        return torch.Generator().manual_seed(
+            random.Random(f"{self.seed}/{index}/{component}").getrandbits(63)
+        )
+
+    def _get_timestamps_ns(self, index: int) -> torch.Tensor:
+        return (
+            torch.arange(self.num_frames, dtype=torch.int64) + index * self.num_frames
+        ) * self.frame_interval_ns
+
+    def _get_Ts_world_device(self, index: int) -> torch.Tensor:
+        Ts_world_device = torch.eye(3, 4).repeat(self.num_frames, 1, 1)
+        Ts_world_device[:, 0, 3] = 0.05 * (
+            torch.arange(self.num_frames, dtype=torch.float32) + index * self.num_frames
+        )
+        return Ts_world_device
+
+    def _get_T_device_camera(self, i_camera: int) -> torch.Tensor:
+        # Cameras are 5cm apart along the device x axis
+        T_device_camera = torch.eye(3, 4)
+        T_device_camera[0, 3] = 0.05 * i_camera
+        return T_device_camera
+
+    @staticmethod
+    def _get_projection_params(camera: Dict) -> torch.Tensor:
+        focal = 0.5 * max(camera["height"], camera["width"])
+        cx, cy = camera["width"] / 2.0, camera["height"] / 2.0
+        if camera["camera_model_name"] == "CameraModelType.LINEAR":
+            return torch.tensor([focal, focal, cx, cy])
+        # Fisheye624 without distortion: [f, cx, cy, k0-k5, p0-p1, s0-s3]
+        return torch.tensor([focal, cx, cy] + [0.0] * 12)
+
+    def _get_pinhole_params(self, camera: Dict) -> Tuple[float, float, float, float]:
+        params = self._get_projection_params(camera).tolist()
+        if camera["camera_model_name"] == "CameraModelType.LINEAR":
+            return tuple(params)
+        return params[0], params[0], params[1], params[2]
+
+    def _project_to_camera(
+        self, points_in_camera: torch.Tensor, camera: Dict
+    ) -> torch.Tensor:
+        """
+        Pinhole projection of [..., 3] points, ignoring fisheye distortion.
+        """
+        fx, fy, cx, cy = self._get_pinhole_params(camera)
+        z = points_in_camera[..., 2].clamp(min=1e-3)
+        return torch.stack(
+            [
+                fx * points_in_camera[..., 0] / z + cx,
+                fy * points_in_camera[..., 1] / z + cy,
+            ],
+            dim=-1,
+        )
+
+    def _unproject_from_camera(
+        self, pixels: torch.Tensor, depths: torch.Tensor, camera: Dict
+    ) -> torch.Tensor:
+        fx, fy, cx, cy = self._get_pinhole_params(camera)
+        return torch.stack(
+            [
+                (pixels[..., 0] - cx) / fx * depths,
+                (pixels[..., 1] - cy) / fy * depths,
+                depths,
+            ],
+            dim=-1,
+        )
+
+    def _get_T_world_first_camera(self, index: int) -> torch.Tensor:
+        return compose_se3(
+            self._get_Ts_world_device(index)[0], self._get_T_device_camera(0)
+        )
+
+    def generate_obb3_gt(self, index: int) -> Dict:
+        """
+        Returns the OBB3 GT of sample `index` in the layout of `Obb3GtProcessor`, for the first camera.
+        """
+        rng = self._get_rng(index, "obb")
+        camera = self.cameras[0]
+        num_obbs = self.num_obbs
+
+        # Object centers are sampled in the view frustum of the first camera
+        pixels = torch.rand(num_obbs, 2, generator=rng) * torch.tensor(
+            [camera["width"], camera["height"]]
+        )
+        depths = self.min_depth + torch.rand(num_obbs, generator=rng) * (
+            self.max_depth - self.min_depth
+        )
+        Ts_camera_object = torch.cat(
+            [
+                _get_rotation_around_y(
+                    torch.rand(num_obbs, generator=rng) * 2 * math.pi
+                ),
+                self._unproject_from_camera(pixels, depths, camera).unsqueeze(-1),
+            ],
+            dim=-1,
+        )
+        # Object sizes grow with their depth, so that they span similar numbers of pixels
+        object_dimensions = (0.1 + 0.3 * torch.rand(num_obbs, 3, generator=rng)) * (
+            0.5 + depths.unsqueeze(-1) / self.max_depth
+        )
+        category_ids = torch.randint(
+            1, self.num_categories + 1, (num_obbs,), generator=rng
+        )
+        return {
+            camera["label"]: {
+                "instance_ids": torch.arange(num_obbs, dtype=torch.int64)
+                + index * num_obbs,
+                "category_names": [f"category_{i}" for i in category_ids.tolist()],
+                "category_ids": category_ids,
+                "object_dimensions": object_dimensions,
+                "ts_world_object": compose_se3(
+                    self._get_T_world_first_camera(index),
+                    Ts_camera_object,
+                ),
+            }
+        }
+
+    def _get_obb_corners_in_camera(
+        self, obb3_gt: Dict, T_world_camera: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        Returns the [num_obbs, 8, 3] corners of the OBBs in a camera frame.
+        """
+        Ts_camera_object = compose_se3(
+            invert_se3(T_world_camera), obb3_gt["ts_world_object"]
+        )
+        corners_in_object = _UNIT_BOX_CORNERS * obb3_gt["object_dimensions"].unsqueeze(
+            1
+        )
+        return transform_points_se3(Ts_camera_object, corners_in_object)
+
+    def _generate_obb2_gt(
+        self, obb3_gt: Dict, T_world_camera: torch.Tensor, camera: Dict
+    ) -> Dict:
+        """
+        Returns the OBB2 GT in the layout of `Obb2GtProcessor`, with boxes clipped to the image, and visibility ratios of
+        the clipped to the full box areas.
+        """
+        corners_2d = self._project_to_camera(
+            self._get_obb_corners_in_camera(obb3_gt, T_world_camera), camera
+        )
+        box_ranges = torch.stack(
+            [
+                corners_2d[:, :, 0].min(dim=1).values,
+                corners_2d[:, :, 0].max(dim=1).values,
+                corners_2d[:, :, 1].min(dim=1).values,
+                corners_2d[:, :, 1].max(dim=1).values,
+            ],
+            dim=1,
+        )
+        clipped_box_ranges = torch.stack(
+            [
+                box_ranges[:, 0].clamp(0, camera["width"]),
+                box_ranges[:, 1].clamp(0, camera["width"]),
+                box_ranges[:, 2].clamp(0, camera["height"]),
+                box_ranges[:, 3].clamp(0, camera["height"]),
+            ],
+            dim=1,
+        )
+        areas = (box_ranges[:, 1] - box_ranges[:, 0]) * (
+            box_ranges[:, 3] - box_ranges[:, 2]
+        )
+        clipped_areas = (clipped_box_ranges[:, 1] - clipped_box_ranges[:, 0]) * (
+            clipped_box_ranges[:, 3] - clipped_box_ranges[:, 2]
+        )
+        visible = clipped_areas > 0
+        return {
+            "instance_ids": obb3_gt["instance_ids"][visible],
+            "category_names": [
+                name
+                for name, is_visible in zip(obb3_gt["category_names"], visible.tolist())
+                if is_visible
+            ],
+            "category_ids": obb3_gt["category_ids"][visible],
+            "visibility_ratios": (clipped_areas / areas.clamp(min=1e-6))[visible],
+            "box_ranges": clipped_box_ranges[visible],
+        }
+
+    def _generate_images(
+        self,
+        rng: torch.Generator,
+        camera: Dict,
+        obb2_gt: Optional[Dict],
+    ) -> torch.Tensor:
+        """
+        Smooth random backgrounds with mild noise and the 2D boxes filled in, which compress like real images.
+        """
+        height, width = camera["height"], camera["width"]
+        num_channels = camera["num_channels"]
+        gradient = (
+            torch.linspace(0, 1, height).view(height, 1)
+            + torch.linspace(0, 1, width).view(1, width)
+        ) / 2
+        base_colors = torch.rand(self.num_frames, num_channels, 1, 1, generator=rng)
+        images = 40 + 160 * base_colors * gradient
+        if obb2_gt is not None:
+            box_colors = torch.rand(
+                len(obb2_gt["box_ranges"]), num_channels, generator=rng
+            )
+            for box_range, box_color in zip(
+                obb2_gt["box_ranges"].int().tolist(), box_colors
+            ):
+                x0, x1, y0, y1 = box_range
+                images[:, :, y0:y1, x0:x1] = 255 * box_color.view(1, -1, 1, 1)
+        images += 8 * torch.randn(images.shape, generator=rng)
+        return images.clamp(0, 255).to(torch.uint8)
+
+    def _generate_depth_maps(
+        self,
+        obb3_gt: Optional[Dict],
+        obb2_gt: Optional[Dict],
+        T_world_camera: torch.Tensor,
+    ) -> torch.Tensor:
+        """
+        Depth maps of the first camera, in meters, with the 2D boxes of objects at their center depths, farthest first.
+        """
+        camera = self.cameras[0]
+        depth_map = torch.full(
+            (1, camera["height"], camera["width"]), self.max_depth, dtype=torch.float32
+        )
+        if obb3_gt is not None and obb2_gt is not None:
+            center_depths = dict(
+                zip(
+                    obb3_gt["instance_ids"].tolist(),
+                    self._get_obb_corners_in_camera(obb3_gt, T_world_camera)[:, :, 2]
+                    .mean(dim=1)
+                    .tolist(),
+                )
+            )
+            boxes = sorted(
+                zip(
+                    obb2_gt["instance_ids"].tolist(),
+                    obb2_gt["box_ranges"].int().tolist(),
+                ),
+                key=lambda item: -center_depths[item[0]],
+            )
+            for instance_id, (x0, x1, y0, y1) in boxes:
+                depth_map[:, y0:y1, x0:x1] = center_depths[instance_id]
+        return depth_map.unsqueeze(0).repeat(self.num_frames, 1, 1, 1)
+
+    def _generate_semidense_points(
+        self, index: int, Ts_world_device: torch.Tensor
+    ) -> MpsSemiDensePointData:
+        rng = self._get_rng(index, "semidense")
+        camera = self.cameras[0]
+        T_device_camera = self._get_T_device_camera(0)
+        points_world = []
+        for T_world_device in Ts_world_device:
+            pixels = torch.rand(
+                self.num_semidense_points, 2, generator=rng
+            ) * torch.tensor([camera["width"], camera["height"]])
+            depths = self.min_depth + torch.rand(
+                self.num_semidense_points, generator=rng
+            ) * (self.max_depth - self.min_depth)
+            T_world_camera = compose_se3(T_world_device, T_device_camera)
+            points_in_camera = self._unproject_from_camera(pixels, depths, camera)
+            points_world.append(
+                points_in_camera @ T_world_camera[:, :3].T + T_world_camera[:, 3]
+            )
+        all_points = torch.cat(points_world, dim=0)
+        return MpsSemiDensePointData(
+            points_world=points_world,
+            points_dist_std=[
+                0.01 + 0.05 * torch.rand(len(points), generator=rng)
+                for points in points_world
+            ],
+            points_inv_dist_std=[
+                0.001 + 0.01 * torch.rand(len(points), generator=rng)
+                for points in points_world
+            ],
+            capture_timestamps_ns=self._get_timestamps_ns(index),
+            points_volumn_min=all_points.min(dim=0).values,
+            points_volumn_max=all_points.max(dim=0).values,
+        )
+
+    def generate_sample(self, index: int) -> AtekDataSample:
+        timestamps_ns = self._get_timestamps_ns(index)
+        Ts_world_device = self._get_Ts_world_device(index)
+        image_rng = self._get_rng(index, "image")
+
+        sample = AtekDataSample(
+            sequence_name=self.sequence_name,
+            mps_traj_data=MpsTrajData(
+                Ts_World_Device=Ts_world_device,
+                capture_timestamps_ns=timestamps_ns,
+                gravity_in_world=torch.tensor([0.0, 0.0, -9.81]),
+            ),
+        )
+        obb3_gt = self.generate_obb3_gt(index) if self.num_obbs > 0 else None
+        if obb3_gt is not None:
+            sample.gt_data["obb3_gt"] = obb3_gt
+            sample.gt_data["obb2_gt"] = {}
+
+        first_camera_obb2_gt = None
+        for i_camera, camera in enumerate(self.cameras):
+            T_device_camera = self._get_T_device_camera(i_camera)
+            obb2_gt = None
+            if obb3_gt is not None:
+                obb2_gt = self._generate_obb2_gt(
+                    obb3_gt[self.cameras[0]["label"]],
+                    compose_se3(Ts_world_device[0], T_device_camera),
+                    camera,
+                )
+                sample.gt_data["obb2_gt"][camera["label"]] = obb2_gt
+            if i_camera == 0:
+                first_camera_obb2_gt = obb2_gt
+
+            camera_data = MultiFrameCameraData(
+                images=self._generate_images(image_rng, camera, obb2_gt),
+                capture_timestamps_ns=timestamps_ns,
+                frame_ids=torch.arange(self.num_frames, dtype=torch.int64)
+                + index * self.num_frames,
+                exposure_durations_s=torch.full((self.num_frames,), 0.005),
+                gains=torch.full((self.num_frames,), 1.0),
+                camera_label=camera["label"],
+                T_Device_Camera=T_device_camera,
+                camera_model_name=camera["camera_model_name"],
+                projection_params=self._get_projection_params(camera),
+                camera_valid_radius=torch.tensor(
+                    [float(max(camera["height"], camera["width"]))]
+                ),
+            )
+            setattr(sample, SYNTHETIC_CAMERA_FIELDS[camera["label"]], camera_data)
+
+        if self.add_depth:
+            sample.camera_rgb_depth = MultiFrameCameraData(
+                images=self._generate_depth_maps(
+                    obb3_gt[self.cameras[0]["label"]] if obb3_gt is not None else None,
+                    first_camera_obb2_gt,
+                    self._get_T_world_first_camera(index),
+                ),
+                capture_timestamps_ns=timestamps_ns,
+                frame_ids=torch.arange(self.num_frames, dtype=torch.int64)
+                + index * self.num_frames,
+                camera_label="camera-rgb-depth",
+            )
+
+        if self.num_semidense_points > 0:
+            sample.mps_semidense_point_data = self._generate_semidense_points(
+                index, Ts_world_device
+            )
+        return sample
+
+    def write_wds_shards(
+        self,
+        output_path: str,
+        num_samples: int,
+        writer_conf: Optional[DictConfig] = None,
+    ) -> List[str]:
+        """
+        Write `num_samples` synthetic samples through `AtekWdsWriter` into shards under `output_path`, with the writer
+        config `writer_conf` (e.g. max_samples_per_shard, image_codecs), and return the shard paths.
+        """
+        writer_conf = OmegaConf.merge(
+            {"prefix_string": self.sequence_name},
+            writer_conf if writer_conf is not None else {},
+        )
+        wds_writer = AtekWdsWriter(output_path, writer_conf)
+        for index in range(num_samples):
+            wds_writer.add_sample(self.generate_sample(index))
+        wds_writer.close()
+        return get_sorted_shard_paths(output_path)
+
+    def write_obb3_csvs(
+        self,
+        output_folder: str,
+        num_samples: int,
+        translation_noise_std: float = 0.05,
+        dimension_noise_ratio: float = 0.05,
+        miss_ratio: float = 0.1,
+        num_false_positives: int = 1,
+    ) -> Tuple[str, str]:
+        """
+        Write the OBB3 GT of `num_samples` synthetic samples, and matching synthetic predictions, as OBB3 csv files for
+        evaluation, and return the (GT, prediction) csv paths. Predictions are the GT with translation and dimension noise,
+        with `miss_ratio` of the objects dropped, plus `num_false_positives` random objects per sample, and random scores.
+        """
+        from atek.evaluation.static_object_detection.obb3_csv_io import (
+            AtekObb3CsvWriter,
+        )
+
+        os.makedirs(output_folder, exist_ok=True)
+        gt_csv_path = os.path.join(output_folder, "gt_obbs.csv")
+        prediction_csv_path = os.path.join(output_folder, "prediction_obbs.csv")
+        gt_writer = AtekObb3CsvWriter(gt_csv_path)
+        prediction_writer = AtekObb3CsvWriter(prediction_csv_path)
+        for index in range(num_samples):
+            timestamp_ns = self._get_timestamps_ns(index)[0].item()
+            gt = self.generate_obb3_gt(index)[self.cameras[0]["label"]]
+            gt_writer.write_from_atek_dict(gt, timestamp_ns=timestamp_ns)
+
+            rng = self._get_rng(index, "prediction")
+            num_obbs = len(gt["category_ids"])
+            kept = torch.rand(num_obbs, generator=rng) >= miss_ratio
+            false_positives = self.generate_obb3_gt(-1 - index)[
+                self.cameras[0]["label"]
+            ]
+            ts_world_object = gt["ts_world_object"].clone()
+            ts_world_object[:, :, 3] += translation_noise_std * torch.randn(
+                num_obbs, 3, generator=rng
+            )
+            prediction = {
+                key: torch.cat(
+                    [gt_value[kept], false_positives[key][:num_false_positives]]
+                )
+                for key, gt_value in [
+                    ("instance_ids", gt["instance_ids"]),
+                    ("category_ids", gt["category_ids"]),
+                    (
+                        "object_dimensions",
+                        gt["object_dimensions"]
+                        * (
+                            1
+                            + dimension_noise_ratio
+                            * torch.randn(num_obbs, 3, generator=rng)
+                        ),
+                    ),
+                    ("ts_world_object", ts_world_object),
+                ]
+            }
+            prediction["category_names"] = [
+                name
+                for name, is_kept in zip(gt["category_names"], kept.tolist())
+                if is_kept
+            ] + false_positives["category_names"][:num_false_positives]
+            num_predictions = len(prediction["category_ids"])
+            if num_predictions == 0:
+                continue
+            prediction_writer.write_from_atek_dict(
+                prediction,
+                confidence_score=torch.rand(num_predictions, generator=rng),
+                timestamp_ns=timestamp_ns,
+            )
+        gt_writer.flush()
+        prediction_writer.flush()
+        return gt_csv_path, prediction_csv_path
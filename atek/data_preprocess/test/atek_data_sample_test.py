@@ -19,6 +19,7 @@ import torch
 
 from atek.data_preprocess.atek_data_sample import (
     AtekDataSample,
+    create_atek_data_sample_from_flatten_dict,
     MpsOnlineCalibData,
     MpsSemiDensePointData,
     MpsTrajData,
@@ -238,3 +239,49 @@ class AtekDataSampleTest(unittest.TestCase):
         # for testing only
         print(f"------ debug: data dict keys: {data_dict.keys()} ------")
         self.assertCountEqual(data_dict.keys(), expected_keys)
+
+    def test_flatten_round_trip_without_copy(self) -> None:
+        rgb_data = MultiFrameCameraData(
+            images=torch.randn(4, 3, 10, 10),
+            camera_label="camera-rgb",
+            T_Device_Camera=torch.randn(3, 4),
+        )
+        rgb_depth_data = MultiFrameCameraData(
+            images=torch.randn(4, 1, 10, 10),
+            camera_label="camera-rgb-depth",
+        )
+        semidense_data = MpsSemiDensePointData(
+            points_world=[torch.randn(5, 3), torch.randn(2, 3)],
+            capture_timestamps_ns=torch.tensor([1, 2]),
+        )
+        data = AtekDataSample(
+            sequence_name="test",
+            camera_rgb=rgb_data,
+            camera_rgb_depth=rgb_depth_data,
+            mps_semidense_point_data=semidense_data,
+            gt_data={"key_1": "value_1"},
+        )
+
+        # Flattening should only move references
+        data_dict = data.to_flatten_dict()
+        self.assertIs(data_dict["mfcd#camera-rgb+images"], rgb_data.images)
+        self.assertIs(
+            data_dict["mfcd#camera-rgb+t_device_camera"], rgb_data.T_Device_Camera
+        )
+        self.assertIs(data_dict["msdpd#points_world"], semidense_data.points_world)
+
+        # Reconstruction should also only move references
+        reconstructed = create_atek_data_sample_from_flatten_dict(data_dict)
+        self.assertIs(reconstructed.camera_rgb.images, rgb_data.images)
+        self.assertIs(
+            reconstructed.camera_rgb.T_Device_Camera, rgb_data.T_Device_Camera
+        )
+        self.assertIs(reconstructed.camera_rgb_depth.images, rgb_depth_data.images)
+        self.assertEqual(reconstructed.camera_rgb.camera_label, "camera-rgb")
+        self.assertIs(
+            reconstructed.mps_semidense_point_data.points_world,
+            semidense_data.points_world,
+        )
+        self.assertIsNone(reconstructed.camera_slam_left)
+        self.assertIsNone(reconstructed.mps_traj_data)
+        self.assertEqual(reconstructed.sequence_name, "test")
@@ -0,0 +1,176 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+import torch
+from atek.data_preprocess.atek_wds_resharder import (
+    compact_atek_wds_sequences,
+    find_sequence_tar_dict_in_folder,
+    iterate_raw_wds_samples,
+    reshard_atek_wds,
+    write_compacted_tar_yaml,
+)
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+from atek.util.file_io_utils import load_yaml_and_extract_tar_list
+from atek.util.wds_manifest_utils import get_sorted_shard_paths, load_wds_manifest
+
+
+def _create_atek_sample_dict(index: int):
+    return {
+        "mfcd#camera-rgb+images": torch.full((2, 3, 8, 8), index, dtype=torch.uint8),
+        "mfcd#camera-rgb+capture_timestamps_ns": torch.tensor([index, index + 1]),
+        "mfcd#camera-slam-left+images": torch.zeros((2, 1, 8, 8), dtype=torch.uint8),
+        "mtd#ts_world_device": torch.randn(2, 3, 4),
+        "sequence_name": f"sequence_{index}",
+        "gt_data": {"obb2_gt": {"camera-rgb": {"box_ranges": torch.randn(3, 4)}}},
+    }
+
+
+class AtekWdsResharderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.temp_dir_object = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.temp_dir_object.name, "input")
+        self.output_path = os.path.join(self.temp_dir_object.name, "output")
+
+        self.num_samples = 5
+        shard_writer = ManifestShardWriter(self.input_path, max_samples_per_shard=3)
+        self.input_wds_dicts = []
+        for i in range(self.num_samples):
+            wds_dict = convert_atek_sample_dict_to_wds_dict(
+                i, _create_atek_sample_dict(i), prefix_string="test"
+            )
+            shard_writer.write(wds_dict)
+            self.input_wds_dicts.append(wds_dict)
+        shard_writer.close()
+
+    def test_writer_key_projection(self) -> None:
+        wds_dict = convert_atek_sample_dict_to_wds_dict(
+            0,
+            _create_atek_sample_dict(0),
+            prefix_string="test",
+            keep_key_globs=["mfcd#camera-rgb+*", "gt_data*"],
+        )
+        self.assertEqual(
+            sorted(wds_dict.keys()),
+            [
+                "__key__",
+                "gt_data#obb2_gt+camera-rgb+box_ranges.pth",
+                "gt_data.json",
+                "mfcd#camera-rgb+capture_timestamps_ns.pth",
+                "mfcd#camera-rgb+images_0.jpeg",
+                "mfcd#camera-rgb+images_1.jpeg",
+            ],
+        )
+
+    def test_reshard_with_key_projection(self) -> None:
+        keep_key_globs = ["mfcd#camera-rgb+images_*", "sequence_name.*"]
+        output_shards = reshard_atek_wds(
+            input_urls=get_sorted_shard_paths(self.input_path),
+            output_path=self.output_path,
+            keep_key_globs=keep_key_globs,
+            max_samples_per_shard=2,
+        )
+        self.assertEqual(len(output_shards), 3)
+        self.assertEqual(output_shards, get_sorted_shard_paths(self.output_path))
+
+        manifest = load_wds_manifest(self.output_path)
+        self.assertEqual(manifest["num_samples"], self.num_samples)
+        self.assertEqual(
+            [shard_info["num_samples"] for shard_info in manifest["shards"]], [2, 2, 1]
+        )
+
+        # Kept members are byte-identical, and in the original order
+        for input_dict, output_sample in zip(
+            self.input_wds_dicts, iterate_raw_wds_samples(output_shards)
+        ):
+            self.assertEqual(
+                sorted(output_sample.keys()),
+                [
+                    "__key__",
+                    "mfcd#camera-rgb+images_0.jpeg",
+                    "mfcd#camera-rgb+images_1.jpeg",
+                    "sequence_name.txt",
+                ],
+            )
+            self.assertEqual(output_sample["__key__"], input_dict["__key__"])
+            self.assertEqual(
+                output_sample["mfcd#camera-rgb+images_0.jpeg"],
+                input_dict["mfcd#camera-rgb+images_0.jpeg"],
+            )
+            self.assertEqual(
+                output_sample["sequence_name.txt"].decode("utf-8"),
+                input_dict["sequence_name.txt"],
+            )
+
+    def test_compact_sequences(self) -> None:
+        # Create 3 sequence folders, each with a partial last shard
+        sequences_path = os.path.join(self.temp_dir_object.name, "sequences")
+        num_samples_per_sequence = [3, 1, 2]
+        for sequence_index, num_samples in enumerate(num_samples_per_sequence):
+            shard_writer = ManifestShardWriter(
+                os.path.join(sequences_path, f"seq_{sequence_index}"),
+                max_samples_per_shard=2,
+            )
+            for i in range(num_samples):
+                atek_sample_dict = _create_atek_sample_dict(i)
+                atek_sample_dict["sequence_name"] = f"seq_{sequence_index}"
+                shard_writer.write(
+                    convert_atek_sample_dict_to_wds_dict(
+                        i, atek_sample_dict, prefix_string=""
+                    )
+                )
+            shard_writer.close()
+
+        sequence_tar_dict = find_sequence_tar_dict_in_folder(sequences_path)
+        self.assertEqual(list(sequence_tar_dict.keys()), ["seq_0", "seq_1", "seq_2"])
+        self.assertEqual(len(sum(sequence_tar_dict.values(), [])), 4)
+
+        output_shards = compact_atek_wds_sequences(
+            sequence_tar_dict,
+            self.output_path,
+            max_samples_per_shard=4,
+            interleave_sequences=True,
+        )
+        self.assertEqual(
+            [
+                shard_info["num_samples"]
+                for shard_info in load_wds_manifest(self.output_path)["shards"]
+            ],
+            [4, 2],
+        )
+
+        yaml_path = os.path.join(self.output_path, "local_compacted_tars.yaml")
+        write_compacted_tar_yaml(output_shards, yaml_path)
+        self.assertEqual(load_yaml_and_extract_tar_list(yaml_path), output_shards)
+
+        # Samples are interleaved round-robin across sequences, with unique keys
+        samples = list(iterate_raw_wds_samples(output_shards))
+        self.assertEqual(
+            [sample["sequence_name.txt"].decode("utf-8") for sample in samples],
+            ["seq_0", "seq_1", "seq_2", "seq_0", "seq_2", "seq_0"],
+        )
+        self.assertEqual(
+            len({sample["__key__"] for sample in samples}),
+            sum(num_samples_per_sequence),
+        )
+
+    def tearDown(self):
+        self.temp_dir_object.cleanup()
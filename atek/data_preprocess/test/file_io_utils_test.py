@@ -97,3 +97,10 @@ class FileIoUtilsTest(unittest.IsolatedAsyncioTestCase):
         result_dict = merge_tensors_into_dict(dict_wo_tensors, tensor_dict)
 
         self.assertTrue(check_dicts_same_w_tensors(input_dict, result_dict))
+
+        # In-place merge fills the input dict without copying it
+        inplace_result_dict = merge_tensors_into_dict(
+            dict_wo_tensors, tensor_dict, inplace=True
+        )
+        self.assertIs(inplace_result_dict, dict_wo_tensors)
+        self.assertTrue(check_dicts_same_w_tensors(input_dict, inplace_result_dict))
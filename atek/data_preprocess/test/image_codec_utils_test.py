@@ -0,0 +1,70 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import torch
+from atek.util.image_codec_utils import (
+    atek_image_frame_handler,
+    create_image_codec_config,
+    decode_image_frames_in_wds_sample,
+    encode_image_frame,
+)
+
+
+class ImageCodecUtilsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+    def test_image_round_trip_keeps_channels(self) -> None:
+        for camera_label, num_channels in [("camera-slam-left", 1), ("camera-rgb", 3)]:
+            image = torch.randint(0, 255, (num_channels, 24, 32), dtype=torch.uint8)
+            for codec_format in ["jpeg", "png", "webp", "raw"]:
+                codec_config = create_image_codec_config(
+                    {"format": codec_format, "lossless": True}
+                )
+                decoded = atek_image_frame_handler(
+                    f"mfcd#{camera_label}+images_0.{codec_config.extension}",
+                    encode_image_frame(image, codec_config),
+                )
+                self.assertEqual(decoded.dtype, torch.uint8)
+                self.assertEqual(decoded.shape, image.shape)
+                if codec_format != "jpeg":
+                    self.assertTrue(torch.equal(decoded, image))
+
+    def test_non_image_keys_are_skipped(self) -> None:
+        self.assertIsNone(atek_image_frame_handler("gt_data.json", b"{}"))
+
+    def test_downscaled_decode(self) -> None:
+        image = torch.randint(0, 255, (1, 48, 66), dtype=torch.uint8)
+        for codec_format in ["jpeg", "png", "raw"]:
+            codec_config = create_image_codec_config({"format": codec_format})
+            for downscale_factor in [2, 4, 8]:
+                sample = decode_image_frames_in_wds_sample(
+                    {
+                        f"mfcd#camera-slam-left+images_0.{codec_config.extension}": encode_image_frame(
+                            image, codec_config
+                        )
+                    },
+                    downscale_factor=downscale_factor,
+                )
+                decoded = list(sample.values())[0]
+                self.assertEqual(
+                    decoded.shape,
+                    (
+                        1,
+                        -(-48 // downscale_factor),
+                        -(-66 // downscale_factor),
+                    ),
+                )
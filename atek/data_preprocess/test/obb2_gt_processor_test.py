@@ -104,3 +104,20 @@ class Obb2GtProcessorTest(unittest.TestCase):
             ),
         )
         # TODO: box_range cannot be easily checked due to rotation and distortion
+
+        # Batched bbox transform should match transforming each box on its own
+        raw_box_ranges = torch.tensor(
+            [[100.0, 300.0, 200.0, 400.0], [0.0, 50.0, 10.0, 1000.0]],
+            dtype=torch.float32,
+        )
+        batched_ranges = obb2_gt_processor._apply_transforms_to_bbox2d(
+            "camera-rgb", raw_box_ranges
+        )
+        self.assertEqual(batched_ranges.shape, torch.Size([2, 4]))
+        for i in range(raw_box_ranges.shape[0]):
+            single_range = obb2_gt_processor._apply_transforms_to_bbox2d(
+                "camera-rgb", raw_box_ranges[i : i + 1]
+            )
+            self.assertTrue(
+                torch.allclose(batched_ranges[i], single_range[0], atol=1e-4)
+            )
@@ -0,0 +1,149 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy as np
+import torch
+from atek.util.se3_utils import (
+    compose_se3,
+    invert_se3,
+    quat_to_rotation_matrix,
+    rotation_matrix_to_quat,
+    se3_from_quat_and_translation,
+    se3_to_quat_and_translation,
+    transform_points_se3,
+)
+from projectaria_tools.core.sophus import SE3
+
+
+def _random_sophus_poses(num_poses: int, rng: np.random.Generator):
+    poses = [SE3.exp(rng.normal(size=3), rng.normal(size=3)) for _ in range(num_poses)]
+    # Rotations by pi around each axis, where w = 0
+    poses += [
+        SE3.from_matrix3x4(
+            np.concatenate([np.diag(diag), rng.normal(size=(3, 1))], axis=1)
+        )
+        for diag in [[1, -1, -1], [-1, 1, -1], [-1, -1, 1]]
+    ]
+    return poses
+
+
+def _to_tensor(poses) -> torch.Tensor:
+    return torch.from_numpy(np.stack([pose.to_matrix3x4() for pose in poses]))
+
+
+class Se3UtilsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        rng = np.random.default_rng(42)
+        self.poses_a_b = _random_sophus_poses(20, rng)
+        self.poses_b_c = _random_sophus_poses(20, rng)
+        self.points_b = rng.normal(size=(5, 3))
+
+    def test_compose_and_invert(self) -> None:
+        Ts_a_b = _to_tensor(self.poses_a_b)
+        Ts_b_c = _to_tensor(self.poses_b_c)
+        self.assertTrue(
+            torch.allclose(
+                compose_se3(Ts_a_b, Ts_b_c),
+                _to_tensor([a @ b for a, b in zip(self.poses_a_b, self.poses_b_c)]),
+                atol=1e-10,
+            )
+        )
+        self.assertTrue(
+            torch.allclose(
+                invert_se3(Ts_a_b),
+                _to_tensor([pose.inverse() for pose in self.poses_a_b]),
+                atol=1e-10,
+            )
+        )
+        # Broadcast a single pose over a batch
+        self.assertTrue(
+            torch.allclose(
+                compose_se3(invert_se3(Ts_a_b[0]), Ts_a_b),
+                _to_tensor([self.poses_a_b[0].inverse() @ b for b in self.poses_a_b]),
+                atol=1e-10,
+            )
+        )
+
+    def test_transform_points(self) -> None:
+        points_a = transform_points_se3(
+            _to_tensor(self.poses_a_b), torch.from_numpy(self.points_b)
+        )
+        self.assertEqual(points_a.shape, (len(self.poses_a_b), 5, 3))
+        for pose, pose_points_a in zip(self.poses_a_b, points_a):
+            self.assertTrue(
+                np.allclose(
+                    pose_points_a.numpy(), (pose @ self.points_b.T).T, atol=1e-10
+                )
+            )
+
+    def test_quat_and_translation(self) -> None:
+        Ts = _to_tensor(self.poses_a_b)
+        quats_and_translations = se3_to_quat_and_translation(Ts)
+        expected = torch.from_numpy(
+            np.concatenate([pose.to_quat_and_translation() for pose in self.poses_a_b])
+        )
+        # q and -q are the same rotation
+        signs = torch.where(
+            (quats_and_translations[:, :4] * expected[:, :4]).sum(dim=-1) < 0, -1, 1
+        )
+        self.assertTrue(
+            torch.allclose(
+                quats_and_translations[:, :4] * signs[:, None],
+                expected[:, :4],
+                atol=1e-10,
+            )
+        )
+        self.assertTrue((quats_and_translations[:, 0] >= 0).all())
+        self.assertTrue(
+            torch.allclose(quats_and_translations[:, 4:], expected[:, 4:], atol=1e-10)
+        )
+
+        # Back to poses, also from non-normalized quaternions
+        self.assertTrue(
+            torch.allclose(
+                se3_from_quat_and_translation(
+                    quats_and_translations[:, :4] * 2.0, quats_and_translations[:, 4:]
+                ),
+                Ts,
+                atol=1e-10,
+            )
+        )
+        for pose, quat_and_translation in zip(self.poses_a_b, expected.numpy()):
+            self.assertTrue(
+                np.allclose(
+                    SE3.from_quat_and_translation(
+                        quat_and_translation[0],
+                        quat_and_translation[1:4],
+                        quat_and_translation[4:],
+                    ).to_matrix3x4(),
+                    se3_from_quat_and_translation(
+                        torch.from_numpy(quat_and_translation[:4]),
+                        torch.from_numpy(quat_and_translation[4:]),
+                    ).numpy(),
+                    atol=1e-10,
+                )
+            )
+
+    def test_rotation_round_trip_float32(self) -> None:
+        rotations = _to_tensor(self.poses_a_b)[..., :3].float()
+        self.assertTrue(
+            torch.allclose(
+                quat_to_rotation_matrix(rotation_matrix_to_quat(rotations)),
+                rotations,
+                atol=1e-5,
+            )
+        )
@@ -0,0 +1,131 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+import torch
+from atek.data_loaders.atek_wds_dataloader import load_atek_wds_dataset
+from atek.data_preprocess.synthetic_data_generator import SyntheticAtekSampleGenerator
+from atek.evaluation.static_object_detection.obb3_csv_io import AtekObb3CsvReader
+from atek.util.tensor_utils import check_dicts_same_w_tensors
+from omegaconf import OmegaConf
+
+
+class SyntheticDataGeneratorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.generator = SyntheticAtekSampleGenerator(
+            OmegaConf.create(
+                {
+                    "num_frames": 2,
+                    "cameras": [
+                        {
+                            "label": "camera-rgb",
+                            "height": 120,
+                            "width": 160,
+                            "num_channels": 3,
+                            "camera_model_name": "CameraModelType.LINEAR",
+                        },
+                        {
+                            "label": "camera-slam-left",
+                            "height": 96,
+                            "width": 128,
+                            "num_channels": 1,
+                            "camera_model_name": "CameraModelType.FISHEYE624",
+                        },
+                    ],
+                    "num_semidense_points": 50,
+                    "num_obbs": 6,
+                    "add_depth": True,
+                }
+            )
+        )
+
+    def test_generate_sample(self) -> None:
+        sample_dict = self.generator.generate_sample(3).to_flatten_dict()
+        self.assertEqual(sample_dict["mfcd#camera-rgb+images"].shape, (2, 3, 120, 160))
+        self.assertEqual(
+            sample_dict["mfcd#camera-slam-left+images"].shape, (2, 1, 96, 128)
+        )
+        self.assertEqual(
+            sample_dict["mfcd#camera-rgb-depth+images"].shape, (2, 1, 120, 160)
+        )
+        self.assertEqual(len(sample_dict["msdpd#points_world"]), 2)
+        self.assertEqual(sample_dict["msdpd#points_world"][0].shape, (50, 3))
+        self.assertEqual(
+            sample_dict["mtd#capture_timestamps_ns"].tolist(), [600000000, 700000000]
+        )
+
+        obb3_gt = sample_dict["gt_data"]["obb3_gt"]["camera-rgb"]
+        self.assertEqual(obb3_gt["ts_world_object"].shape, (6, 3, 4))
+        # Objects are in front of the camera, within the depth range
+        depths = obb3_gt["ts_world_object"][:, 2, 3]
+        self.assertTrue(((depths >= 0.5) & (depths <= 5.0)).all())
+        obb2_gt = sample_dict["gt_data"]["obb2_gt"]["camera-rgb"]
+        self.assertTrue((obb2_gt["box_ranges"][:, 1] <= 160).all())
+        self.assertTrue((obb2_gt["visibility_ratios"] <= 1.0).all())
+
+        # Samples are reproducible
+        other_sample_dict = self.generator.generate_sample(3).to_flatten_dict()
+        for key in ["msdpd#points_world", "msdpd#points_dist_std"]:
+            for tensor, other_tensor in zip(
+                sample_dict.pop(key), other_sample_dict.pop(key)
+            ):
+                self.assertTrue(torch.equal(tensor, other_tensor))
+        sample_dict.pop("msdpd#points_inv_dist_std")
+        other_sample_dict.pop("msdpd#points_inv_dist_std")
+        self.assertTrue(check_dicts_same_w_tensors(sample_dict, other_sample_dict))
+
+    def test_write_wds_shards(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            shard_paths = self.generator.write_wds_shards(
+                temp_dir,
+                num_samples=5,
+                writer_conf=OmegaConf.create({"max_samples_per_shard": 2}),
+            )
+            self.assertEqual(len(shard_paths), 3)
+            samples = list(load_atek_wds_dataset(shard_paths))
+            self.assertEqual(len(samples), 5)
+            self.assertEqual(
+                samples[4]["mfcd#camera-rgb+images"].shape, (2, 3, 120, 160)
+            )
+            self.assertEqual(samples[4]["sequence_name"], "synthetic")
+            self.assertTrue(
+                torch.allclose(
+                    samples[4]["gt_data"]["obb3_gt"]["camera-rgb"]["ts_world_object"],
+                    self.generator.generate_obb3_gt(4)["camera-rgb"]["ts_world_object"],
+                )
+            )
+
+    def test_write_obb3_csvs(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            gt_csv_path, prediction_csv_path = self.generator.write_obb3_csvs(
+                temp_dir, num_samples=4, miss_ratio=0.5, num_false_positives=2
+            )
+            gt_obbs = AtekObb3CsvReader(gt_csv_path).read_as_obb_dict()
+            prediction_obbs = AtekObb3CsvReader(prediction_csv_path).read_as_obb_dict()
+
+        self.assertEqual(len(gt_obbs), 4)
+        expected_gt = self.generator.generate_obb3_gt(1)["camera-rgb"]
+        gt = gt_obbs[200000000]
+        self.assertTrue(
+            torch.allclose(
+                gt["ts_world_object"], expected_gt["ts_world_object"], atol=1e-5
+            )
+        )
+        self.assertEqual(gt["category_names"], expected_gt["category_names"])
+        for prediction in prediction_obbs.values():
+            self.assertLessEqual(len(prediction["category_ids"]), 6 + 2)
+            self.assertGreaterEqual(len(prediction["category_ids"]), 2)
@@ -0,0 +1,72 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import warnings
+
+import torch
+from atek.util.tensor_codec_utils import (
+    decode_tensor_from_raw_bytes,
+    encode_tensor_to_raw_bytes,
+)
+
+
+class TensorCodecUtilsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+    def test_raw_tensor_round_trip(self) -> None:
+        input_tensors = [
+            torch.randn(3, 4, dtype=torch.float32),
+            torch.randn(2, 3, 4, dtype=torch.float64),
+            torch.tensor([6243788802362822, -1], dtype=torch.int64),
+            torch.randint(0, 255, (2, 1, 5, 7), dtype=torch.uint8),
+            torch.tensor([True, False, True]),
+            torch.tensor(3.5),  # scalar
+            torch.empty((0, 3), dtype=torch.float32),  # empty
+            torch.randn(4, 6).t(),  # non-contiguous
+        ]
+        for input_tensor in input_tensors:
+            decoded = decode_tensor_from_raw_bytes(
+                encode_tensor_to_raw_bytes(input_tensor)
+            )
+            self.assertEqual(decoded.dtype, input_tensor.dtype)
+            self.assertEqual(decoded.shape, input_tensor.shape)
+            self.assertTrue(torch.equal(decoded, input_tensor))
+
+    def test_decoded_tensor_is_writable(self) -> None:
+        input_tensor = torch.arange(12, dtype=torch.float32).reshape(3, 4)
+        buffer = encode_tensor_to_raw_bytes(input_tensor)
+        with warnings.catch_warnings():
+            # Decoding from immutable bytes must not warn about non-writable buffers
+            warnings.simplefilter("error")
+            decoded = decode_tensor_from_raw_bytes(buffer)
+        decoded.mul_(2.0)
+        self.assertTrue(torch.equal(decoded, input_tensor * 2.0))
+        # The encoded buffer is left unchanged
+        self.assertTrue(torch.equal(decode_tensor_from_raw_bytes(buffer), input_tensor))
+
+        # Writable buffers are decoded zero-copy
+        writable_buffer = bytearray(buffer)
+        decode_tensor_from_raw_bytes(writable_buffer).fill_(0.0)
+        self.assertTrue(
+            torch.equal(
+                decode_tensor_from_raw_bytes(writable_buffer),
+                torch.zeros_like(input_tensor),
+            )
+        )
+
+    def test_invalid_buffer(self) -> None:
+        with self.assertRaises(ValueError):
+            decode_tensor_from_raw_bytes(b"NOTATENSOR000000")
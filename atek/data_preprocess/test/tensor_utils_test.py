@@ -0,0 +1,96 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import torch
+from atek.util.tensor_utils import (
+    check_dicts_same_w_tensors,
+    compact_efm_gt_dict,
+    expand_compact_efm_gt_dict,
+)
+
+
+def _make_obb3_dict(instance_ids, poses):
+    num_instances = len(instance_ids)
+    return {
+        "instance_ids": torch.tensor(instance_ids, dtype=torch.int64),
+        "category_names": [f"cat_{i}" for i in instance_ids],
+        "category_ids": torch.tensor(instance_ids, dtype=torch.int64) % 7,
+        "object_dimensions": torch.ones((num_instances, 3), dtype=torch.float32),
+        "ts_world_object": poses,
+    }
+
+
+class CompactEfmGtTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+    def test_compact_efm_gt_round_trip(self) -> None:
+        static_poses = torch.randn(3, 3, 4)
+        moving_poses = torch.randn(2, 3, 4)
+        efm_gt = {
+            "100": {
+                "camera-rgb": _make_obb3_dict(
+                    [1, 2, 3], static_poses[[0, 1, 2]].clone()
+                ),
+                "camera-slam-left": {},
+            },
+            "200": {
+                # instance 1, 2 are static, instance 4 moves
+                "camera-rgb": _make_obb3_dict(
+                    [2, 1, 4],
+                    torch.stack([static_poses[1], static_poses[0], moving_poses[0]]),
+                ),
+                "camera-slam-left": _make_obb3_dict([3], static_poses[[2]].clone()),
+            },
+            "300": {
+                "camera-rgb": _make_obb3_dict([4], moving_poses[[1]].clone()),
+                "camera-slam-left": _make_obb3_dict([3], static_poses[[2]].clone()),
+            },
+        }
+
+        compact_gt = compact_efm_gt_dict(efm_gt)
+
+        # 3 static instances + 2 poses of the moving instance
+        self.assertEqual(compact_gt["instances"]["instance_ids"].shape, torch.Size([5]))
+        self.assertEqual(len(compact_gt["instances"]["category_names"]), 5)
+        self.assertTrue(
+            torch.equal(
+                compact_gt["visibility"]["camera-slam-left"]["num_instances_per_frame"],
+                torch.tensor([-1, 1, 1]),
+            )
+        )
+
+        expanded_gt = expand_compact_efm_gt_dict(compact_gt)
+        self.assertTrue(check_dicts_same_w_tensors(efm_gt, expanded_gt, atol=0))
+
+    def test_compact_efm_gt_round_trip_without_instances(self) -> None:
+        # Frames with zero instances, with and without other instances in the sample
+        empty_obb3_dict = _make_obb3_dict([], torch.zeros((0, 3, 4)))
+        for efm_gt in [
+            {"100": {"camera-rgb": empty_obb3_dict}},
+            {
+                "100": {"camera-rgb": empty_obb3_dict},
+                "200": {"camera-rgb": _make_obb3_dict([1], torch.randn(1, 3, 4))},
+            },
+        ]:
+            expanded_gt = expand_compact_efm_gt_dict(compact_efm_gt_dict(efm_gt))
+            self.assertTrue(check_dicts_same_w_tensors(efm_gt, expanded_gt, atol=0))
+            expanded_obb3_dict = expanded_gt["100"]["camera-rgb"]
+            for field_name, value in empty_obb3_dict.items():
+                if isinstance(value, torch.Tensor):
+                    self.assertEqual(expanded_obb3_dict[field_name].shape, value.shape)
+                    self.assertEqual(expanded_obb3_dict[field_name].dtype, value.dtype)
+            self.assertEqual(expanded_obb3_dict["category_names"], [])
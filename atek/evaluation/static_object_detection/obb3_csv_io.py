@@ -24,8 +24,11 @@ import numpy as np
 import pandas as pd
 import torch
 from atek.data_loaders.cubercnn_model_adaptor import CubeRCNNModelAdaptor
+from atek.util.se3_utils import (
+    se3_from_quat_and_translation,
+    se3_to_quat_and_translation,
+)
 from atek.util.tensor_utils import compute_bbox_corners_in_world
-from projectaria_tools.core.sophus import SE3
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -69,6 +72,10 @@ class AtekObb3CsvWriter:
             logger.warn(f"no obbs for timestamp {timestamp_ns}")
             return
 
+        # qw,qx,qy,qz,tx,ty,tz of all obbs, in float64 as written to csv
+        quats_and_translations = se3_to_quat_and_translation(
+            torch.as_tensor(atek_dict["ts_world_object"], dtype=torch.float64)
+        ).numpy()
         for i_obb in range(num_obbs):
             obb_category_name = atek_dict["category_names"][i_obb]
             obb_category_id = atek_dict["category_ids"][i_obb]
@@ -87,10 +94,7 @@ class AtekObb3CsvWriter:
             else:
                 obb_confidence = confidence_score[i_obb]
 
-            T_world_obj = SE3.from_matrix3x4(atek_dict["ts_world_object"][i_obb])
-            quat_and_translation = (
-                T_world_obj.to_quat_and_translation().squeeze()
-            )  # qw,qx,qy,qz,tx,ty,tz
+            quat_and_translation = quats_and_translations[i_obb]
             translation_xyz_str = ",".join(quat_and_translation[4:].astype(str))
             quat_wxyz_str = ",".join(quat_and_translation[:4].astype(str))
 
@@ -201,26 +205,25 @@ class AtekObb3CsvReader:
         'tx_world_object', 'ty_world_object', 'tz_world_object', 'qw_world_object', 'qx_world_object', 'qy_world_object', 'qz_world_object',
         into a tensor of shape (num_obbs, 3, 4)
         """
-        translations = data_frame[
-            ["tx_world_object", "ty_world_object", "tz_world_object"]
-        ].values  # (num_obbs, 3)
-        quats_wxyz = data_frame[
-            ["qw_world_object", "qx_world_object", "qy_world_object", "qz_world_object"]
-        ].values  # (num_obbs, 4)
-        num_obbs = quats_wxyz.shape[0]
-        T_world_object_list = []
-        for i_obb in range(num_obbs):
-            T_world_object = SE3.from_quat_and_translation(
-                quats_wxyz[i_obb, 0].item(),
-                quats_wxyz[i_obb, 1:],
-                translations[i_obb],
-            )
-            T_world_object_list.append(
-                torch.tensor(T_world_object.to_matrix3x4(), dtype=torch.float32)
-            )
-
-        Ts_world_object = torch.stack(T_world_object_list, dim=0)
-        return Ts_world_object
+        translations = torch.tensor(
+            data_frame[
+                ["tx_world_object", "ty_world_object", "tz_world_object"]
+            ].values,
+            dtype=torch.float64,
+        )  # (num_obbs, 3)
+        quats_wxyz = torch.tensor(
+            data_frame[
+                [
+                    "qw_world_object",
+                    "qx_world_object",
+                    "qy_world_object",
+                    "qz_world_object",
+                ]
+            ].values,
+            dtype=torch.float64,
+        )  # (num_obbs, 4)
+        Ts_world_object = se3_from_quat_and_translation(quats_wxyz, translations)
+        return Ts_world_object.to(torch.float32)
 
 
 class GroupAtekObb3CsvWriter:
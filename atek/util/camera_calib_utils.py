@@ -14,6 +14,7 @@
 
 from typing import List
 
+import numpy as np
 import torch
 from projectaria_tools.core.calibration import CameraCalibration
 
@@ -25,16 +26,15 @@ def undistort_pixel_coords(
 ) -> torch.Tensor:
     """
     A function to batch undistort pixel coords (tensor [N, 2]) from src_calib to dst_calib.
+    Input pixels are converted to numpy once, and results are written into a preallocated array,
+    so that no per-point tensors are created.
     """
-    new_pixel_list = []
-    for i in range(pixels.shape[0]):
-        unprojected_ray = src_calib.unproject_no_checks(pixels[i, :].numpy())
-        new_pixel_list.append(
-            torch.tensor(
-                dst_calib.project_no_checks(unprojected_ray), dtype=torch.float32
-            )
-        )
-    return torch.stack(new_pixel_list)
+    src_pixels = pixels.detach().cpu().numpy().astype(np.float64)
+    dst_pixels = np.empty((src_pixels.shape[0], 2), dtype=np.float32)
+    for i in range(src_pixels.shape[0]):
+        unprojected_ray = src_calib.unproject_no_checks(src_pixels[i])
+        dst_pixels[i] = dst_calib.project_no_checks(unprojected_ray)
+    return torch.from_numpy(dst_pixels)
 
 
 def rescale_pixel_coords(pixels: torch.Tensor, scale: float) -> torch.Tensor:
@@ -44,6 +44,24 @@ def rescale_pixel_coords(pixels: torch.Tensor, scale: float) -> torch.Tensor:
     return (pixels - 0.5) * scale + 0.5
 
 
+def rescale_projection_params(
+    projection_params: torch.Tensor, scale: float
+) -> torch.Tensor:
+    """
+    Rescale camera projection params (tensor [num_params]) for an image resized by a scale factor,
+    following `CameraCalibration.rescale`: focal lengths are scaled, and principal point as (c + 0.5) * scale - 0.5.
+    Distortion params are unchanged. FISHEYE624 with 15 params has a single focal length, [f, cx, cy, ...],
+    while all other Aria camera models start with [fx, fy, cx, cy, ...].
+    """
+    num_focals = 1 if projection_params.shape[-1] == 15 else 2
+    rescaled_params = projection_params.clone()
+    rescaled_params[..., :num_focals] *= scale
+    rescaled_params[..., num_focals : num_focals + 2] = (
+        projection_params[..., num_focals : num_focals + 2] + 0.5
+    ) * scale - 0.5
+    return rescaled_params
+
+
 def rotate_pixel_coords_cw90(
     pixels: torch.Tensor, image_dim_after_rot: List
 ) -> torch.Tensor:
@@ -101,11 +101,15 @@ def separate_tensors_from_dict(gt_dict: Dict) -> Tuple[Dict, Dict]:
     return (gt_dict_no_tensors, tensor_dict)
 
 
-def merge_tensors_into_dict(gt_dict_no_tensors: Dict, tensor_dict: Dict) -> Dict:
+def merge_tensors_into_dict(
+    gt_dict_no_tensors: Dict, tensor_dict: Dict, inplace: bool = False
+) -> Dict:
     """
     Essentially the reverse of `separate_tensors_from_dict`.
+    All tensors should be merged in one call, as the input dict is deep-copied once per call unless `inplace` is set,
+    in which case `gt_dict_no_tensors` is modified and returned.
     """
-    gt_dict = copy.deepcopy(gt_dict_no_tensors)
+    gt_dict = gt_dict_no_tensors if inplace else copy.deepcopy(gt_dict_no_tensors)
 
     for concat_keys, tensor_value in tensor_dict.items():
         keys_as_path = concat_keys.split("+")
@@ -114,27 +118,41 @@ def merge_tensors_into_dict(gt_dict_no_tensors: Dict, tensor_dict: Dict) -> Dict
     return gt_dict
 
 
-def load_yaml_and_extract_tar_list(yaml_path: str) -> List[str]:
+def load_yaml_and_extract_sequence_tar_dict(yaml_path: str) -> Dict[str, List[str]]:
     """
-    Load a YAML file and extract URLs or convert relative paths to absolute paths
-    from the specified number of sequences. If num_sequences is not specified or
-    is larger than the available sequences, all sequences will be processed.
-    Args:
-    yaml_path (str): The path to the YAML file.
-    num_sequences (Optional[int]): The number of sequences to extract data from. Defaults to None.
-    Returns:
-    List[str]: A list of URLs or absolute paths from the specified number of sequences.
+    Same as `load_yaml_and_extract_tar_list`, but keep the URLs or absolute paths grouped by sequence name.
     """
     with open(yaml_path, "r") as file:
         data = yaml.safe_load(file)
-    urls_or_paths = []
+    sequence_tar_dict = {}
     yaml_dir = os.path.dirname(yaml_path)
     sequences = data.get("tars", {})
     for sequence_name, sequence_paths_or_urls in sequences.items():
+        urls_or_paths = []
         for single_sequence_path_or_url in sequence_paths_or_urls:
             if urlparse(single_sequence_path_or_url).scheme in ["http", "https"]:
                 urls_or_paths.append(single_sequence_path_or_url)
             else:
                 absolute_path = os.path.join(yaml_dir, single_sequence_path_or_url)
                 urls_or_paths.append(absolute_path)
+        sequence_tar_dict[sequence_name] = urls_or_paths
+    return sequence_tar_dict
+
+
+def load_yaml_and_extract_tar_list(yaml_path: str) -> List[str]:
+    """
+    Load a YAML file and extract URLs or convert relative paths to absolute paths
+    from the specified number of sequences. If num_sequences is not specified or
+    is larger than the available sequences, all sequences will be processed.
+    Args:
+    yaml_path (str): The path to the YAML file.
+    num_sequences (Optional[int]): The number of sequences to extract data from. Defaults to None.
+    Returns:
+    List[str]: A list of URLs or absolute paths from the specified number of sequences.
+    """
+    urls_or_paths = []
+    for sequence_urls_or_paths in load_yaml_and_extract_sequence_tar_dict(
+        yaml_path
+    ).values():
+        urls_or_paths += sequence_urls_or_paths
     return urls_or_paths
@@ -0,0 +1,258 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from atek.util.tensor_codec_utils import (
+    decode_tensor_from_raw_bytes,
+    encode_tensor_to_raw_bytes,
+)
+from PIL import Image
+from torchvision.io import decode_jpeg, ImageReadMode
+
+# File extension of uncompressed uint8 images in ATEK WDS shards, stored as [C, H, W] raw tensors
+RAW_IMAGE_EXTENSION = "rawimage"
+
+# Map from codec format name to the file extension of the encoded image frame in WDS
+IMAGE_CODEC_FORMAT_TO_EXTENSION = {
+    "jpeg": "jpeg",
+    "png": "png",
+    "webp": "webp",
+    "raw": RAW_IMAGE_EXTENSION,
+}
+
+# All file extensions that hold a single image frame in ATEK WDS shards
+IMAGE_FRAME_EXTENSIONS = list(IMAGE_CODEC_FORMAT_TO_EXTENSION.values())
+
+# Backends to decode image frames. "torchvision" decodes all JPEG frames of a sample in one batched libjpeg-turbo call.
+SUPPORTED_IMAGE_DECODE_BACKENDS = ["pil", "torchvision"]
+
+# Supported downscale factors when decoding. JPEG frames are downscaled in the DCT domain (PIL draft mode),
+# which skips most of the decode work, other formats are area-downscaled after decoding.
+SUPPORTED_IMAGE_DOWNSCALE_FACTORS = [1, 2, 4, 8]
+
+
+@dataclass
+class ImageCodecConfig:
+    # One of {jpeg, png, webp, raw}
+    format: str = "jpeg"
+    # Quality for lossy formats (jpeg, webp). Default matches the previous webdataset image encoder.
+    quality: int = 100
+    # Only used by webp
+    lossless: bool = False
+
+    @property
+    def extension(self) -> str:
+        return IMAGE_CODEC_FORMAT_TO_EXTENSION[self.format]
+
+
+def create_image_codec_config(conf: Optional[Dict]) -> ImageCodecConfig:
+    """
+    Create an ImageCodecConfig from a (possibly partial) config dict, with default values for missing fields.
+    """
+    if conf is None:
+        return ImageCodecConfig()
+
+    codec_config = ImageCodecConfig(
+        format=conf["format"] if "format" in conf else "jpeg",
+        quality=conf["quality"] if "quality" in conf else 100,
+        lossless=conf["lossless"] if "lossless" in conf else False,
+    )
+    if codec_config.format not in IMAGE_CODEC_FORMAT_TO_EXTENSION:
+        raise ValueError(
+            f"Unsupported image codec format {codec_config.format}, needs to be one of {list(IMAGE_CODEC_FORMAT_TO_EXTENSION.keys())}"
+        )
+    return codec_config
+
+
+def encode_image_frame(image: torch.Tensor, codec_config: ImageCodecConfig) -> bytes:
+    """
+    Encode a single uint8 image frame of shape [C, H, W] (C = 1 or 3) into bytes, according to codec_config.
+    """
+    assert (
+        image.dtype == torch.uint8 and image.ndim == 3
+    ), f"Image frame needs to be a uint8 tensor of [C, H, W], got {image.dtype} {image.shape}"
+
+    if codec_config.format == "raw":
+        return encode_tensor_to_raw_bytes(image)
+
+    # PIL expects [H, W, C] for color images, and [H, W] for single-channel images
+    image_in_np = image.permute(1, 2, 0).contiguous().numpy()
+    if image_in_np.shape[-1] == 1:
+        image_in_np = image_in_np.squeeze(-1)
+    pil_image = Image.fromarray(image_in_np)
+
+    if codec_config.format == "jpeg":
+        save_kwargs = {"format": "JPEG", "quality": codec_config.quality}
+    elif codec_config.format == "png":
+        save_kwargs = {"format": "PNG"}
+    else:
+        save_kwargs = {
+            "format": "WEBP",
+            "quality": codec_config.quality,
+            "lossless": codec_config.lossless,
+        }
+
+    with io.BytesIO() as buffer:
+        pil_image.save(buffer, **save_kwargs)
+        return buffer.getvalue()
+
+
+def get_downscaled_image_size(height: int, width: int, downscale_factor: int):
+    """
+    Image size after downscaling, which matches the size of JPEG DCT-domain scaling.
+    """
+    return math.ceil(height / downscale_factor), math.ceil(width / downscale_factor)
+
+
+def _downscale_image_tensor(image: torch.Tensor, downscale_factor: int) -> torch.Tensor:
+    """
+    Area-downscale a uint8 image of [C, H, W].
+    """
+    target_size = get_downscaled_image_size(
+        image.shape[-2], image.shape[-1], downscale_factor
+    )
+    downscaled = F.interpolate(
+        image.unsqueeze(0).float(), size=target_size, mode="area"
+    ).squeeze(0)
+    return downscaled.round_().clamp_(0, 255).to(torch.uint8)
+
+
+def decode_image_frame(
+    data: bytes,
+    extension: str,
+    num_channels: Optional[int] = None,
+    downscale_factor: int = 1,
+) -> torch.Tensor:
+    """
+    Decode a single image frame encoded by `encode_image_frame` into a uint8 tensor of [C, H, W], keeping the stored
+    number of channels, i.e. grayscale images are decoded directly to [1, H, W], without replicating them to 3 channels.
+    `num_channels` optionally forces the output channels, for formats that can not store grayscale images, e.g. webp.
+    `downscale_factor` optionally downscales the image by 2, 4 or 8, in the DCT domain for JPEG.
+    """
+    if extension == RAW_IMAGE_EXTENSION:
+        image = decode_tensor_from_raw_bytes(data)
+        if downscale_factor > 1:
+            image = _downscale_image_tensor(image, downscale_factor)
+        return image
+
+    with io.BytesIO(data) as stream:
+        pil_image = Image.open(stream)
+        target_height, target_width = get_downscaled_image_size(
+            pil_image.height, pil_image.width, downscale_factor
+        )
+        if downscale_factor > 1 and pil_image.format == "JPEG":
+            # Draft mode configures the JPEG decoder to scale in the DCT domain, and to only decode luma for grayscale output
+            pil_image.draft(
+                "L" if num_channels == 1 else "RGB", (target_width, target_height)
+            )
+        pil_image.load()
+    if pil_image.size != (target_width, target_height):
+        pil_image = pil_image.resize((target_width, target_height), Image.BOX)
+
+    if num_channels == 1 and pil_image.mode != "L":
+        pil_image = pil_image.convert("L")
+    elif pil_image.mode not in ["L", "RGB"] or (
+        num_channels == 3 and pil_image.mode != "RGB"
+    ):
+        pil_image = pil_image.convert("RGB")
+
+    image = torch.from_numpy(np.array(pil_image))
+    if image.ndim == 2:
+        return image.unsqueeze(0)
+    return image.permute(2, 0, 1)
+
+
+def _get_image_frame_extension(key: str) -> str:
+    return key.rsplit(".", 1)[-1].lower()
+
+
+def _get_image_frame_num_channels(key: str) -> int:
+    # Key is `mfcd#{camera_label}+images_{frame_index}.{extension}`, only rgb camera has 3 channels
+    return 3 if "rgb" in key.rsplit("_", 1)[0] else 1
+
+
+def atek_image_frame_handler(key: str, data: bytes) -> Optional[torch.Tensor]:
+    """
+    A webdataset decoder handler for ATEK image frames, to be used as `wds.WebDataset(...).decode(atek_image_frame_handler)`.
+    Non-rgb cameras (SLAM, ET, etc.) are decoded to [1, H, W], rgb camera to [3, H, W].
+    Returns None for non-image keys, so they are left to other handlers.
+    """
+    extension = _get_image_frame_extension(key)
+    if extension not in IMAGE_FRAME_EXTENSIONS:
+        return None
+    return decode_image_frame(
+        data, extension, num_channels=_get_image_frame_num_channels(key)
+    )
+
+
+def decode_image_frames_in_wds_sample(
+    sample: Dict, backend: str = "pil", downscale_factor: int = 1
+) -> Dict:
+    """
+    Decode all image frames of a raw WDS sample in place, leaving other entries as bytes.
+    With the "torchvision" backend, all JPEG frames of the sample are decoded in one batched call per channel count.
+    DCT-domain downscaling is only available through PIL, so JPEG frames fall back to PIL when downscale_factor > 1.
+    """
+    if backend not in SUPPORTED_IMAGE_DECODE_BACKENDS:
+        raise ValueError(
+            f"Unsupported image decode backend {backend}, needs to be one of {SUPPORTED_IMAGE_DECODE_BACKENDS}"
+        )
+    if downscale_factor not in SUPPORTED_IMAGE_DOWNSCALE_FACTORS:
+        raise ValueError(
+            f"Unsupported image downscale factor {downscale_factor}, needs to be one of {SUPPORTED_IMAGE_DOWNSCALE_FACTORS}"
+        )
+
+    frame_keys = [
+        k
+        for k, v in sample.items()
+        if isinstance(v, bytes)
+        and _get_image_frame_extension(k) in IMAGE_FRAME_EXTENSIONS
+    ]
+
+    if backend == "torchvision" and downscale_factor == 1:
+        for num_channels, read_mode in [
+            (1, ImageReadMode.GRAY),
+            (3, ImageReadMode.RGB),
+        ]:
+            jpeg_keys = [
+                k
+                for k in frame_keys
+                if _get_image_frame_extension(k) == "jpeg"
+                and _get_image_frame_num_channels(k) == num_channels
+            ]
+            if len(jpeg_keys) == 0:
+                continue
+            encoded_frames = [
+                torch.frombuffer(bytearray(sample[k]), dtype=torch.uint8)
+                for k in jpeg_keys
+            ]
+            for k, image in zip(jpeg_keys, decode_jpeg(encoded_frames, mode=read_mode)):
+                sample[k] = image
+        frame_keys = [k for k in frame_keys if isinstance(sample[k], bytes)]
+
+    for k in frame_keys:
+        sample[k] = decode_image_frame(
+            sample[k],
+            _get_image_frame_extension(k),
+            num_channels=_get_image_frame_num_channels(k),
+            downscale_factor=downscale_factor,
+        )
+    return sample
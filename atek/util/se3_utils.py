@@ -0,0 +1,179 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import torch
+
+# Batched SE3 and quaternion operations in torch, on poses stored as [..., 3, 4] tensors [R | t], the same layout as
+# `SE3.to_matrix3x4()` of `projectaria_tools.core.sophus`, and quaternions as [..., 4] tensors in (w, x, y, z) order.
+# All leading dims are broadcast, so a whole set of poses is transformed in a single op, without going through numpy.
+
+
+def se3_from_rotation_and_translation(
+    rotations: torch.Tensor, translations: torch.Tensor
+) -> torch.Tensor:
+    """
+    Pack rotation matrices [..., 3, 3] and translations [..., 3] into poses [..., 3, 4].
+    """
+    batch_shape = torch.broadcast_shapes(rotations.shape[:-2], translations.shape[:-1])
+    return torch.cat(
+        [
+            rotations.expand(*batch_shape, 3, 3),
+            translations.expand(*batch_shape, 3).unsqueeze(-1),
+        ],
+        dim=-1,
+    )
+
+
+def compose_se3(T_a_b: torch.Tensor, T_b_c: torch.Tensor) -> torch.Tensor:
+    """
+    Compose poses [..., 3, 4], T_a_c = T_a_b @ T_b_c.
+    """
+    R_a_b = T_a_b[..., :3]
+    return se3_from_rotation_and_translation(
+        R_a_b @ T_b_c[..., :3],
+        (R_a_b @ T_b_c[..., 3:]).squeeze(-1) + T_a_b[..., 3],
+    )
+
+
+def invert_se3(T_a_b: torch.Tensor) -> torch.Tensor:
+    """
+    Invert poses [..., 3, 4], T_b_a = T_a_b^-1.
+    """
+    R_b_a = T_a_b[..., :3].transpose(-1, -2)
+    return se3_from_rotation_and_translation(
+        R_b_a, -(R_b_a @ T_a_b[..., 3:]).squeeze(-1)
+    )
+
+
+def transform_points_se3(T_a_b: torch.Tensor, points_b: torch.Tensor) -> torch.Tensor:
+    """
+    Transform points [..., N, 3] from frame b to frame a with poses [..., 3, 4].
+    """
+    return points_b @ T_a_b[..., :3].transpose(-1, -2) + T_a_b[..., None, :, 3]
+
+
+def quat_to_rotation_matrix(quats_wxyz: torch.Tensor) -> torch.Tensor:
+    """
+    Convert quaternions [..., 4] in (w, x, y, z) order to rotation matrices [..., 3, 3]. Quaternions are normalized
+    first, same as sophus.
+    """
+    w, x, y, z = torch.unbind(
+        quats_wxyz / torch.linalg.norm(quats_wxyz, dim=-1, keepdim=True), dim=-1
+    )
+    return torch.stack(
+        [
+            torch.stack(
+                [1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+                dim=-1,
+            ),
+            torch.stack(
+                [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+                dim=-1,
+            ),
+            torch.stack(
+                [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)],
+                dim=-1,
+            ),
+        ],
+        dim=-2,
+    )
+
+
+def rotation_matrix_to_quat(rotations: torch.Tensor) -> torch.Tensor:
+    """
+    Convert rotation matrices [..., 3, 3] to unit quaternions [..., 4] in (w, x, y, z) order, with w >= 0.
+    Each quaternion is computed from the largest of |w|, |x|, |y|, |z| (Shepperd's method), which is numerically stable
+    for all rotations. Sophus may return the opposite sign, which is the same rotation.
+    """
+    m = rotations
+    m00, m11, m22 = m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]
+    # 4 * w^2, 4 * x^2, 4 * y^2, 4 * z^2
+    four_squares = torch.stack(
+        [
+            1 + m00 + m11 + m22,
+            1 + m00 - m11 - m22,
+            1 - m00 + m11 - m22,
+            1 - m00 - m11 + m22,
+        ],
+        dim=-1,
+    )
+    # Candidate quaternions multiplied by 4 * w, 4 * x, 4 * y, 4 * z respectively
+    scaled_candidates = torch.stack(
+        [
+            torch.stack(
+                [
+                    four_squares[..., 0],
+                    m[..., 2, 1] - m[..., 1, 2],
+                    m[..., 0, 2] - m[..., 2, 0],
+                    m[..., 1, 0] - m[..., 0, 1],
+                ],
+                dim=-1,
+            ),
+            torch.stack(
+                [
+                    m[..., 2, 1] - m[..., 1, 2],
+                    four_squares[..., 1],
+                    m[..., 1, 0] + m[..., 0, 1],
+                    m[..., 0, 2] + m[..., 2, 0],
+                ],
+                dim=-1,
+            ),
+            torch.stack(
+                [
+                    m[..., 0, 2] - m[..., 2, 0],
+                    m[..., 1, 0] + m[..., 0, 1],
+                    four_squares[..., 2],
+                    m[..., 2, 1] + m[..., 1, 2],
+                ],
+                dim=-1,
+            ),
+            torch.stack(
+                [
+                    m[..., 1, 0] - m[..., 0, 1],
+                    m[..., 0, 2] + m[..., 2, 0],
+                    m[..., 2, 1] + m[..., 1, 2],
+                    four_squares[..., 3],
+                ],
+                dim=-1,
+            ),
+        ],
+        dim=-2,
+    )
+    best_index = four_squares.argmax(dim=-1, keepdim=True)
+    quats = torch.gather(
+        scaled_candidates,
+        -2,
+        best_index.unsqueeze(-1).expand(*best_index.shape, 4),
+    ).squeeze(-2)
+    quats = quats / torch.linalg.norm(quats, dim=-1, keepdim=True)
+    return torch.where(quats[..., :1] < 0, -quats, quats)
+
+
+def se3_from_quat_and_translation(
+    quats_wxyz: torch.Tensor, translations: torch.Tensor
+) -> torch.Tensor:
+    """
+    Create poses [..., 3, 4] from quaternions [..., 4] in (w, x, y, z) order and translations [..., 3].
+    """
+    return se3_from_rotation_and_translation(
+        quat_to_rotation_matrix(quats_wxyz), translations
+    )
+
+
+def se3_to_quat_and_translation(Ts: torch.Tensor) -> torch.Tensor:
+    """
+    Convert poses [..., 3, 4] to [..., 7] tensors of quaternion (w, x, y, z) and translation (x, y, z), the same
+    layout as `SE3.to_quat_and_translation()`.
+    """
+    return torch.cat([rotation_matrix_to_quat(Ts[..., :3]), Ts[..., 3]], dim=-1)
@@ -0,0 +1,97 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import struct
+import sys
+
+import torch
+
+# File extension of raw tensors in ATEK WDS shards
+RAW_TENSOR_EXTENSION = "rawtensor"
+
+# Raw tensor layout (little-endian):
+#   [magic: 4 bytes]["version": uint8]["dtype code": uint8]["ndim": uint16]["shape": ndim * int64][raw data bytes]
+# The header size is always a multiple of 8 bytes, so the data is 8-byte aligned relative to the start of the buffer.
+_RAW_TENSOR_MAGIC = b"ATKT"
+_RAW_TENSOR_VERSION = 1
+_RAW_TENSOR_HEADER_FORMAT = "<4sBBH"
+_RAW_TENSOR_HEADER_SIZE = struct.calcsize(_RAW_TENSOR_HEADER_FORMAT)
+
+# dtype codes are part of the on-disk format, only append to this table!
+_DTYPE_TO_CODE = {
+    torch.bool: 0,
+    torch.uint8: 1,
+    torch.int8: 2,
+    torch.int16: 3,
+    torch.int32: 4,
+    torch.int64: 5,
+    torch.float16: 6,
+    torch.bfloat16: 7,
+    torch.float32: 8,
+    torch.float64: 9,
+}
+_CODE_TO_DTYPE = {code: dtype for dtype, code in _DTYPE_TO_CODE.items()}
+
+assert sys.byteorder == "little", "Raw tensor codec only supports little-endian hosts"
+
+
+def encode_tensor_to_raw_bytes(tensor: torch.Tensor) -> bytes:
+    """
+    Serialize a tensor into a header + raw bytes buffer, without pickling.
+    """
+    if tensor.dtype not in _DTYPE_TO_CODE:
+        raise ValueError(f"Unsupported tensor dtype {tensor.dtype} in raw tensor codec")
+
+    shape = tuple(tensor.shape)
+    header = struct.pack(
+        _RAW_TENSOR_HEADER_FORMAT,
+        _RAW_TENSOR_MAGIC,
+        _RAW_TENSOR_VERSION,
+        _DTYPE_TO_CODE[tensor.dtype],
+        len(shape),
+    ) + struct.pack(f"<{len(shape)}q", *shape)
+
+    data = tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8)
+    return header + data.numpy().tobytes()
+
+
+def decode_tensor_from_raw_bytes(buffer: bytes) -> torch.Tensor:
+    """
+    Deserialize a tensor from the buffer created by `encode_tensor_to_raw_bytes`.
+    Writable buffers (e.g. `bytearray`) are decoded zero-copy, the returned tensor shares memory with them. Immutable
+    `bytes` (e.g. tar members) are copied once, so that the returned tensor can be modified in place.
+    """
+    magic, version, dtype_code, ndim = struct.unpack_from(
+        _RAW_TENSOR_HEADER_FORMAT, buffer, 0
+    )
+    if magic != _RAW_TENSOR_MAGIC or version != _RAW_TENSOR_VERSION:
+        raise ValueError(
+            f"Not a valid ATEK raw tensor buffer, magic: {magic}, version: {version}"
+        )
+    dtype = _CODE_TO_DTYPE[dtype_code]
+    shape = struct.unpack_from(f"<{ndim}q", buffer, _RAW_TENSOR_HEADER_SIZE)
+    data_offset = _RAW_TENSOR_HEADER_SIZE + 8 * ndim
+
+    num_elements = 1
+    for dim_size in shape:
+        num_elements *= dim_size
+    # torch.frombuffer does not accept empty buffers
+    if num_elements == 0:
+        return torch.empty(shape, dtype=dtype)
+
+    if isinstance(buffer, bytes):
+        buffer = bytearray(buffer)
+    return torch.frombuffer(
+        buffer, dtype=dtype, count=num_elements, offset=data_offset
+    ).reshape(shape)
@@ -14,10 +14,23 @@
 
 from typing import Dict, List, Optional, Tuple
 
-import numpy as np
-
 import torch
-from projectaria_tools.core.sophus import SE3
+from atek.util.se3_utils import transform_points_se3
+
+# Corner signs of a box centered at the origin, in the order of `compute_bbox_corners_in_world`
+_UNIT_BOX_CORNER_SIGNS = torch.tensor(
+    [
+        [-1, -1, -1],
+        [1, -1, -1],
+        [1, 1, -1],
+        [-1, 1, -1],
+        [-1, -1, 1],
+        [1, -1, 1],
+        [1, 1, 1],
+        [-1, 1, 1],
+    ],
+    dtype=torch.float32,
+)
 
 
 def fill_or_trim_tensor(tensor: torch.Tensor, dim_size: int, dim: int, fill_value=None):
@@ -129,41 +142,19 @@ def compute_bbox_corners_in_world(
     object_dimensions: torch.Tensor, Ts_world_object: torch.Tensor
 ) -> torch.Tensor:
     """
-    Compute the 8 corners of the bounding box in world coordinates from object dimensions and T_world_object
+    Compute the 8 corners of the bounding box in world coordinates from object dimensions and T_world_object,
+    for all boxes in a single batched op.
     """
-    num_obbs = object_dimensions.shape[0]
-
-    corners_in_world_list = []
-    # TODO: consider make this batched operation
-    for i in range(num_obbs):
-        # Extract object dimensions as a [8, 3] np array
-        half_extents = object_dimensions[i] / 2.0
-        hX = half_extents[0]
-        hY = half_extents[1]
-        hZ = half_extents[2]
-
-        corners_in_object = np.array(
-            [
-                [-hX, -hY, -hZ],
-                [hX, -hY, -hZ],
-                [hX, hY, -hZ],
-                [-hX, hY, -hZ],
-                [-hX, -hY, hZ],
-                [hX, -hY, hZ],
-                [hX, hY, hZ],
-                [-hX, hY, hZ],
-            ],
-            dtype=np.float32,
-        )  # (8, 3)
-
-        T_world_object = SE3.from_matrix3x4(Ts_world_object[i].numpy())
-
-        corners_in_world = T_world_object @ (corners_in_object.T)
-        corners_in_world_list.append(
-            torch.tensor(corners_in_world.T, dtype=torch.float32)
-        )  # (8, 3)
-
-    return torch.stack(corners_in_world_list, dim=0)  # (num_obbs, 8, 3)
+    # [num_obbs, 8, 3]
+    corners_in_object = (
+        _UNIT_BOX_CORNER_SIGNS.to(object_dimensions.dtype)
+        * object_dimensions[:, None, :]
+        / 2.0
+    )
+    corners_in_world = transform_points_se3(
+        Ts_world_object, corners_in_object.to(Ts_world_object.dtype)
+    )
+    return corners_in_world.to(torch.float32)  # (num_obbs, 8, 3)
 
 
 def filter_obbs_by_confidence(
@@ -210,3 +201,143 @@ def filter_obbs_by_confidence_all_cams(
         )
 
     return result_dict
+
+
+# Per-instance fields in EFM GT dict, see `EfmGtProcessor.get_gt_by_timestamp_list_ns`
+EFM_GT_INSTANCE_TENSOR_FIELDS = [
+    "instance_ids",
+    "category_ids",
+    "object_dimensions",
+    "ts_world_object",
+]
+
+
+def compact_efm_gt_dict(efm_gt_dict: Dict) -> Dict:
+    """
+    Convert a multi-frame EFM GT dict (legacy layout of {timestamp: {camera_label: obb3_dict}}) into a compact layout,
+    where each unique (instance, dimension, pose) row is only stored once per sample, and each camera stores
+    the per-frame indices into this instance table. Static objects therefore only occupy one row regardless of the number of frames.
+    The returned dict has the following structure:
+        {
+            "timestamps_ns": torch.Tensor (shape: [num_frames], int64),
+            "instances": {
+                "instance_ids": torch.Tensor (shape: [num_unique], int64)
+                "category_names": list[str],
+                "category_ids": torch.Tensor (shape: [num_unique], int64)
+                "object_dimensions": torch.Tensor (shape: [num_unique, 3], float32)
+                "ts_world_object": torch.Tensor (shape: [num_unique, 3, 4], float32)
+            },
+            "visibility": {
+                "camera_label_1": {
+                    "instance_indices": torch.Tensor (shape: [total_num_visible], int64), stacked row indices into "instances" over all frames
+                    "num_instances_per_frame": torch.Tensor (shape: [num_frames], int64), -1 means no valid GT for this camera at this frame
+                },
+                ...
+            }
+        }
+    """
+    timestamps = list(efm_gt_dict.keys())
+    camera_labels = []
+    for per_timestamp_dict in efm_gt_dict.values():
+        for camera_label in per_timestamp_dict.keys():
+            if camera_label not in camera_labels:
+                camera_labels.append(camera_label)
+
+    # Deduplicate rows across all frames and cameras, keyed by exact instance id + dimension + pose values
+    row_key_to_index = {}
+    unique_rows = {field_name: [] for field_name in EFM_GT_INSTANCE_TENSOR_FIELDS}
+    # Empty slices of the source fields, to keep their dtype and trailing shape if no frame has any instance
+    empty_rows = {}
+    unique_category_names = []
+    per_camera_indices = {label: [] for label in camera_labels}
+    per_camera_counts = {label: [] for label in camera_labels}
+
+    for timestamp in timestamps:
+        per_timestamp_dict = efm_gt_dict[timestamp]
+        for camera_label in camera_labels:
+            obb3_dict = per_timestamp_dict.get(camera_label, {})
+            if not obb3_dict:
+                # -1 marks an empty camera dict, to be restored as {} when expanding
+                per_camera_counts[camera_label].append(-1)
+                continue
+
+            if not empty_rows:
+                empty_rows = {
+                    field_name: obb3_dict[field_name][:0].clone()
+                    for field_name in EFM_GT_INSTANCE_TENSOR_FIELDS
+                }
+            num_instances = obb3_dict["instance_ids"].shape[0]
+            instance_ids = obb3_dict["instance_ids"].tolist()
+            dimensions_np = obb3_dict["object_dimensions"].numpy()
+            poses_np = obb3_dict["ts_world_object"].numpy()
+            for i_row in range(num_instances):
+                row_key = (
+                    instance_ids[i_row],
+                    dimensions_np[i_row].tobytes(),
+                    poses_np[i_row].tobytes(),
+                )
+                if row_key not in row_key_to_index:
+                    row_key_to_index[row_key] = len(unique_category_names)
+                    for field_name in EFM_GT_INSTANCE_TENSOR_FIELDS:
+                        unique_rows[field_name].append(obb3_dict[field_name][i_row])
+                    unique_category_names.append(obb3_dict["category_names"][i_row])
+                per_camera_indices[camera_label].append(row_key_to_index[row_key])
+            per_camera_counts[camera_label].append(num_instances)
+
+    instances = {}
+    for field_name in EFM_GT_INSTANCE_TENSOR_FIELDS:
+        if len(unique_rows[field_name]) > 0:
+            instances[field_name] = torch.stack(unique_rows[field_name], dim=0)
+        else:
+            instances[field_name] = empty_rows.get(field_name, torch.tensor([]))
+    instances["category_names"] = unique_category_names
+
+    visibility = {}
+    for camera_label in camera_labels:
+        visibility[camera_label] = {
+            "instance_indices": torch.tensor(
+                per_camera_indices[camera_label], dtype=torch.int64
+            ),
+            "num_instances_per_frame": torch.tensor(
+                per_camera_counts[camera_label], dtype=torch.int64
+            ),
+        }
+
+    return {
+        "timestamps_ns": torch.tensor([int(t) for t in timestamps], dtype=torch.int64),
+        "instances": instances,
+        "visibility": visibility,
+    }
+
+
+def expand_compact_efm_gt_dict(compact_gt_dict: Dict) -> Dict:
+    """
+    The reverse of `compact_efm_gt_dict`, expands a compact EFM GT dict back to the legacy nested layout of
+    {timestamp: {camera_label: obb3_dict}}.
+    """
+    instances = compact_gt_dict["instances"]
+    timestamps = [str(t) for t in compact_gt_dict["timestamps_ns"].tolist()]
+    efm_gt_dict = {timestamp: {} for timestamp in timestamps}
+
+    for camera_label, camera_visibility in compact_gt_dict["visibility"].items():
+        counts = camera_visibility["num_instances_per_frame"]
+        # Empty camera dicts (-1) do not take up any indices
+        frame_indices = torch.split(
+            camera_visibility["instance_indices"], counts.clamp(min=0).tolist()
+        )
+        for timestamp, count, indices in zip(
+            timestamps, counts.tolist(), frame_indices
+        ):
+            if count < 0:
+                efm_gt_dict[timestamp][camera_label] = {}
+                continue
+            obb3_dict = {
+                field_name: instances[field_name][indices]
+                for field_name in EFM_GT_INSTANCE_TENSOR_FIELDS
+            }
+            obb3_dict["category_names"] = [
+                instances["category_names"][i] for i in indices.tolist()
+            ]
+            efm_gt_dict[timestamp][camera_label] = obb3_dict
+
+    return efm_gt_dict
@@ -19,9 +19,9 @@ from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import torch
+from atek.util.se3_utils import invert_se3, transform_points_se3
 from atek.util.tensor_utils import compute_bbox_corners_in_world
 from projectaria_tools.core.calibration import CameraProjection
-from projectaria_tools.core.sophus import SE3
 
 COLOR_GREEN = [30, 255, 30]
 COLOR_RED = [255, 30, 30]
@@ -122,16 +122,28 @@ def check_projected_points_within_image(
 def filter_line_segs_out_of_camera_view(
     line_segs: List[List[Tuple[np.ndarray, np.ndarray]]],
     camera_projection: CameraProjection,
-    T_World_Camera: SE3,
+    T_World_Camera: torch.Tensor,
     image_width: int,
     image_height: int,
 ) -> List[Tuple[np.ndarray, np.ndarray]]:
+    # Transform the start and end points of all segments into the camera at once, T_World_Camera is [3, 4]
+    points_in_world = np.array(
+        [point for edge in line_segs for seg in edge for point in seg],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    points_in_cam = transform_points_se3(
+        invert_se3(T_World_Camera.to(torch.float64)),
+        torch.from_numpy(points_in_world),
+    ).numpy()
+
     filtered_line_segs = []
+    i_point = 0
     for edge in line_segs:
         filtered_edge = []
-        for seg in edge:
-            start_point_in_cam = T_World_Camera.inverse() @ seg[0]
-            end_point_in_cam = T_World_Camera.inverse() @ seg[1]
+        for _ in edge:
+            start_point_in_cam = points_in_cam[i_point]
+            end_point_in_cam = points_in_cam[i_point + 1]
+            i_point += 2
 
             # Remove if any point is behind the camera
             if start_point_in_cam[2] < 0 or end_point_in_cam[2] < 0:
@@ -155,7 +167,7 @@ def filter_line_segs_out_of_camera_view(
 def obtain_visible_line_segs_of_obb3(
     obb3_corners_in_world,
     camera_projection: CameraProjection,
-    T_World_Camera: SE3,
+    T_World_Camera: torch.Tensor,
     image_width: int,
     image_height: int,
 ) -> Tuple[List, List]:
@@ -0,0 +1,92 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Special keys of a WDS sample that are not stored as tar members
+WDS_META_KEYS = ["__key__", "__url__", "__local_path__"]
+
+# Semidense point data are stored as stacked tensors, which all need the lengths tensor to be unpacked
+SEMIDENSE_POINTS_LENGTHS_KEY = "msdpd#points_world_lengths"
+
+
+def is_wds_key_selected(key: str, key_globs: Optional[List[str]]) -> bool:
+    """
+    Check if a WDS key (with file extension, e.g. `mfcd#camera-rgb+images_0.jpeg`) matches any of the key globs.
+    None key_globs selects all keys.
+    """
+    if key_globs is None:
+        return True
+    return any(fnmatchcase(key, key_glob) for key_glob in key_globs)
+
+
+def project_wds_sample(sample: Dict, key_globs: Optional[List[str]]) -> Dict:
+    """
+    Keep only the keys of a WDS sample that match the key globs. `__key__` is always kept.
+    """
+    if key_globs is None:
+        return sample
+    return {
+        k: v
+        for k, v in sample.items()
+        if k == "__key__" or is_wds_key_selected(k, key_globs)
+    }
+
+
+def split_wds_member_name(member_name: str) -> Tuple[str, str]:
+    """
+    Split a tar member name `{__key__}.{key}` into (__key__, key), where __key__ does not contain dots.
+    """
+    sample_key, key = os.path.basename(member_name).split(".", 1)
+    return sample_key, key
+
+
+def create_key_globs_from_atek_keys(atek_keys: List[str]) -> List[str]:
+    """
+    Create WDS key globs that select everything written for the given flattened ATEK keys (without file extension),
+    e.g. from the keys of `CubeRCNNModelAdaptor.get_dict_key_mapping_all()`:
+    "mfcd#camera-rgb+images" selects all image frames `mfcd#camera-rgb+images_{i}.{ext}`,
+    "gt_data" selects `gt_data.json` and all `gt_data#{...}` tensors,
+    "msdpd#points_world" selects `msdpd#points_world+stacked.{ext}` and `msdpd#points_world_lengths.{ext}`.
+    """
+    key_globs = []
+    for atek_key in atek_keys:
+        key_globs += [
+            f"{atek_key}.*",
+            f"{atek_key}_*",
+            f"{atek_key}#*",
+            f"{atek_key}+stacked.*",
+        ]
+        if atek_key.startswith("msdpd#points_"):
+            key_globs.append(f"{SEMIDENSE_POINTS_LENGTHS_KEY}.*")
+    return key_globs
+
+
+def create_wds_member_selector(
+    key_globs: Optional[List[str]],
+) -> Optional[Callable[[str], bool]]:
+    """
+    Create a function to select tar members by name according to the key globs, that can be used as the `select_files`
+    argument of `wds.WebDataset`, so that non-selected members are skipped before being read and decoded.
+    Returns None if key_globs is None, i.e. select all members.
+    """
+    if key_globs is None:
+        return None
+
+    def _select_member(member_name: str) -> bool:
+        return is_wds_key_selected(split_wds_member_name(member_name)[1], key_globs)
+
+    return _select_member
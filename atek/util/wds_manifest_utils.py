@@ -0,0 +1,145 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import tarfile
+from typing import Dict, List, Optional
+
+from atek.util.wds_key_utils import split_wds_member_name
+
+# Name of the manifest file written next to the WDS shards of each output folder
+WDS_MANIFEST_FILE_NAME = "manifest.json"
+WDS_MANIFEST_VERSION = 1
+
+# A WDS manifest describes all shards in one folder, so that shards can be counted and balanced without opening them:
+# {
+#     "version": 1,
+#     "num_samples": total number of samples,
+#     "num_bytes": total size of all shards in bytes,
+#     "shards": [
+#         {
+#             "name": shard file name, relative to the folder, e.g. "shards-0000.tar",
+#             "num_samples": number of samples in the shard,
+#             "num_bytes": size of the shard file in bytes,
+#             "sha1sum": sha1 of the shard file,
+#             "keys": sorted list of member keys without the sample prefix, e.g. ["gt_data.json", "mfcd#camera-rgb+images_0.jpeg"],
+#         },
+#         ...
+#     ],
+# }
+
+
+def compute_file_sha1(file_path: str) -> str:
+    """
+    Compute the sha1 hex digest of a file, reading in blocks.
+    """
+    sha1 = hashlib.sha1()
+    with open(file_path, "rb") as file:
+        for byte_block in iter(lambda: file.read(1 << 20), b""):
+            sha1.update(byte_block)
+    return sha1.hexdigest()
+
+
+def get_sorted_shard_paths(folder: str) -> List[str]:
+    """
+    Return the full paths of all tar shards in a folder, sorted by name.
+    """
+    if not os.path.isdir(folder):
+        return []
+    return [
+        os.path.join(folder, f)
+        for f in sorted(os.listdir(folder))
+        if f.endswith(".tar")
+    ]
+
+
+def create_shard_info(
+    shard_path: str, num_samples: int, keys: List[str], compute_sha1: bool = True
+) -> Dict:
+    """
+    Create the manifest entry of a single shard file.
+    """
+    return {
+        "name": os.path.basename(shard_path),
+        "num_samples": num_samples,
+        "num_bytes": os.path.getsize(shard_path),
+        "sha1sum": compute_file_sha1(shard_path) if compute_sha1 else None,
+        "keys": sorted(keys),
+    }
+
+
+def scan_shard_info(shard_path: str, compute_sha1: bool = True) -> Dict:
+    """
+    Create the manifest entry of a single (uncompressed) shard file by scanning its tar headers, seeking over the data
+    members. Only the sha1, if `compute_sha1` is set, reads the whole file.
+    """
+    sample_keys = set()
+    member_keys = set()
+    with tarfile.open(shard_path, "r:") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            sample_key, member_key = split_wds_member_name(member.name)
+            sample_keys.add(sample_key)
+            member_keys.add(member_key)
+    return create_shard_info(
+        shard_path,
+        num_samples=len(sample_keys),
+        keys=list(member_keys),
+        compute_sha1=compute_sha1,
+    )
+
+
+def create_wds_manifest(shard_infos: List[Dict]) -> Dict:
+    return {
+        "version": WDS_MANIFEST_VERSION,
+        "num_samples": sum(info["num_samples"] for info in shard_infos),
+        "num_bytes": sum(info["num_bytes"] for info in shard_infos),
+        "shards": sorted(shard_infos, key=lambda info: info["name"]),
+    }
+
+
+def write_wds_manifest(folder: str, shard_infos: List[Dict]) -> str:
+    """
+    Write the manifest of all shards in a folder, return the manifest path.
+    """
+    manifest_path = os.path.join(folder, WDS_MANIFEST_FILE_NAME)
+    with open(manifest_path, "w") as f:
+        json.dump(create_wds_manifest(shard_infos), f, indent=2)
+    return manifest_path
+
+
+def load_wds_manifest(folder: str) -> Optional[Dict]:
+    """
+    Load the manifest of a shard folder, return None if the folder does not have one.
+    """
+    manifest_path = os.path.join(folder, WDS_MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def build_wds_manifest_for_folder(folder: str, compute_sha1: bool = True) -> Dict:
+    """
+    Build (and write) the manifest of an existing shard folder by scanning all of its shards.
+    """
+    shard_infos = [
+        scan_shard_info(shard_path, compute_sha1=compute_sha1)
+        for shard_path in get_sorted_shard_paths(folder)
+    ]
+    write_wds_manifest(folder, shard_infos)
+    return create_wds_manifest(shard_infos)
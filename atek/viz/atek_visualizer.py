@@ -27,6 +27,7 @@ from atek.data_preprocess.atek_data_sample import (
     MpsTrajData,
     MultiFrameCameraData,
 )
+from atek.util.se3_utils import compose_se3, rotation_matrix_to_quat
 from atek.util.tensor_utils import compute_bbox_corners_in_world
 from atek.util.viz_utils import box_points_to_lines, obtain_visible_line_segs_of_obb3
 from omegaconf.omegaconf import DictConfig
@@ -391,6 +392,9 @@ class NativeAtekSampleVisualizer:
                 continue
 
             num_obb3 = len(per_cam_dict["category_ids"])
+            # Convert all obb3 poses at once
+            Ts_world_obj = torch.as_tensor(per_cam_dict["ts_world_object"])
+            obj_quats_wxyz = rotation_matrix_to_quat(Ts_world_obj[:, :, :3]).numpy()
             for i_obj in range(num_obb3):
                 category_name = per_cam_dict["category_names"][i_obj].split(":")[0]
                 if (
@@ -404,12 +408,8 @@ class NativeAtekSampleVisualizer:
                 ):
                     continue
                 # Assign obb3 pose info
-                T_world_obj = SE3.from_matrix3x4(
-                    per_cam_dict["ts_world_object"][i_obj].numpy()
-                )
-
-                bb3d_centers.append(T_world_obj.translation()[0])
-                wxyz = T_world_obj.rotation().to_quat()[0]
+                bb3d_centers.append(Ts_world_obj[i_obj, :, 3].numpy())
+                wxyz = obj_quats_wxyz[i_obj]
                 bb3d_quats_xyzw.append([wxyz[1], wxyz[2], wxyz[3], wxyz[0]])
                 bb3d_labels.append(per_cam_dict["category_names"][i_obj])
                 # Assign obb3 size info
@@ -454,7 +454,7 @@ class NativeAtekSampleVisualizer:
         self,
         obb3d_gt_dict: dict,
         timestamp_ns: int,
-        T_World_Camera: SE3,
+        T_World_Camera: torch.Tensor,
         camera_projection: CameraProjection,
         image_width: int,
         image_height: int,
@@ -522,7 +522,9 @@ class NativeAtekSampleVisualizer:
         then we project the corner to image view using camera projection model
         """
         # Get camera information
-        T_Device_Camera = SE3.from_matrix3x4(camera_data.T_Device_Camera)
+        T_Device_Camera = torch.as_tensor(
+            camera_data.T_Device_Camera, dtype=torch.float64
+        )
         camera_model_type_dict = {
             "CameraModelType.FISHEYE624": CameraModelType.FISHEYE624,
             "CameraModelType.KANNALA_BRANDT_K3": CameraModelType.KANNALA_BRANDT_K3,
@@ -545,7 +547,9 @@ class NativeAtekSampleVisualizer:
         ), "timestamp count in camera data and traj does not match."
 
         for i_time in range(len(all_timestamp_ns)):
-            T_World_Device = SE3.from_matrix3x4(mps_traj_data.Ts_World_Device[i_time])
+            T_World_Device = torch.as_tensor(
+                mps_traj_data.Ts_World_Device[i_time], dtype=torch.float64
+            )
             timestamp_ns = all_timestamp_ns[i_time].item()
             # dict is from obb_sample_builder, single timestamp
             if "obb3_gt" in obb3d_gt_dict:
@@ -567,7 +571,7 @@ class NativeAtekSampleVisualizer:
             self._plot_obb3d_in_camera_view_single_timestamp(
                 obb3d_gt_dict=single_obb3d_gt_dict,
                 timestamp_ns=timestamp_ns,
-                T_World_Camera=T_World_Device @ T_Device_Camera,
+                T_World_Camera=compose_se3(T_World_Device, T_Device_Camera),
                 camera_projection=camera_projection,
                 image_width=image_width,
                 image_height=image_height,
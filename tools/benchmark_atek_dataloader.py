@@ -0,0 +1,410 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import defaultdict
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import torch
+import webdataset as wds
+
+from atek.data_loaders.atek_wds_dataloader import (
+    _tarfile_samples,
+    atek_default_collation_fn,
+    load_atek_wds_dataset,
+    process_wds_sample,
+    select_and_remap_dict_keys,
+    simple_list_collation_fn,
+)
+from atek.data_preprocess.synthetic_data_generator import SyntheticAtekSampleGenerator
+from atek.util.image_codec_utils import decode_image_frames_in_wds_sample
+from atek.util.wds_key_utils import (
+    create_key_globs_from_atek_keys,
+    create_wds_member_selector,
+)
+from atek.util.wds_manifest_utils import get_sorted_shard_paths
+from omegaconf import OmegaConf
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s-%(levelname)s:%(message)s",  # Format of the log messages
+    handlers=[
+        logging.StreamHandler(),  # Output logs to console
+    ],
+)
+
+logger = logging.getLogger(__name__)
+
+LOADER_NAMES = ["native", "cubercnn", "sam2"]
+
+STAGE_NAMES = [
+    "tar_read",
+    "image_decode",
+    "member_decode",
+    "process_wds_sample",
+    "key_remap",
+    "adaptor",
+    "collation",
+]
+
+
+def _get_loader_fns(loader_name: str) -> Dict:
+    """
+    Returns the functions used by a loader: `load_dataset_fn` to create its WDS dataset, and the key mapping, adaptor
+    and collation stages for the per-stage breakdown.
+    """
+    if loader_name == "native":
+        return {
+            "load_dataset_fn": load_atek_wds_dataset,
+            "dict_key_mapping": None,
+            "adaptor_fn": None,
+            "collation_fn": atek_default_collation_fn,
+        }
+    if loader_name == "cubercnn":
+        from atek.data_loaders.cubercnn_model_adaptor import (
+            cubercnn_collation_fn,
+            CubeRCNNModelAdaptor,
+            load_atek_wds_dataset_as_cubercnn,
+        )
+
+        return {
+            "load_dataset_fn": load_atek_wds_dataset_as_cubercnn,
+            "dict_key_mapping": CubeRCNNModelAdaptor.get_dict_key_mapping_all(),
+            "adaptor_fn": CubeRCNNModelAdaptor().atek_to_cubercnn,
+            "collation_fn": cubercnn_collation_fn,
+        }
+    if loader_name == "sam2":
+        from atek.data_loaders.sam2_model_adaptor import (
+            load_atek_wds_dataset_as_sam2,
+            Sam2ModelAdaptor,
+        )
+
+        return {
+            "load_dataset_fn": load_atek_wds_dataset_as_sam2,
+            "dict_key_mapping": Sam2ModelAdaptor.get_dict_key_mapping_all(),
+            "adaptor_fn": Sam2ModelAdaptor().atek_to_sam2,
+            "collation_fn": simple_list_collation_fn,
+        }
+    raise ValueError(f"Unknown loader {loader_name}, must be one of {LOADER_NAMES}")
+
+
+def _get_batch_num_samples(batch) -> int:
+    if isinstance(batch, dict):
+        return len(batch["__key__"])
+    return len(batch)
+
+
+def benchmark_throughput(
+    load_dataset_fn: Callable,
+    urls: List[str],
+    batch_size: int,
+    num_workers: int,
+    pin_memory: bool,
+    image_decode_backend: str,
+) -> Dict:
+    """
+    Iterate over one epoch of a DataLoader created the same way as the `create_*_dataloader*` functions, and report
+    throughput in samples and shard megabytes per second. The time to the first batch, which includes worker start-up,
+    is reported separately.
+    """
+    wds_dataset = load_dataset_fn(
+        urls,
+        batch_size=batch_size,
+        repeat_flag=False,
+        image_decode_backend=image_decode_backend,
+    )
+    data_loader = torch.utils.data.DataLoader(
+        wds_dataset, batch_size=None, num_workers=num_workers, pin_memory=pin_memory
+    )
+
+    num_samples = 0
+    num_batches = 0
+    first_batch_time_s = None
+    start_time = time.perf_counter()
+    for batch in data_loader:
+        if first_batch_time_s is None:
+            first_batch_time_s = time.perf_counter() - start_time
+        num_samples += _get_batch_num_samples(batch)
+        num_batches += 1
+    total_time_s = time.perf_counter() - start_time
+
+    total_mb = sum(os.path.getsize(url) for url in urls) / 1e6
+    return {
+        "num_samples": num_samples,
+        "num_batches": num_batches,
+        "total_time_s": total_time_s,
+        "first_batch_time_s": first_batch_time_s,
+        "samples_per_s": num_samples / total_time_s,
+        "mb_per_s": total_mb / total_time_s,
+    }
+
+
+def _timed_next(iterator, stage_times: Dict[str, float], stage_name: str):
+    start_time = time.perf_counter()
+    item = next(iterator, None)
+    stage_times[stage_name] += time.perf_counter() - start_time
+    return item
+
+
+def _timed_call(fn: Callable, arg, stage_times: Dict[str, float], stage_name: str):
+    start_time = time.perf_counter()
+    result = fn(arg)
+    stage_times[stage_name] += time.perf_counter() - start_time
+    return result
+
+
+def profile_stages(
+    loader_fns: Dict,
+    urls: List[str],
+    batch_size: int,
+    image_decode_backend: str,
+    max_num_samples: Optional[int] = None,
+) -> Dict:
+    """
+    Run the stages of `load_atek_wds_dataset` one by one in the main process, with the same member selection, decoding,
+    key mapping, adaptor and collation as the loader, and report the time spent in each stage per sample.
+    """
+    dict_key_mapping = loader_fns["dict_key_mapping"]
+    select_files = (
+        create_wds_member_selector(
+            create_key_globs_from_atek_keys(list(dict_key_mapping.keys()))
+        )
+        if dict_key_mapping is not None
+        else None
+    )
+    member_decoder = wds.autodecode.Decoder([], partial=True)
+
+    stage_times = defaultdict(float)
+    tar_samples = iter(
+        _tarfile_samples(
+            [dict(url=url) for url in urls],
+            url_opener=wds.tariterators.url_opener,
+            select_files=select_files,
+        )
+    )
+    num_samples = 0
+    num_bytes = 0
+    adapted_samples = []
+    while max_num_samples is None or num_samples < max_num_samples:
+        sample = _timed_next(tar_samples, stage_times, "tar_read")
+        if sample is None:
+            break
+        num_samples += 1
+        num_bytes += sum(len(v) for v in sample.values() if isinstance(v, bytes))
+
+        sample = _timed_call(
+            partial(decode_image_frames_in_wds_sample, backend=image_decode_backend),
+            sample,
+            stage_times,
+            "image_decode",
+        )
+        sample = _timed_call(member_decoder, sample, stage_times, "member_decode")
+        sample = _timed_call(
+            process_wds_sample, sample, stage_times, "process_wds_sample"
+        )
+        if dict_key_mapping is not None:
+            sample = _timed_call(
+                partial(select_and_remap_dict_keys, key_mapping=dict_key_mapping),
+                sample,
+                stage_times,
+                "key_remap",
+            )
+        if loader_fns["adaptor_fn"] is not None:
+            adapted_samples += _timed_call(
+                lambda s: list(loader_fns["adaptor_fn"](iter([s]))),
+                sample,
+                stage_times,
+                "adaptor",
+            )
+        else:
+            adapted_samples.append(sample)
+
+        if len(adapted_samples) == batch_size:
+            _timed_call(
+                loader_fns["collation_fn"], adapted_samples, stage_times, "collation"
+            )
+            adapted_samples = []
+    if len(adapted_samples) > 0:
+        _timed_call(
+            loader_fns["collation_fn"], adapted_samples, stage_times, "collation"
+        )
+
+    total_time_s = sum(stage_times.values())
+    return {
+        "num_samples": num_samples,
+        "mb_read": num_bytes / 1e6,
+        "stage_ms_per_sample": {
+            stage_name: 1e3 * stage_times[stage_name] / max(num_samples, 1)
+            for stage_name in STAGE_NAMES
+        },
+        "stage_time_fraction": {
+            stage_name: stage_times[stage_name] / total_time_s if total_time_s else 0.0
+            for stage_name in STAGE_NAMES
+        },
+    }
+
+
+def benchmark_loader(loader_name: str, urls: List[str], args) -> Dict:
+    """
+    Per-stage breakdown and throughput sweep over `num_workers`, batch sizes and `pin_memory` of one loader.
+    """
+    loader_fns = _get_loader_fns(loader_name)
+    loader_results = {
+        "stages": profile_stages(
+            loader_fns,
+            urls,
+            batch_size=max(args.batch_sizes),
+            image_decode_backend=args.image_decode_backend,
+            max_num_samples=args.num_profile_samples,
+        ),
+        "throughput": [],
+    }
+    logger.info(
+        f"{loader_name} stages: {json.dumps(loader_results['stages'], indent=2)}"
+    )
+    for num_workers, batch_size, pin_memory in itertools.product(
+        args.num_workers, args.batch_sizes, args.pin_memory
+    ):
+        throughput = {
+            "num_workers": num_workers,
+            "batch_size": batch_size,
+            "pin_memory": pin_memory,
+            **benchmark_throughput(
+                loader_fns["load_dataset_fn"],
+                urls,
+                batch_size=batch_size,
+                num_workers=num_workers,
+                pin_memory=pin_memory,
+                image_decode_backend=args.image_decode_backend,
+            ),
+        }
+        logger.info(
+            f"{loader_name}: num_workers={num_workers}, batch_size={batch_size}, pin_memory={pin_memory}: "
+            f"{throughput['samples_per_s']:.1f} samples/s, {throughput['mb_per_s']:.1f} MB/s"
+        )
+        loader_results["throughput"].append(throughput)
+    return loader_results
+
+
+def _parse_int_list(value: str) -> List[int]:
+    return [int(x) for x in value.split(",")]
+
+
+def _parse_bool_list(value: str) -> List[bool]:
+    return [x.strip().lower() in ["1", "true", "yes"] for x in value.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the throughput of ATEK WDS data loaders, with a per-stage time breakdown"
+    )
+    parser.add_argument(
+        "--input-wds-folder",
+        type=str,
+        default=None,
+        help="Optional folder of local ATEK WDS shards. If not set, synthetic single-frame RGB samples with OBB GT are used.",
+    )
+    parser.add_argument(
+        "--loaders",
+        type=str,
+        default="native,cubercnn,sam2",
+        help=f"Comma-separated loaders to benchmark, from {LOADER_NAMES}",
+    )
+    parser.add_argument(
+        "--num-workers", type=_parse_int_list, default=[0, 2, 4], help="e.g. 0,2,4"
+    )
+    parser.add_argument(
+        "--batch-sizes", type=_parse_int_list, default=[1, 8], help="e.g. 1,8"
+    )
+    parser.add_argument(
+        "--pin-memory",
+        type=_parse_bool_list,
+        default=[False, True],
+        help="e.g. false,true",
+    )
+    parser.add_argument("--image-decode-backend", type=str, default="pil")
+    parser.add_argument(
+        "--num-profile-samples",
+        type=int,
+        default=None,
+        help="Max number of samples for the per-stage breakdown, default is all",
+    )
+    parser.add_argument("--num-synthetic-samples", type=int, default=64)
+    parser.add_argument("--synthetic-samples-per-shard", type=int, default=16)
+    parser.add_argument("--synthetic-image-height", type=int, default=512)
+    parser.add_argument("--synthetic-image-width", type=int, default=512)
+    parser.add_argument("--synthetic-num-instances", type=int, default=20)
+    parser.add_argument(
+        "--output-file", type=str, default=None, help="Optional output json file"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.input_wds_folder is not None:
+            urls = get_sorted_shard_paths(args.input_wds_folder)
+        else:
+            urls = SyntheticAtekSampleGenerator(
+                OmegaConf.create(
+                    {
+                        "cameras": [
+                            {
+                                "label": "camera-rgb",
+                                "height": args.synthetic_image_height,
+                                "width": args.synthetic_image_width,
+                                "num_channels": 3,
+                                "camera_model_name": "CameraModelType.LINEAR",
+                            }
+                        ],
+                        "num_obbs": args.synthetic_num_instances,
+                    }
+                )
+            ).write_wds_shards(
+                temp_dir,
+                num_samples=args.num_synthetic_samples,
+                writer_conf=OmegaConf.create(
+                    {"max_samples_per_shard": args.synthetic_samples_per_shard}
+                ),
+            )
+
+        results = {
+            "num_shards": len(urls),
+            "total_shard_mb": sum(os.path.getsize(url) for url in urls) / 1e6,
+            "image_decode_backend": args.image_decode_backend,
+            "loaders": {},
+        }
+        for loader_name in args.loaders.split(","):
+            try:
+                results["loaders"][loader_name] = benchmark_loader(
+                    loader_name, urls, args
+                )
+            except ImportError as e:
+                # e.g. detectron2 is needed by the CubeRCNN adaptor
+                logger.warning(f"Skipping loader {loader_name}: {e}")
+                results["loaders"][loader_name] = {"error": str(e)}
+
+    logger.info(json.dumps(results, indent=2))
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import json
+import logging
+import time
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+import torch
+
+from atek.data_preprocess.atek_data_sample import (
+    AtekDataSample,
+    create_atek_data_sample_from_flatten_dict,
+    MpsSemiDensePointData,
+    MpsTrajData,
+    MultiFrameCameraData,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s-%(levelname)s:%(message)s",  # Format of the log messages
+    handlers=[
+        logging.StreamHandler(),  # Output logs to console
+    ],
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _legacy_to_flatten_dict(data_sample: AtekDataSample):
+    """
+    The previous `dataclasses.asdict` based flatten implementation, which deep-copies all tensors. Kept here for comparison only.
+    """
+    flatten_dict = {}
+    for field_name, field_value in data_sample.__dict__.items():
+        if field_value is None:
+            continue
+        if field_name in ["gt_data", "sequence_name"]:
+            flatten_dict[field_name] = field_value
+            continue
+        prefix = (
+            f"mfcd#{field_value.camera_label}+"
+            if isinstance(field_value, MultiFrameCameraData)
+            else {
+                MpsTrajData: "mtd#",
+                MpsSemiDensePointData: "msdpd#",
+            }[type(field_value)]
+        )
+        for key, value in asdict(field_value).items():
+            if value is None or (isinstance(value, str) and value == ""):
+                continue
+            flatten_dict[f"{prefix}{key}".lower()] = value
+    return flatten_dict
+
+
+def _create_camera_data(
+    camera_label: str, num_frames: int, num_channels: int, height: int, width: int
+) -> MultiFrameCameraData:
+    return MultiFrameCameraData(
+        images=torch.randint(
+            0, 255, (num_frames, num_channels, height, width), dtype=torch.uint8
+        ),
+        capture_timestamps_ns=torch.arange(num_frames, dtype=torch.int64),
+        frame_ids=torch.arange(num_frames, dtype=torch.int64),
+        exposure_durations_s=torch.rand(num_frames),
+        gains=torch.rand(num_frames),
+        camera_label=camera_label,
+        T_Device_Camera=torch.randn(3, 4),
+        camera_model_name="CameraModelType.FISHEYE624",
+        projection_params=torch.randn(15),
+        camera_valid_radius=torch.tensor([700.0]),
+        origin_camera_label="camera-slam-left",
+    )
+
+
+def create_full_resolution_sample(
+    num_frames: int, num_semidense_points: int
+) -> AtekDataSample:
+    """
+    Create a full-resolution multi-frame sample with random content, mimicking an EFM sample.
+    """
+    return AtekDataSample(
+        sequence_name="benchmark",
+        camera_rgb=_create_camera_data("camera-rgb", num_frames, 3, 1408, 1408),
+        camera_slam_left=_create_camera_data(
+            "camera-slam-left", num_frames, 1, 480, 640
+        ),
+        camera_slam_right=_create_camera_data(
+            "camera-slam-right", num_frames, 1, 480, 640
+        ),
+        mps_traj_data=MpsTrajData(
+            Ts_World_Device=torch.randn(num_frames, 3, 4),
+            capture_timestamps_ns=torch.arange(num_frames, dtype=torch.int64),
+            gravity_in_world=torch.tensor([0.0, 0.0, -9.81]),
+        ),
+        mps_semidense_point_data=MpsSemiDensePointData(
+            points_world=[
+                torch.randn(num_semidense_points, 3) for _ in range(num_frames)
+            ],
+            points_dist_std=[
+                torch.rand(num_semidense_points) for _ in range(num_frames)
+            ],
+            points_inv_dist_std=[
+                torch.rand(num_semidense_points) for _ in range(num_frames)
+            ],
+            capture_timestamps_ns=torch.arange(num_frames, dtype=torch.int64),
+        ),
+        gt_data={},
+    )
+
+
+def _count_copied_bytes(flatten_dict: Dict, reference: Optional[Dict]) -> int:
+    """
+    Count the bytes of tensors in `flatten_dict` that do not share storage with the same key in `reference`.
+    If reference is None, count all tensor bytes.
+    """
+
+    def _tensors_of(value) -> List[torch.Tensor]:
+        if isinstance(value, torch.Tensor):
+            return [value]
+        if isinstance(value, list):
+            return [x for x in value if isinstance(x, torch.Tensor)]
+        return []
+
+    copied_bytes = 0
+    for key, value in flatten_dict.items():
+        ref_tensors = _tensors_of(reference[key]) if reference is not None else []
+        ref_ptrs = {x.data_ptr() for x in ref_tensors}
+        for tensor in _tensors_of(value):
+            if tensor.data_ptr() not in ref_ptrs:
+                copied_bytes += tensor.nbytes
+    return copied_bytes
+
+
+def _time_fn(fn, num_iters: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(num_iters):
+        fn()
+    return (time.perf_counter() - start_time) / num_iters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark AtekDataSample flatten and reconstruction"
+    )
+    parser.add_argument("--num-frames", type=int, default=20)
+    parser.add_argument("--num-semidense-points", type=int, default=5000)
+    parser.add_argument("--num-iters", type=int, default=10)
+    parser.add_argument(
+        "--output-file", type=str, default=None, help="Optional output json file"
+    )
+    args = parser.parse_args()
+
+    data_sample = create_full_resolution_sample(
+        num_frames=args.num_frames, num_semidense_points=args.num_semidense_points
+    )
+    flatten_dict = data_sample.to_flatten_dict()
+
+    tensor_bytes = _count_copied_bytes(flatten_dict, reference=None)
+
+    results = {
+        "num_frames": args.num_frames,
+        "sample_tensor_mbytes": tensor_bytes / 1e6,
+        "legacy_flatten_ms": 1e3
+        * _time_fn(lambda: _legacy_to_flatten_dict(data_sample), args.num_iters),
+        "legacy_flatten_copied_mbytes": _count_copied_bytes(
+            _legacy_to_flatten_dict(data_sample), reference=flatten_dict
+        )
+        / 1e6,
+        "flatten_ms": 1e3
+        * _time_fn(lambda: data_sample.to_flatten_dict(), args.num_iters),
+        "flatten_copied_mbytes": _count_copied_bytes(
+            data_sample.to_flatten_dict(), reference=flatten_dict
+        )
+        / 1e6,
+        "reconstruct_ms": 1e3
+        * _time_fn(
+            lambda: create_atek_data_sample_from_flatten_dict(flatten_dict),
+            args.num_iters,
+        ),
+    }
+    logger.info(json.dumps(results, indent=2))
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import torch
+import webdataset as wds
+
+from atek.data_loaders.atek_wds_dataloader import process_wds_sample
+from atek.data_preprocess.atek_data_sample import (
+    AtekDataSample,
+    MpsSemiDensePointData,
+    MpsTrajData,
+    MultiFrameCameraData,
+)
+from atek.data_preprocess.atek_wds_writer import (
+    convert_atek_sample_dict_to_wds_dict,
+    ManifestShardWriter,
+)
+from atek.util.file_io_utils import merge_tensors_into_dict
+from atek.util.image_codec_utils import decode_image_frames_in_wds_sample
+from atek.util.tensor_utils import unpack_list_of_tensors
+from atek.util.wds_manifest_utils import get_sorted_shard_paths
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s-%(levelname)s:%(message)s",  # Format of the log messages
+    handlers=[
+        logging.StreamHandler(),  # Output logs to console
+    ],
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _legacy_process_wds_sample(sample: Dict) -> Dict:
+    """
+    The previous `process_wds_sample` implementation, which merges each GT tensor into the GT dict with a separate
+    deep copy. Kept here for comparison only.
+    """
+    sample_as_dict = {}
+    to_be_stacked_images = {}
+    for k, v in sample.items():
+        if k in ["__key__", "__local_path__", "__url__"]:
+            sample_as_dict[k] = v
+            continue
+        key_wo_extension, extension_name = k.rsplit(".", 1)
+        if extension_name in ["jpeg", "png", "webp", "rawimage"]:
+            image_root_name = k.split("_")[0]
+            image_index = int(k.split("_")[1].split(".")[0])
+            if image_root_name not in to_be_stacked_images:
+                to_be_stacked_images[image_root_name] = {}
+            to_be_stacked_images[image_root_name][image_index] = v
+        elif extension_name == "pth":
+            sample_as_dict[key_wo_extension] = (
+                v.float() if v.dtype == torch.float64 else v
+            )
+        else:
+            sample_as_dict[key_wo_extension] = v
+
+    for image_root_name, img_dict in to_be_stacked_images.items():
+        sample_as_dict[image_root_name] = torch.stack(
+            [img_dict[index] for index in sorted(img_dict.keys())], dim=0
+        )
+
+    for key in ["points_world", "points_inv_dist_std", "points_dist_std"]:
+        if f"msdpd#{key}+stacked" in sample_as_dict:
+            sample_as_dict[f"msdpd#{key}"] = unpack_list_of_tensors(
+                stacked_tensor=sample_as_dict[f"msdpd#{key}+stacked"],
+                lengths_of_tensors=sample_as_dict[f"msdpd#points_world_lengths"],
+            )
+
+    keys_to_pop = []
+    for key, value in sample_as_dict.items():
+        if key.startswith("gt_data#") and isinstance(value, torch.Tensor):
+            sample_as_dict["gt_data"] = merge_tensors_into_dict(
+                sample_as_dict["gt_data"], {key.replace("gt_data#", ""): value}
+            )
+            keys_to_pop.append(key)
+    for tensor_key in keys_to_pop:
+        sample_as_dict.pop(tensor_key)
+    return sample_as_dict
+
+
+def _create_camera_data(
+    camera_label: str, num_frames: int, num_channels: int, height: int, width: int
+) -> MultiFrameCameraData:
+    return MultiFrameCameraData(
+        images=torch.randint(
+            0, 255, (num_frames, num_channels, height, width), dtype=torch.uint8
+        ),
+        capture_timestamps_ns=torch.arange(num_frames, dtype=torch.int64),
+        frame_ids=torch.arange(num_frames, dtype=torch.int64),
+        exposure_durations_s=torch.rand(num_frames),
+        gains=torch.rand(num_frames),
+        camera_label=camera_label,
+        T_Device_Camera=torch.randn(3, 4),
+        camera_model_name="CameraModelType.FISHEYE624",
+        projection_params=torch.randn(15),
+        camera_valid_radius=torch.tensor([700.0]),
+    )
+
+
+def _create_efm_gt(
+    camera_labels: List[str], num_frames: int, num_instances: int
+) -> Dict:
+    """
+    Create GT in the `efm_gt` layout of `EfmGtProcessor.get_gt_by_timestamp_list_ns`, with random content.
+    """
+    efm_gt = {}
+    for timestamp in range(num_frames):
+        efm_gt[str(timestamp)] = {
+            camera_label: {
+                "instance_ids": torch.arange(num_instances, dtype=torch.int64),
+                "category_names": [f"category_{i}" for i in range(num_instances)],
+                "category_ids": torch.randint(0, 30, (num_instances,)),
+                "object_dimensions": torch.rand(num_instances, 3),
+                "ts_world_object": torch.randn(num_instances, 3, 4),
+            }
+            for camera_label in camera_labels
+        }
+    return efm_gt
+
+
+def create_efm_sample(
+    num_frames: int, num_semidense_points: int, num_instances: int
+) -> AtekDataSample:
+    """
+    Create a multi-frame sample with random content, at the camera resolutions and GT layout of the EFM preprocessing config.
+    """
+    camera_data = {
+        "camera_rgb": _create_camera_data("camera-rgb", num_frames, 3, 240, 240),
+        "camera_slam_left": _create_camera_data(
+            "camera-slam-left", num_frames, 1, 240, 320
+        ),
+        "camera_slam_right": _create_camera_data(
+            "camera-slam-right", num_frames, 1, 240, 320
+        ),
+    }
+    return AtekDataSample(
+        sequence_name="benchmark",
+        **camera_data,
+        mps_traj_data=MpsTrajData(
+            Ts_World_Device=torch.randn(num_frames, 3, 4),
+            capture_timestamps_ns=torch.arange(num_frames, dtype=torch.int64),
+            gravity_in_world=torch.tensor([0.0, 0.0, -9.81]),
+        ),
+        mps_semidense_point_data=MpsSemiDensePointData(
+            points_world=[
+                torch.randn(num_semidense_points, 3) for _ in range(num_frames)
+            ],
+            points_dist_std=[
+                torch.rand(num_semidense_points) for _ in range(num_frames)
+            ],
+            points_inv_dist_std=[
+                torch.rand(num_semidense_points) for _ in range(num_frames)
+            ],
+            capture_timestamps_ns=torch.arange(num_frames, dtype=torch.int64),
+        ),
+        gt_data={
+            "efm_gt": _create_efm_gt(
+                [data.camera_label for data in camera_data.values()],
+                num_frames,
+                num_instances,
+            )
+        },
+    )
+
+
+def _load_decoded_wds_samples(tar_list: List[str]) -> List[Dict]:
+    """
+    Load WDS samples with all members decoded, i.e. the input of `process_wds_sample`.
+    """
+    dataset = (
+        wds.WebDataset(
+            tar_list,
+            shardshuffle=False,
+            nodesplitter=wds.shardlists.single_node_only,
+            workersplitter=None,
+            empty_check=False,
+        )
+        .map(decode_image_frames_in_wds_sample)
+        .decode(partial=True)
+    )
+    return list(dataset)
+
+
+def _time_process_fn(process_fn, samples: List[Dict], num_iters: int) -> float:
+    """
+    Average time in seconds per sample. GT dicts are re-created for each call, as `process_wds_sample` fills them in place.
+    """
+    gt_jsons = [json.dumps(sample["gt_data.json"]) for sample in samples]
+    total_time = 0.0
+    for _ in range(num_iters):
+        for sample, gt_json in zip(samples, gt_jsons):
+            sample_copy = dict(sample)
+            sample_copy["gt_data.json"] = json.loads(gt_json)
+            start_time = time.perf_counter()
+            process_fn(sample_copy)
+            total_time += time.perf_counter() - start_time
+    return total_time / (num_iters * len(samples))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark `process_wds_sample` on multi-frame EFM samples"
+    )
+    parser.add_argument(
+        "--input-wds-folder",
+        type=str,
+        default=None,
+        help="Optional folder of preprocessed EFM WDS shards. If not set, a random 20-frame EFM sample is used.",
+    )
+    parser.add_argument("--num-frames", type=int, default=20)
+    parser.add_argument("--num-semidense-points", type=int, default=5000)
+    parser.add_argument("--num-instances", type=int, default=30)
+    parser.add_argument("--num-iters", type=int, default=10)
+    parser.add_argument(
+        "--output-file", type=str, default=None, help="Optional output json file"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.input_wds_folder is not None:
+            tar_list = get_sorted_shard_paths(args.input_wds_folder)
+        else:
+            shard_writer = ManifestShardWriter(temp_dir)
+            data_sample = create_efm_sample(
+                num_frames=args.num_frames,
+                num_semidense_points=args.num_semidense_points,
+                num_instances=args.num_instances,
+            )
+            shard_writer.write(
+                convert_atek_sample_dict_to_wds_dict(
+                    0, data_sample.to_flatten_dict(), prefix_string="benchmark"
+                )
+            )
+            tar_list = shard_writer.close()
+        samples = _load_decoded_wds_samples(tar_list)
+
+    num_gt_tensors = sum(
+        1 for k in samples[0].keys() if k.startswith("gt_data#") and k.endswith(".pth")
+    )
+    results = {
+        "num_samples": len(samples),
+        "num_gt_tensors_per_sample": num_gt_tensors,
+        "legacy_process_ms": 1e3
+        * _time_process_fn(_legacy_process_wds_sample, samples, args.num_iters),
+        "process_ms": 1e3
+        * _time_process_fn(process_wds_sample, samples, args.num_iters),
+    }
+    logger.info(json.dumps(results, indent=2))
+
+    if args.output_file is not None:
+        with open(args.output_file, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
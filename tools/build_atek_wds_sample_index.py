@@ -0,0 +1,69 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import logging
+import os
+
+from atek.data_loaders.wds_sample_filter import (
+    build_wds_sample_index,
+    DEFAULT_FILTER_KEY_GLOBS,
+)
+from atek.util.wds_manifest_utils import get_sorted_shard_paths
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s-%(levelname)s:%(message)s",  # Format of the log messages
+    handlers=[
+        logging.StreamHandler(),  # Output logs to console
+    ],
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Build the sample index of ATEK WDS shard folders, so that samples can be filtered without opening the shards"
+    )
+    parser.add_argument(
+        "--input-wds-folder",
+        type=str,
+        required=True,
+        help="Folder of WDS shards, or folder with one sub-folder of WDS shards per sequence",
+    )
+    parser.add_argument(
+        "--key-globs",
+        type=str,
+        nargs="+",
+        default=DEFAULT_FILTER_KEY_GLOBS,
+        help="WDS key globs of the small members to index",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = get_args()
+
+    for root, _, _ in os.walk(args.input_wds_folder):
+        if len(get_sorted_shard_paths(root)) == 0:
+            continue
+        index_path = build_wds_sample_index(root, key_globs=args.key_globs)
+        logger.info(f"Sample index written to {index_path}")
+
+
+if __name__ == "__main__":
+    main()
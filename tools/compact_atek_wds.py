@@ -0,0 +1,108 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import logging
+import os
+
+from atek.data_preprocess.atek_wds_resharder import (
+    compact_atek_wds_sequences,
+    find_sequence_tar_dict_in_folder,
+    write_compacted_tar_yaml,
+)
+from atek.util.file_io_utils import load_yaml_and_extract_sequence_tar_dict
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s-%(levelname)s:%(message)s",  # Format of the log messages
+    handlers=[
+        logging.StreamHandler(),  # Output logs to console
+    ],
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Merge per-sequence ATEK WDS shards into uniformly sized, globally numbered shards"
+    )
+    parser.add_argument(
+        "--input-wds-folder",
+        type=str,
+        help="Folder with one sub-folder of WDS shards per sequence",
+    )
+    parser.add_argument(
+        "--input-tar-yaml",
+        type=str,
+        help="Tar list yaml of the input sequences, used instead of --input-wds-folder",
+    )
+    parser.add_argument(
+        "--output-wds-folder", type=str, required=True, help="Output folder"
+    )
+    parser.add_argument(
+        "--output-tar-yaml-name",
+        type=str,
+        default="local_compacted_tars.yaml",
+        help="Name of the tar list yaml written to the output folder",
+    )
+    parser.add_argument("--max-samples-per-shard", type=int, default=256)
+    parser.add_argument("--max-shard-size-bytes", type=float, default=3e9)
+    parser.add_argument(
+        "--interleave-sequences",
+        action="store_true",
+        help="Interleave samples from multiple sequences within each shard",
+    )
+    parser.add_argument(
+        "--interleave-window",
+        type=int,
+        default=16,
+        help="Number of sequences to interleave at a time",
+    )
+    parser.add_argument(
+        "--shuffle-seed",
+        type=int,
+        default=None,
+        help="If set, shuffle the sequence order with this seed",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = get_args()
+
+    if args.input_tar_yaml is not None:
+        sequence_tar_dict = load_yaml_and_extract_sequence_tar_dict(args.input_tar_yaml)
+    else:
+        sequence_tar_dict = find_sequence_tar_dict_in_folder(args.input_wds_folder)
+
+    output_shards = compact_atek_wds_sequences(
+        sequence_tar_dict=sequence_tar_dict,
+        output_path=args.output_wds_folder,
+        max_samples_per_shard=args.max_samples_per_shard,
+        max_shard_size_bytes=args.max_shard_size_bytes,
+        interleave_sequences=args.interleave_sequences,
+        interleave_window=args.interleave_window,
+        shuffle_seed=args.shuffle_seed,
+    )
+
+    yaml_path = os.path.join(args.output_wds_folder, args.output_tar_yaml_name)
+    write_compacted_tar_yaml(output_shards, yaml_path)
+    logger.info(f"Tar list yaml written to {yaml_path}")
+
+
+if __name__ == "__main__":
+    main()
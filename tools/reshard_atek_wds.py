@@ -0,0 +1,104 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import logging
+
+from atek.data_loaders.cubercnn_model_adaptor import CubeRCNNModelAdaptor
+from atek.data_loaders.sam2_model_adaptor import Sam2ModelAdaptor
+from atek.data_preprocess.atek_wds_resharder import reshard_atek_wds
+from atek.util.file_io_utils import load_yaml_and_extract_tar_list
+from atek.util.wds_key_utils import create_key_globs_from_atek_keys
+from atek.util.wds_manifest_utils import get_sorted_shard_paths
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s-%(levelname)s:%(message)s",  # Format of the log messages
+    handlers=[
+        logging.StreamHandler(),  # Output logs to console
+    ],
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Model adaptors whose consumed keys can be used as the key projection
+MODEL_ADAPTOR_KEY_MAPPINGS = {
+    "cubercnn": CubeRCNNModelAdaptor.get_dict_key_mapping_all,
+    "sam2": Sam2ModelAdaptor.get_dict_key_mapping_all,
+}
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description="Rewrite ATEK WDS shards keeping only selected keys, without decoding"
+    )
+    parser.add_argument(
+        "--input-wds-folder", type=str, help="Folder of the input WDS shards"
+    )
+    parser.add_argument(
+        "--input-tar-yaml",
+        type=str,
+        help="Tar list yaml of the input WDS shards, used instead of --input-wds-folder",
+    )
+    parser.add_argument(
+        "--output-wds-folder", type=str, required=True, help="Output folder"
+    )
+    parser.add_argument(
+        "--keep-key-globs",
+        type=str,
+        nargs="+",
+        default=None,
+        help='WDS key globs to keep, e.g. "mfcd#camera-rgb+*" "gt_data*" "sequence_name.txt"',
+    )
+    parser.add_argument(
+        "--model-adaptor",
+        type=str,
+        choices=list(MODEL_ADAPTOR_KEY_MAPPINGS.keys()),
+        default=None,
+        help="Keep the keys consumed by this model adaptor, in addition to --keep-key-globs",
+    )
+    parser.add_argument("--max-samples-per-shard", type=int, default=100000)
+    parser.add_argument("--max-shard-size-bytes", type=float, default=3e9)
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = get_args()
+
+    if args.input_tar_yaml is not None:
+        input_urls = load_yaml_and_extract_tar_list(args.input_tar_yaml)
+    else:
+        input_urls = get_sorted_shard_paths(args.input_wds_folder)
+
+    keep_key_globs = args.keep_key_globs
+    if args.model_adaptor is not None:
+        adaptor_atek_keys = list(MODEL_ADAPTOR_KEY_MAPPINGS[args.model_adaptor]())
+        keep_key_globs = (keep_key_globs or []) + create_key_globs_from_atek_keys(
+            adaptor_atek_keys
+        )
+    logger.info(f"Keeping WDS keys matching {keep_key_globs}")
+
+    reshard_atek_wds(
+        input_urls=input_urls,
+        output_path=args.output_wds_folder,
+        keep_key_globs=keep_key_globs,
+        max_samples_per_shard=args.max_samples_per_shard,
+        max_shard_size_bytes=args.max_shard_size_bytes,
+    )
+
+
+if __name__ == "__main__":
+    main()
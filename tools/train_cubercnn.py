@@ -16,10 +16,9 @@ import csv
 import json
 import logging
 import os
-import random
 import sys
 from datetime import timedelta
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import detectron2.utils.comm as comm
 import numpy as np
@@ -28,6 +27,8 @@ import torch.distributed as dist
 import yaml
 
 from atek.data_loaders.cubercnn_model_adaptor import load_atek_wds_dataset_as_cubercnn
+from atek.data_loaders.wds_loader_state import AtekWdsLoaderState
+from atek.data_loaders.wds_shard_planner import get_shard_num_samples
 from atek.util.file_io_utils import load_yaml_and_extract_tar_list
 
 from cubercnn.config import get_cfg_defaults
@@ -78,6 +79,20 @@ def add_configs(_C):
     _C.SOLVER.VAL_MAX_ITER = 0
     _C.SOLVER.MAX_EPOCH = 0
 
+    # Cache decoded training samples after the first epoch, disabled if empty
+    _C.DATALOADER.DECODED_SAMPLE_CACHE_DIR = ""
+    _C.DATALOADER.DECODED_SAMPLE_CACHE_MAX_GB = 100.0
+
+    # Make all training ranks run the same number of iterations per epoch, "drop" or "pad", disabled if empty (default).
+    # Only used when the sample counts of all tars are known, see `split_tars_across_ranks`. Both modes need at least
+    # `world_size * NUM_WORKERS` tars, and "drop" truncates every rank and worker to the smallest one.
+    _C.DATALOADER.EQUAL_EPOCH_LENGTH_MODE = ""
+
+    # Drop training samples without valid GT before decoding their images. Validation samples are always filtered.
+    # Without a sample index next to the tars (see `tools/build_atek_wds_sample_index.py`), epoch lengths are then not
+    # equalized and resuming mid-epoch is approximate.
+    _C.DATALOADER.SKIP_SAMPLES_WITHOUT_GT = False
+
 
 def get_tars(tar_yaml, relative_path: str = "", use_relative_path: bool = False):
     yaml_filename = os.path.basename(tar_yaml)
@@ -97,23 +112,45 @@ def get_tars(tar_yaml, relative_path: str = "", use_relative_path: bool = False)
     return tar_files
 
 
-def shuffle_tars(tar_list: List, shuffle_seed: int = 42):
-    random.seed(shuffle_seed)
-    random.shuffle(tar_list)
-    return tar_list
+def split_tars_across_ranks(tars: List, rank: int, world_size: int):
+    """
+    Returns (tars of this rank, {tar: number of samples} or None). If the sample counts of all tars are known (local
+    tars), all tars are returned, to be split across ranks and workers with balanced sample counts by the loader.
+    Otherwise tars are strided across ranks.
+    """
+    shard_num_samples = get_shard_num_samples(tars)
+    if len(shard_num_samples) == len(tars):
+        return tars, shard_num_samples
+    logger.warning(
+        "Sample counts of remote tars are unknown, splitting tars across ranks without balancing."
+    )
+    return tars[rank::world_size], None
 
 
-def build_test_loader(cfg):
+def get_rank_tars(tar_list: str, wds_dir: str) -> Tuple[List, Optional[Dict]]:
+    """
+    Returns (tars of this rank, {tar: number of samples} or None) of a tar list yaml, see `split_tars_across_ranks`.
+    Sample counts of tars without a manifest are scanned from their headers, so this is only called once per run.
+    """
     rank = comm.get_rank()
     world_size = comm.get_world_size()
 
     print("World size:", world_size)
     print("Getting tars from rank:", rank)
-    test_tars = get_tars(
-        cfg.TEST_LIST, relative_path=cfg.TEST_WDS_DIR, use_relative_path=True
-    )
+    tars = get_tars(tar_list, relative_path=wds_dir, use_relative_path=True)
+    return split_tars_across_ranks(tars, rank, world_size)
+
+
+def get_equal_epoch_length_mode(cfg, shard_num_samples: Optional[Dict]):
+    if shard_num_samples is None or cfg.DATALOADER.EQUAL_EPOCH_LENGTH_MODE == "":
+        return None
+    return cfg.DATALOADER.EQUAL_EPOCH_LENGTH_MODE
 
-    test_tars_local = test_tars[rank::world_size]
+
+def build_test_loader(
+    cfg, test_tars_local: List, shard_num_samples: Optional[Dict] = None
+):
+    world_size = comm.get_world_size()
     local_batch_size = max(cfg.SOLVER.IMS_PER_BATCH // world_size, 1)
     print("local_batch_size:", local_batch_size)
 
@@ -122,6 +159,11 @@ def build_test_loader(cfg):
         batch_size=local_batch_size,
         repeat_flag=False,
         shuffle_flag=False,
+        shard_num_samples=shard_num_samples,
+        # validate on every test sample exactly once
+        equal_epoch_length_mode=None,
+        # skip samples without GT before decoding them
+        skip_samples_without_gt=True,
     )
 
     test_dataloader = torch.utils.data.DataLoader(
@@ -139,31 +181,38 @@ def build_test_loader(cfg):
     return test_dataloader
 
 
-def build_train_loader(cfg, shuffle_tars_flag: bool = False, shuffle_seed: int = 42):
-    rank = comm.get_rank()
+def build_train_loader(
+    cfg,
+    train_tars_local: List,
+    shard_num_samples: Optional[Dict] = None,
+    loader_state: Optional[AtekWdsLoaderState] = None,
+):
     world_size = comm.get_world_size()
-
-    print("World size:", world_size)
-    print("Getting tars from rank:", rank)
-    train_tars = get_tars(
-        cfg.TRAIN_LIST, relative_path=cfg.TRAIN_WDS_DIR, use_relative_path=True
-    )
-
-    train_tars_local = train_tars[rank::world_size]
     local_batch_size = max(cfg.SOLVER.IMS_PER_BATCH // world_size, 1)
     print("local_batch_size:", local_batch_size)
 
-    # Perform random shuffle to local tars
-    if shuffle_tars_flag:
-        train_tars_local = shuffle_tars(
-            tar_list=train_tars_local, shuffle_seed=shuffle_seed
-        )
-
     train_wds = load_atek_wds_dataset_as_cubercnn(
         urls=train_tars_local,
         batch_size=local_batch_size,
         repeat_flag=False,
         shuffle_flag=True,  # always perform local shuffle
+        # shuffle tars and samples per epoch, and skip batches already consumed when resuming mid-epoch
+        shard_shuffle_seed=(
+            loader_state.shard_shuffle_seed if loader_state is not None else None
+        ),
+        shard_shuffle_epoch=loader_state.epoch if loader_state is not None else 0,
+        num_consumed_batches=(
+            loader_state.num_consumed_batches if loader_state is not None else 0
+        ),
+        decoded_sample_cache_dir=(
+            cfg.DATALOADER.DECODED_SAMPLE_CACHE_DIR
+            if cfg.DATALOADER.DECODED_SAMPLE_CACHE_DIR != ""
+            else None
+        ),
+        decoded_sample_cache_max_bytes=cfg.DATALOADER.DECODED_SAMPLE_CACHE_MAX_GB * 1e9,
+        shard_num_samples=shard_num_samples,
+        equal_epoch_length_mode=get_equal_epoch_length_mode(cfg, shard_num_samples),
+        skip_samples_without_gt=cfg.DATALOADER.SKIP_SAMPLES_WITHOUT_GT,
     )
 
     train_dataloader = torch.utils.data.DataLoader(
@@ -181,14 +230,17 @@ def build_train_loader(cfg, shuffle_tars_flag: bool = False, shuffle_seed: int =
     return train_dataloader
 
 
-def do_val(cfg, model, iteration, writers, max_iter=100):
-    data_loader = build_test_loader(cfg)
+def do_val(cfg, model, iteration, writers, test_tars, max_iter=100):
+    """
+    `test_tars`: (tars of this rank, {tar: number of samples} or None), see `get_rank_tars`.
+    """
+    data_loader = build_test_loader(cfg, *test_tars)
     start_iter = iteration
 
     with torch.no_grad():
         for orig_data in data_loader:
-            # skip empty data
-            # TODO: maybe skip these in WDS creation? Sync with Shangyi on this.
+            # skip samples whose instances were all filtered out by the adaptor, samples without any GT are already
+            # dropped by the loader
             data = [
                 x for x in orig_data if x["instances"].get("gt_classes").numel() > 0
             ]
@@ -237,9 +289,16 @@ def do_train(cfg, model, resume=False):
     optimizer = build_optimizer(cfg, model)
     scheduler = build_lr_scheduler(cfg, optimizer)
 
-    # bookkeeping
+    # bookkeeping, the loader state is saved with checkpoints to resume mid-epoch
+    loader_state = AtekWdsLoaderState(
+        shard_shuffle_seed=cfg.SEED if cfg.SEED >= 0 else comm.shared_random_seed()
+    )
     checkpointer = DetectionCheckpointer(
-        model, cfg.OUTPUT_DIR, optimizer=optimizer, scheduler=scheduler
+        model,
+        cfg.OUTPUT_DIR,
+        optimizer=optimizer,
+        scheduler=scheduler,
+        loader_state=loader_state,
     )
     periodic_checkpointer = PeriodicCheckpointerOnlyOne(
         checkpointer, cfg.SOLVER.CHECKPOINT_PERIOD, max_iter=max_iter
@@ -282,20 +341,26 @@ def do_train(cfg, model, resume=False):
     # model.parameters() is surprisingly expensive at 150ms, so cache it
     named_params = list(model.named_parameters())
 
+    # Split tars across ranks and count their samples once, not for every epoch or validation
+    train_tars = get_rank_tars(cfg.TRAIN_LIST, cfg.TRAIN_WDS_DIR)
+    test_tars = get_rank_tars(cfg.TEST_LIST, cfg.TEST_WDS_DIR) if do_eval else None
+
     with EventStorage(start_iter) as storage:
         # Loop over all epochs
-        for i_epoch in range(cfg.SOLVER.MAX_EPOCH):
-            logger.info(f"Starting training with epoch {i_epoch} ... ")
+        while loader_state.epoch < cfg.SOLVER.MAX_EPOCH:
+            logger.info(
+                f"Starting training with epoch {loader_state.epoch}, "
+                f"after {loader_state.num_consumed_batches} consumed batches ... "
+            )
 
-            # Generate data loader for current epoch, with random url list
+            # Generate data loader for current epoch, with tars and samples shuffled per epoch
             data_loader = build_train_loader(
-                cfg,
-                shuffle_tars_flag=True,
-                shuffle_seed=i_epoch,
+                cfg, *train_tars, loader_state=loader_state
             )
 
             for orig_data in data_loader:
                 storage.iter = iteration
+                loader_state.on_batch_consumed()
 
                 # forward
                 # skip empty data
@@ -453,6 +518,7 @@ def do_train(cfg, model, resume=False):
                         model,
                         val_iter + 1,
                         writers,
+                        test_tars,
                         max_iter=cfg.SOLVER.VAL_MAX_ITER,
                     )
                     comm.synchronize()
@@ -474,6 +540,10 @@ def do_train(cfg, model, resume=False):
                 if iteration >= max_iter:
                     break
 
+            if iteration >= max_iter:
+                break
+            loader_state.on_epoch_end()
+
     # success
     return True
 